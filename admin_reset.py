@@ -1,15 +1,9 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from database import User, pwd_context
+from database import SessionLocal, User, pwd_context
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-DATABASE_URL = "sqlite:///./users.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
 def update_admin_password():
     db = SessionLocal()
     try:
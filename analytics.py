@@ -0,0 +1,204 @@
+"""Аналитика продаж на дневных агрегатах.
+
+Агрегаты sales_daily_product / sales_daily_category пополняются в той же
+транзакции, где заказ становится paid (payments.reconcile_payments), поэтому
+отчёты за любой период читают только небольшие таблицы агрегатов, а не
+order_items.
+
+Пересчёт с нуля (например, после первого деплоя):
+    python analytics.py backfill [--start 2025-01-01] [--end 2025-12-31]
+"""
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import (
+    Order,
+    OrderItem,
+    Product,
+    SalesDailyCategory,
+    SalesDailyProduct,
+    SessionLocal,
+    insert_for,
+)
+
+UNCATEGORIZED = "Uncategorized"
+# Строк на один INSERT (лимит параметров SQLite)
+UPSERT_CHUNK = 1000
+
+
+def _as_date(value) -> date:
+    # SQLite возвращает date() строкой, PostgreSQL — объектом date
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _aggregate(db: Session, *criteria):
+    """Группирует позиции оплаченных заказов по (день, товар) и (день, категория)"""
+    day = func.date(Order.created_at)
+    rows = (
+        db.query(
+            day.label("day"),
+            OrderItem.product_id,
+            func.max(OrderItem.name),
+            func.sum(OrderItem.quantity),
+            func.sum(OrderItem.price * OrderItem.quantity),
+            func.count(func.distinct(OrderItem.order_id)),
+        )
+        .join(Order, Order.id == OrderItem.order_id)
+        .filter(*criteria)
+        .group_by(day, OrderItem.product_id)
+        .all()
+    )
+    product_ids = {row[1] for row in rows}
+    categories = {}
+    if product_ids:
+        numeric_ids = [int(pid) for pid in product_ids if pid and pid.isdigit()]
+        categories = {
+            str(pid): category
+            for pid, category in db.query(Product.id, Product.category).filter(Product.id.in_(numeric_ids))
+        }
+
+    product_rows, category_totals = [], defaultdict(lambda: [0, 0.0])
+    for raw_day, product_id, name, units, revenue, orders in rows:
+        day_value = _as_date(raw_day)
+        product_rows.append({
+            "day": day_value, "product_id": product_id, "name": name,
+            "units": int(units or 0), "revenue": float(revenue or 0), "orders": int(orders or 0),
+        })
+        totals = category_totals[(day_value, categories.get(product_id) or UNCATEGORIZED)]
+        totals[0] += int(units or 0)
+        totals[1] += float(revenue or 0)
+    category_rows = [
+        {"day": d, "category": c, "units": units, "revenue": revenue}
+        for (d, c), (units, revenue) in category_totals.items()
+    ]
+    return product_rows, category_rows
+
+
+def _upsert_increment(db: Session, product_rows, category_rows):
+    insert = insert_for(db.get_bind())
+    for i in range(0, len(product_rows), UPSERT_CHUNK):
+        stmt = insert(SalesDailyProduct).values(product_rows[i:i + UPSERT_CHUNK])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["day", "product_id"],
+            set_={
+                "name": stmt.excluded.name,
+                "units": SalesDailyProduct.units + stmt.excluded.units,
+                "revenue": SalesDailyProduct.revenue + stmt.excluded.revenue,
+                "orders": SalesDailyProduct.orders + stmt.excluded.orders,
+            },
+        ))
+    for i in range(0, len(category_rows), UPSERT_CHUNK):
+        stmt = insert(SalesDailyCategory).values(category_rows[i:i + UPSERT_CHUNK])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["day", "category"],
+            set_={
+                "units": SalesDailyCategory.units + stmt.excluded.units,
+                "revenue": SalesDailyCategory.revenue + stmt.excluded.revenue,
+            },
+        ))
+
+
+def record_paid_orders(db: Session, order_ids):
+    """Добавляет только что оплаченные заказы в агрегаты. Коммит — за вызывающим"""
+    if not order_ids:
+        return
+    product_rows, category_rows = _aggregate(db, Order.id.in_(list(order_ids)))
+    _upsert_increment(db, product_rows, category_rows)
+
+
+def backfill(db: Session, start: date = None, end: date = None) -> int:
+    """Пересчитывает агрегаты за период [start, end] из оплаченных заказов"""
+    criteria = [Order.status == "paid"]
+    product_q = db.query(SalesDailyProduct)
+    category_q = db.query(SalesDailyCategory)
+    if start:
+        criteria.append(Order.created_at >= datetime.combine(start, time.min))
+        product_q = product_q.filter(SalesDailyProduct.day >= start)
+        category_q = category_q.filter(SalesDailyCategory.day >= start)
+    if end:
+        criteria.append(Order.created_at < datetime.combine(end + timedelta(days=1), time.min))
+        product_q = product_q.filter(SalesDailyProduct.day <= end)
+        category_q = category_q.filter(SalesDailyCategory.day <= end)
+    product_q.delete(synchronize_session=False)
+    category_q.delete(synchronize_session=False)
+    product_rows, category_rows = _aggregate(db, *criteria)
+    _upsert_increment(db, product_rows, category_rows)
+    db.commit()
+    return len(product_rows)
+
+
+def sales_summary(db: Session, start: date, end: date, top: int = 10) -> dict:
+    """Выручка, продажи по дням, топ товаров и категории за период из агрегатов"""
+    in_range = (SalesDailyProduct.day >= start, SalesDailyProduct.day <= end)
+    daily = (
+        db.query(SalesDailyProduct.day, func.sum(SalesDailyProduct.units), func.sum(SalesDailyProduct.revenue))
+        .filter(*in_range)
+        .group_by(SalesDailyProduct.day)
+        .order_by(SalesDailyProduct.day)
+        .all()
+    )
+    revenue_sum = func.sum(SalesDailyProduct.revenue)
+    top_products = (
+        db.query(SalesDailyProduct.product_id, func.max(SalesDailyProduct.name),
+                 func.sum(SalesDailyProduct.units), revenue_sum)
+        .filter(*in_range)
+        .group_by(SalesDailyProduct.product_id)
+        .order_by(revenue_sum.desc())
+        .limit(top)
+        .all()
+    )
+    category_revenue = func.sum(SalesDailyCategory.revenue)
+    categories = (
+        db.query(SalesDailyCategory.category, func.sum(SalesDailyCategory.units), category_revenue)
+        .filter(SalesDailyCategory.day >= start, SalesDailyCategory.day <= end)
+        .group_by(SalesDailyCategory.category)
+        .order_by(category_revenue.desc())
+        .all()
+    )
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "revenue": round(sum(float(r or 0) for _, _, r in daily), 2),
+        "units": sum(int(u or 0) for _, u, _ in daily),
+        "daily": [
+            {"day": _as_date(d).isoformat(), "units": int(u or 0), "revenue": round(float(r or 0), 2)}
+            for d, u, r in daily
+        ],
+        "top_products": [
+            {"product_id": pid, "name": name, "units": int(u or 0), "revenue": round(float(r or 0), 2)}
+            for pid, name, u, r in top_products
+        ],
+        "categories": [
+            {"category": c, "units": int(u or 0), "revenue": round(float(r or 0), 2)}
+            for c, u, r in categories
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Агрегаты продаж")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="Пересчитать агрегаты из оплаченных заказов")
+    fill.add_argument("--start", type=date.fromisoformat)
+    fill.add_argument("--end", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rows = backfill(db, args.start, args.end)
+        print(f"Агрегаты пересчитаны: {rows} строк (товар x день)")
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка: {e}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,36 +2,26 @@
 from fastapi import APIRouter, Depends, Form, HTTPException, Response, Request 
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, field_validator
-from datetime import datetime, timedelta
 from jose import jwt
+from auth_tokens import ALGORITHM, SECRET_KEY, create_access_token, issue_refresh_token, set_session_cookies
 from database import User, get_db, pwd_context
+from guest_cart import merge_guest_cart
+from ratelimit import bcrypt_slots, rate_limit, run_bcrypt
 from sqlalchemy.orm import Session
 import logging
-import os
-from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")  # Matches main.py
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    logger.info(f"Creating token with exp: {expire} (UTC: {datetime.utcnow()})")
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-@router.post("/login")
+# Перебор пароля ограничен и по IP, и по логину; bcrypt — не больше BCRYPT_CONCURRENCY одновременно
+@router.post("/login", dependencies=[
+    Depends(rate_limit("login", 10, 60)),
+    Depends(rate_limit("login-user", 5, 60, key="field", field="username")),
+    Depends(bcrypt_slots),
+])
 async def login_post(
+    request: Request,
     username: str = Form(...),
     password: str = Form(...),
     db: Session = Depends(get_db),
@@ -39,15 +29,14 @@ async def login_post(
 ):
     logger.info(f"Login request: username={username}")
     user = db.query(User).filter(User.username == username).first()
-    if not user or not pwd_context.verify(password, user.password_hash):
+    if not user or not await run_bcrypt(pwd_context.verify, password, user.password_hash):
         logger.warning(f"Login failed for username={username}")
         return JSONResponse({"success": False, "error": "Invalid username or password"})
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": username, "is_admin": user.is_admin},
-        expires_delta=access_token_expires
-    )
+    access_token = create_access_token(username, user.is_admin)
+    # Дальше сессию продлевает refresh_token — без повторной проверки пароля
+    refresh_token = issue_refresh_token(db, user)
+    db.commit()
 
     resp = JSONResponse({
         "success": True,
@@ -55,16 +44,14 @@ async def login_post(
         "username": username,
         "is_admin": user.is_admin
     })
-    resp.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,
-        samesite="none",  # For cross-origin cookies
-        secure=True,       # Must be True for HTTPS (ngrok)
-        max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        path="/"
-    )
+    set_session_cookies(resp, user.is_admin, access_token, refresh_token)
     logger.info(f"Cookie set in login: access_token={access_token[:20]}...")
+    # Корзина, собранная до входа, переносится в корзину пользователя
+    try:
+        merge_guest_cart(request, resp, db, user.id)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Guest cart merge failed for {username}: {e}")
     return resp
 
 @router.get("/api/me")
@@ -108,7 +95,7 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)):
         return JSONResponse({"success": False, "error": "Internal error"})
     
 
-@router.post("/signup")
+@router.post("/signup", dependencies=[Depends(rate_limit("signup", 5, 600)), Depends(bcrypt_slots)])
 async def signup_post(
     username: str = Form(...),
     email: str = Form(...),
@@ -137,7 +124,7 @@ async def signup_post(
         raise HTTPException(status_code=400, detail="Email already exists")
     
     # Хэшируем пароль
-    hashed_password = pwd_context.hash(password)
+    hashed_password = await run_bcrypt(pwd_context.hash, password)
     
     # Создаём пользователя
     new_user = User(
@@ -0,0 +1,182 @@
+"""Скользящая сессия: короткий access_token и ротация refresh-токенов.
+
+access_token — JWT на ACCESS_TOKEN_EXPIRE_MINUTES (у админа —
+ADMIN_ACCESS_TOKEN_MINUTES). Рядом в cookie refresh_token лежит случайный
+токен на REFRESH_TOKEN_DAYS дней; в БД хранится только его SHA-256 с
+уникальным индексом. Когда access_token истёк, middleware в main.py
+обменивает refresh_token на новую пару без проверки пароля (bcrypt): старый
+токен отзывается, новый продолжает ту же цепочку (family).
+
+Повторное предъявление уже заменённого токена означает, что его украли, —
+отзывается вся цепочка. Исключение — первые REFRESH_REUSE_GRACE_SECONDS после
+ротации: параллельные запросы с тем же старым cookie получают только новый
+access_token.
+"""
+import hashlib
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from fastapi import Response
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from database import RefreshToken, SessionLocal, User
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")  # Matches main.py
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Админский access_token короткий, чтобы выход из админки действовал быстро
+ADMIN_ACCESS_TOKEN_MINUTES = int(os.getenv("ADMIN_ACCESS_TOKEN_MINUTES", "5"))
+REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", "14"))
+ADMIN_REFRESH_TOKEN_HOURS = int(os.getenv("ADMIN_REFRESH_TOKEN_HOURS", "12"))
+REFRESH_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "30"))
+
+ACCESS_COOKIE = "access_token"
+REFRESH_COOKIE = "refresh_token"
+# Параметры cookie как у прежних форм входа: магазин — cross-site (ngrok), админка — lax
+USER_COOKIE_OPTIONS = {"httponly": True, "samesite": "none", "secure": True, "path": "/"}
+ADMIN_COOKIE_OPTIONS = {"httponly": True, "samesite": "lax", "secure": False, "path": "/"}
+
+
+class InvalidRefreshToken(Exception):
+    pass
+
+
+def hash_token(raw: str) -> str:
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def access_token_minutes(is_admin: bool) -> int:
+    return ADMIN_ACCESS_TOKEN_MINUTES if is_admin else ACCESS_TOKEN_EXPIRE_MINUTES
+
+
+def create_access_token(username: str, is_admin: bool) -> str:
+    expire = datetime.utcnow() + timedelta(minutes=access_token_minutes(is_admin))
+    return jwt.encode({"sub": username, "is_admin": is_admin, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def access_token_valid(token: str) -> bool:
+    if not token:
+        return False
+    try:
+        jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return True
+    except JWTError:
+        return False
+
+
+def _refresh_lifetime(is_admin: bool) -> timedelta:
+    return timedelta(hours=ADMIN_REFRESH_TOKEN_HOURS) if is_admin else timedelta(days=REFRESH_TOKEN_DAYS)
+
+
+def _add_token(db: Session, user: User, family: str) -> tuple:
+    raw = secrets.token_urlsafe(32)
+    row = RefreshToken(
+        user_id=user.id,
+        token_hash=hash_token(raw),
+        family=family,
+        expires_at=datetime.utcnow() + _refresh_lifetime(user.is_admin),
+    )
+    db.add(row)
+    return raw, row
+
+
+def issue_refresh_token(db: Session, user: User) -> str:
+    """Новая цепочка при входе по паролю; фиксирует транзакцию вызывающий код"""
+    raw, _ = _add_token(db, user, secrets.token_hex(8))
+    return raw
+
+
+def rotate_refresh_token(db: Session, raw: str):
+    """(user, новый refresh-токен или None, если его уже выдал параллельный запрос)"""
+    now = datetime.utcnow()
+    row = db.query(RefreshToken).filter(RefreshToken.token_hash == hash_token(raw)).first()
+    if not row or row.expires_at <= now:
+        raise InvalidRefreshToken("unknown or expired")
+    user = db.get(User, row.user_id)
+    if not user:
+        raise InvalidRefreshToken("user not found")
+
+    if row.revoked_at:
+        if row.replaced_by and now - row.revoked_at <= timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS):
+            return user, None
+        revoked = revoke_family(db, row.family)
+        logger.warning(f"Refresh token reuse for user_id={user.id}, family {row.family} revoked ({revoked} tokens)")
+        raise InvalidRefreshToken("reused")
+
+    # Условный UPDATE: из двух одновременных ротаций побеждает одна
+    claimed = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.id == row.id, RefreshToken.revoked_at.is_(None))
+        .update({"revoked_at": now}, synchronize_session=False)
+    )
+    if not claimed:
+        return user, None
+    new_raw, new_row = _add_token(db, user, row.family)
+    db.flush()
+    row.replaced_by = new_row.id
+    return user, new_raw
+
+
+def revoke_family(db: Session, family: str) -> int:
+    return (
+        db.query(RefreshToken)
+        .filter(RefreshToken.family == family, RefreshToken.revoked_at.is_(None))
+        .update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+    )
+
+
+def revoke_user_tokens(db: Session, user_id: int) -> int:
+    """Смена пароля: все сессии пользователя заканчиваются с истечением access_token"""
+    return (
+        db.query(RefreshToken)
+        .filter(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+        .update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+    )
+
+
+def revoke_refresh_token(db: Session, raw: str) -> int:
+    """Выход: отзывает цепочку, к которой принадлежит токен"""
+    row = db.query(RefreshToken).filter(RefreshToken.token_hash == hash_token(raw)).first()
+    return revoke_family(db, row.family) if row else 0
+
+
+def refresh_session(raw: str) -> dict:
+    """Ротация в отдельной сессии БД (вызывается из middleware через to_thread)"""
+    db = SessionLocal()
+    try:
+        user, new_raw = rotate_refresh_token(db, raw)
+        db.commit()
+        return {
+            "username": user.username,
+            "is_admin": user.is_admin,
+            "access_token": create_access_token(user.username, user.is_admin),
+            "refresh_token": new_raw,
+        }
+    except InvalidRefreshToken:
+        db.commit()  # Отзыв цепочки при повторном использовании
+        raise
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def set_session_cookies(response: Response, is_admin: bool, access_token: str, refresh_token: str = None):
+    options = ADMIN_COOKIE_OPTIONS if is_admin else USER_COOKIE_OPTIONS
+    response.set_cookie(ACCESS_COOKIE, access_token, max_age=access_token_minutes(is_admin) * 60, **options)
+    if refresh_token:
+        response.set_cookie(REFRESH_COOKIE, refresh_token,
+                            max_age=int(_refresh_lifetime(is_admin).total_seconds()), **options)
+
+
+def clear_session_cookies(response: Response):
+    response.delete_cookie(ACCESS_COOKIE, path="/")
+    response.delete_cookie(REFRESH_COOKIE, path="/")
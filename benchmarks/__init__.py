@@ -0,0 +1 @@
+"""Бенчмарки магазина. Запуск: python -m benchmarks.<модуль>"""
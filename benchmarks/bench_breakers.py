@@ -0,0 +1,90 @@
+"""Поведение предохранителя PayPal против заглушки со сбоями.
+
+    python -m benchmarks.bench_breakers [--calls 30]
+
+Поднимает fakes.paypal на свободном порту и прогоняет create_paypal_checkout
+по фазам: норма → зависание (ответ дольше read-таймаута) → 503 → восстановление.
+Для каждой фазы печатает задержку вызовов и исходы: пока цепь разомкнута,
+вызов завершается за микросекунды вместо ожидания таймаута.
+"""
+import argparse
+import os
+import socket
+import statistics
+import threading
+import time
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake(port: int):
+    import uvicorn
+
+    from fakes.paypal import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def run_phase(label: str, calls: int, breaker, create):
+    timings, outcomes = [], {}
+    for i in range(calls):
+        t0 = time.perf_counter()
+        try:
+            create(i, 10.0, "http://localhost/ok", "http://localhost/cancel")
+            outcome = "ok"
+        except Exception as e:
+            outcome = type(e).__name__
+        timings.append(time.perf_counter() - t0)
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    timings.sort()
+    print(f"{label:<12} p50={statistics.median(timings) * 1000:8.1f}ms  "
+          f"max={timings[-1] * 1000:8.1f}ms  total={sum(timings):6.2f}s  "
+          f"state={breaker.state:<9} {outcomes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Circuit breaker против fakes.paypal")
+    parser.add_argument("--calls", type=int, default=30)
+    parser.add_argument("--open-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    port = free_port()
+    os.environ["PAYPAL_API_BASE"] = f"http://127.0.0.1:{port}"
+    os.environ["PAYPAL_READ_TIMEOUT"] = "1"
+    os.environ["BREAKER_OPEN_SECONDS"] = str(args.open_seconds)
+
+    import requests
+
+    from breakers import PAYPAL
+    from payments import create_paypal_checkout
+
+    start_fake(port)
+    faults_url = f"http://127.0.0.1:{port}/fake/faults"
+
+    print(f"breaker: window={PAYPAL._outcomes.maxlen} min_calls={PAYPAL.min_calls} "
+          f"failure_rate={PAYPAL.failure_rate} open={PAYPAL.open_seconds}s timeout={PAYPAL.timeout}")
+    run_phase("healthy", args.calls, PAYPAL, create_paypal_checkout)
+
+    requests.post(faults_url, json={"delay": 3, "error_rate": 0})
+    run_phase("hanging", args.calls, PAYPAL, create_paypal_checkout)
+
+    requests.post(faults_url, json={"delay": 0, "error_rate": 1})
+    time.sleep(args.open_seconds)
+    run_phase("http-503", args.calls, PAYPAL, create_paypal_checkout)
+
+    requests.post(faults_url, json={"delay": 0, "error_rate": 0})
+    time.sleep(args.open_seconds)
+    run_phase("recovered", args.calls, PAYPAL, create_paypal_checkout)
+    print(PAYPAL.snapshot())
+
+
+if __name__ == "__main__":
+    main()
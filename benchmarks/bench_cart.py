@@ -0,0 +1,110 @@
+"""Корзина на миллионах строк: поиск и добавление до и после ux_cart_user_product.
+
+    python -m benchmarks.bench_cart --rows 1000000 --users 100000
+
+Данные создаются во временной SQLite-базе, users.db не трогается.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+
+
+def seed(conn, rows: int, users: int, products: int):
+    batch = []
+    seen = set()
+    while len(seen) < rows:
+        key = (random.randint(1, users), str(random.randint(1, products)))
+        if key in seen:
+            continue
+        seen.add(key)
+        batch.append({"u": key[0], "p": key[1]})
+        if len(batch) == 50000:
+            conn.execute(text(
+                "INSERT INTO cart (user_id, product_id, name, price, image, quantity) "
+                "VALUES (:u, :p, 'Product', 9.99, '', 1)"), batch)
+            batch = []
+    if batch:
+        conn.execute(text(
+            "INSERT INTO cart (user_id, product_id, name, price, image, quantity) "
+            "VALUES (:u, :p, 'Product', 9.99, '', 1)"), batch)
+
+
+def timed(fn, samples: int):
+    timings = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    return statistics.median(timings) * 1e6, timings[int(len(timings) * 0.99) - 1] * 1e6
+
+
+def run_queries(conn, users: int, products: int, samples: int, upsert: bool):
+    def lookup():
+        conn.execute(text("SELECT * FROM cart WHERE user_id = :u"), {"u": random.randint(1, users)}).fetchall()
+
+    def read_modify_write():
+        params = {"u": random.randint(1, users), "p": str(random.randint(1, products))}
+        row = conn.execute(text("SELECT id FROM cart WHERE user_id = :u AND product_id = :p"), params).first()
+        if row:
+            conn.execute(text("UPDATE cart SET quantity = quantity + 1 WHERE id = :id"), {"id": row[0]})
+        else:
+            conn.execute(text(
+                "INSERT INTO cart (user_id, product_id, name, price, image, quantity) "
+                "VALUES (:u, :p, 'Product', 9.99, '', 1)"), params)
+
+    def atomic_upsert():
+        conn.execute(text(
+            "INSERT INTO cart (user_id, product_id, name, price, image, quantity) "
+            "VALUES (:u, :p, 'Product', 9.99, '', 1) "
+            "ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity"),
+            {"u": random.randint(1, users), "p": str(random.randint(1, products))})
+
+    results = {"get cart": timed(lookup, samples), "add (read-modify-write)": timed(read_modify_write, samples)}
+    if upsert:
+        results["add (atomic upsert)"] = timed(atomic_upsert, samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_cart.db")
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        # Прежняя схема: индексы только на id и product_id
+        conn.execute(text(
+            "CREATE TABLE cart (id INTEGER PRIMARY KEY, user_id INTEGER, product_id VARCHAR, "
+            "name VARCHAR, price FLOAT, image VARCHAR, quantity INTEGER)"))
+        conn.execute(text("CREATE INDEX ix_cart_product_id ON cart (product_id)"))
+        t0 = time.perf_counter()
+        seed(conn, args.rows, args.users, args.products)
+        print(f"seeded {args.rows} cart rows in {time.perf_counter() - t0:.1f}s ({path})")
+
+    samples = max(5, args.samples // 20)  # без индекса полный скан, меньше повторов
+    with engine.begin() as conn:
+        for name, (p50, p99) in run_queries(conn, args.users, args.products, samples, upsert=False).items():
+            print(f"before  {name:<26} p50={p50:9.0f}us p99={p99:9.0f}us")
+
+    with engine.begin() as conn:
+        t0 = time.perf_counter()
+        conn.execute(text("CREATE UNIQUE INDEX ux_cart_user_product ON cart (user_id, product_id)"))
+        print(f"built ux_cart_user_product in {time.perf_counter() - t0:.1f}s")
+
+    with engine.begin() as conn:
+        for name, (p50, p99) in run_queries(conn, args.users, args.products, args.samples, upsert=True).items():
+            print(f"after   {name:<26} p50={p50:9.0f}us p99={p99:9.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Холодный старт: время импорта модулей и до первого обслуженного запроса.
+
+    python bootstrap.py               # один раз, схема и админ
+    python -m benchmarks.bench_cold_start --runs 5
+
+Для каждого запуска поднимается отдельный `uvicorn main:app` и опрашивается
+/api/products, пока не вернёт 200.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_time(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_to_first_request(env) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited before serving (проверьте .env и python bootstrap.py)")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/products?limit=1", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ, RUN_EMBEDDED_WORKER="false")
+    env.setdefault("GETRESPONSE_API_KEY", "bench")
+    env.setdefault("GETRESPONSE_LIST_ID", "bench")
+    env.setdefault("GETRESPONSE_FROM_FIELD_ID", "bench")
+
+    for module in ("database", "main"):
+        samples = [import_time(module) for _ in range(args.runs)]
+        print(f"import {module:<8}: p50={statistics.median(samples) * 1000:.0f}ms")
+    samples = [time_to_first_request(env) for _ in range(args.runs)]
+    print(f"first request : p50={statistics.median(samples) * 1000:.0f}ms "
+          f"min={min(samples) * 1000:.0f}ms max={max(samples) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
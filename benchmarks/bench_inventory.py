@@ -0,0 +1,160 @@
+"""Конкурентные покупки одного «горячего» товара: наивное списание против резерва inventory.py.
+
+    python -m benchmarks.bench_inventory --threads 32 --checkouts 2000 --stock 500
+    python -m benchmarks.bench_inventory --database-url postgresql://shop@localhost/bench
+
+--threads потоков одновременно оформляют --checkouts покупок по --qty штук
+товара с остатком --stock. Стратегии:
+
+* naive — прочитать остаток, проверить, записать stock - qty через ORM;
+  между чтением и записью --think-ms «работы приложения»;
+* for_update — то же под SELECT … FOR UPDATE (только PostgreSQL): не
+  продаёт лишнего, но покупки одного товара выстраиваются в очередь;
+* atomic — inventory.reserve: один условный UPDATE.
+
+Для каждой печатает пропускную способность, p50/p99 покупки, сколько продано,
+сколько продано сверх остатка и расхождение остатка с продажами (потерянные
+обновления). По умолчанию — временная SQLite-база: запись там всегда
+сериализуется на уровне файла, поэтому разница в скорости видна на
+PostgreSQL, а разница в корректности — везде.
+"""
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Product
+from inventory import OutOfStock, reserve
+
+PRODUCT_ID = 1
+
+
+def make_engine(url: str, threads: int):
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+
+        @event.listens_for(engine, "connect")
+        def _pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA busy_timeout=30000")
+            cursor.close()
+        return engine
+    return create_engine(url, pool_size=threads, max_overflow=0)
+
+
+def checkout_naive(db, qty: int, think: float) -> bool:
+    product = db.get(Product, PRODUCT_ID)
+    if product.stock < qty:
+        db.rollback()
+        return False
+    time.sleep(think)
+    product.stock = product.stock - qty
+    db.commit()
+    return True
+
+
+def checkout_for_update(db, qty: int, think: float) -> bool:
+    product = db.query(Product).filter(Product.id == PRODUCT_ID).with_for_update().one()
+    if product.stock < qty:
+        db.rollback()
+        return False
+    time.sleep(think)
+    product.stock = product.stock - qty
+    db.commit()
+    return True
+
+
+def checkout_atomic(db, qty: int, think: float) -> bool:
+    try:
+        reserve(db, {PRODUCT_ID: qty})
+    except OutOfStock:
+        return False
+    time.sleep(think)
+    db.commit()
+    return True
+
+
+STRATEGIES = {"naive": checkout_naive, "for_update": checkout_for_update, "atomic": checkout_atomic}
+
+
+def run(engine, strategy: str, args) -> dict:
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        product = db.get(Product, PRODUCT_ID)
+        if product is None:
+            product = Product(id=PRODUCT_ID, name="Hot SKU", price=9.99, image="", category="bench")
+            db.add(product)
+        product.stock = args.stock
+        db.commit()
+
+    checkout = STRATEGIES[strategy]
+    think = args.think_ms / 1000
+    latencies, lock = [], threading.Lock()
+    counts = {"sold": 0, "rejected": 0, "errors": 0}
+
+    def one(_):
+        started = time.perf_counter()
+        db = Session()
+        try:
+            outcome = "sold" if checkout(db, args.qty, think) else "rejected"
+        except Exception:
+            db.rollback()
+            outcome = "errors"
+        finally:
+            db.close()
+        elapsed = time.perf_counter() - started
+        with lock:
+            counts[outcome] += 1
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(one, range(args.checkouts)))
+    wall = time.perf_counter() - started
+
+    with Session() as db:
+        final_stock = db.get(Product, PRODUCT_ID).stock
+    sold_units = counts["sold"] * args.qty
+    latencies.sort()
+    return {
+        "strategy": strategy,
+        "checkouts_per_s": round(args.checkouts / wall),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        **counts,
+        "oversold_units": max(0, sold_units - args.stock),
+        "lost_updates": sold_units - (args.stock - final_stock),
+        "final_stock": final_stock,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--checkouts", type=int, default=2000)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--qty", type=int, default=1)
+    parser.add_argument("--think-ms", type=float, default=1.0, help="Работа приложения между резервом и коммитом")
+    parser.add_argument("--database-url", help="По умолчанию временная SQLite-база")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='shop-inventory-')}/inventory.db"
+    engine = make_engine(url, args.threads)
+    Base.metadata.create_all(bind=engine, tables=[Product.__table__])
+
+    strategies = ["naive", "atomic"]
+    if engine.dialect.name == "postgresql":
+        strategies.insert(1, "for_update")
+    print(f"{engine.dialect.name}: {args.threads} threads, {args.checkouts} checkouts x {args.qty}, stock {args.stock}")
+    for strategy in strategies:
+        print(run(engine, strategy, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""История заказов: OFFSET + ленивые позиции против keyset + JOIN.
+
+    python -m benchmarks.bench_orders --users 5 --orders 5000 --items 3
+
+Данные создаются во временной SQLite-базе, users.db не трогается.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Order, OrderItem, User
+from orders import fetch_order_page
+
+
+def seed(session, users: int, orders: int, items: int):
+    start = datetime.utcnow() - timedelta(days=365)
+    for u in range(users):
+        session.add(User(id=u + 1, username=f"user{u}", email=f"user{u}@example.com", password_hash="x"))
+    session.flush()
+    order_rows, item_rows = [], []
+    order_id = 0
+    for u in range(users):
+        for _ in range(orders):
+            order_id += 1
+            order_rows.append({
+                "id": order_id, "user_id": u + 1, "total": 0.0, "status": "paid",
+                "created_at": start + timedelta(seconds=random.randint(0, 365 * 86400)),
+            })
+            for i in range(items):
+                item_rows.append({
+                    "order_id": order_id, "product_id": str(random.randint(1, 500)),
+                    "name": f"Product {i}", "price": 9.99, "image": "", "quantity": 1,
+                })
+    session.bulk_insert_mappings(Order, order_rows)
+    session.bulk_insert_mappings(OrderItem, item_rows)
+    session.commit()
+
+
+def offset_page(session, user_id, page, limit):
+    """Прежний подход: OFFSET и ленивая загрузка order.order_items"""
+    orders = (
+        session.query(Order).filter(Order.user_id == user_id)
+        .order_by(Order.created_at.desc()).offset(page * limit).limit(limit).all()
+    )
+    return sum(len(o.order_items) for o in orders)
+
+
+def keyset_walk(session, user_id, limit):
+    cursor, pages = None, 0
+    while True:
+        orders, cursor = fetch_order_page(session, user_id, limit, cursor)
+        sum(len(o.order_items) for o in orders)
+        pages += 1
+        if not cursor:
+            return pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--orders", type=int, default=5000, help="заказов на пользователя")
+    parser.add_argument("--items", type=int, default=3, help="позиций на заказ")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_orders.db")
+    engine = create_engine(f"sqlite:///{path}")
+    statements = {"n": 0}
+    event.listen(engine, "before_cursor_execute", lambda *a, **k: statements.__setitem__("n", statements["n"] + 1))
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    session = Session()
+    t0 = time.perf_counter()
+    seed(session, args.users, args.orders, args.items)
+    print(f"seeded {args.users * args.orders} orders in {time.perf_counter() - t0:.1f}s ({path})")
+
+    user_id = 1
+    pages = args.orders // args.limit
+
+    session = Session()
+    statements["n"] = 0
+    timings = []
+    for page in range(pages):
+        t0 = time.perf_counter()
+        offset_page(session, user_id, page, args.limit)
+        timings.append(time.perf_counter() - t0)
+        session.expunge_all()
+    print(f"offset+lazy : {pages} pages, p50={statistics.median(timings) * 1000:.2f}ms "
+          f"last={timings[-1] * 1000:.2f}ms, SQL statements={statements['n']}")
+
+    session = Session()
+    statements["n"] = 0
+    t0 = time.perf_counter()
+    walked = keyset_walk(session, user_id, args.limit)
+    total = time.perf_counter() - t0
+    print(f"keyset+join : {walked} pages, avg={total / walked * 1000:.2f}ms/page, SQL statements={statements['n']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Страница товара: оболочка + /api/products/{id} против одного запроса со встроенными данными.
+
+    python -m benchmarks.bench_product_page --products 20000 --samples 300
+
+Наполняет временную SQLite-базу (benchmarks.seed) и гоняет main:app через
+TestClient в одном процессе, поэтому сетевой RTT не учитывается — в браузере
+второй круг к серверу добавляет ещё по RTT на каждый просмотр. Печатает
+медианы для прежней схемы (страница без данных, затем запрос к API) и для
+/product?id=… с похожими товарами, число SQL-запросов на просмотр и время
+построения индекса похожих товаров.
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.load import ROOT
+
+
+def median_ms(fn, ids, samples: int) -> float:
+    timings = []
+    for _ in range(samples):
+        product_id = random.choice(ids)
+        t0 = time.perf_counter()
+        fn(product_id)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--samples", type=int, default=300)
+    args = parser.parse_args()
+
+    db_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='shop-product-'), 'product.db')}"
+    subprocess.run([sys.executable, "-m", "benchmarks.seed", "--database-url", db_url, "--products", str(args.products),
+                    "--users", "10", "--carts", "0", "--orders", "0"],
+                   cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ.update({"DATABASE_URL": db_url, "RUN_EMBEDDED_WORKER": "false", "RATE_LIMIT_ENABLED": "false",
+                       "GETRESPONSE_API_KEY": "fake", "GETRESPONSE_LIST_ID": "fake", "GETRESPONSE_FROM_FIELD_ID": "fake"})
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    import catalog
+    import main as shop
+    from database import SessionLocal, engine
+    from related import related_index
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *a: queries.append(a[2]))
+    catalog.logger.disabled = True
+    client = TestClient(shop.app)
+    ids = list(range(1, args.products + 1))
+
+    def old_flow(product_id):
+        client.get("/product")
+        client.get(f"/api/products/{product_id}")
+
+    def new_flow(product_id):
+        client.get(f"/product?id={product_id}")
+
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    related_index(db)
+    build_ms = (time.perf_counter() - t0) * 1000
+    db.close()
+
+    results = {}
+    for name, fn in (("shell + api", old_flow), ("inlined", new_flow)):
+        fn(ids[0])
+        queries.clear()
+        results[name] = (median_ms(fn, ids, args.samples), len(queries) / args.samples)
+
+    print(f"products: {args.products}, related index build: {build_ms:.0f} ms")
+    print(f"{'flow':<12} {'requests':>8} {'ms/view':>8} {'sql/view':>9}")
+    for (name, (ms, sql)), requests in zip(results.items(), (2, 1)):
+        print(f"{name:<12} {requests:>8} {ms:>8.2f} {sql:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Матрица совместных покупок на 1M строк заказов и задержка выдачи рекомендаций.
+
+    python -m benchmarks.bench_recommendations --lines 1000000 --products 20000
+
+Синтетические заказы строятся прямо в NumPy: популярность товаров по закону
+Ципфа, размер корзины 1–8 товаров. Меряются полный пересчёт
+(CoPurchaseState.add + top_k + запись state.npz и neighbors.npy во временный
+каталог), добавление --increment новых заказов к сохранённому состоянию и
+выдача Recommender.also_bought из neighbors.npy через mmap.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+import recommendations
+from recommendations import CoPurchaseState, Recommender
+
+
+def synthetic_lines(lines: int, products: int, first_order: int, rng):
+    sizes = rng.integers(1, 9, size=lines // 4 + 1)
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), lines) + 1]
+    order_ids = np.repeat(np.arange(first_order, first_order + len(sizes)), sizes)[:lines]
+    product_ids = (rng.zipf(1.3, size=len(order_ids)) - 1) % products + 1
+    return order_ids.astype(np.int64), product_ids.astype(np.int64)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--increment", type=int, default=1000, help="Новых заказов для инкрементального шага")
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    directory = tempfile.mkdtemp(prefix="shop-recs-")
+    order_ids, product_ids = synthetic_lines(args.lines, args.products, 1, rng)
+    orders = int(order_ids.max())
+
+    state = CoPurchaseState()
+    _, add_s = timed(lambda: state.add(order_ids, product_ids))
+    neighbors, top_s = timed(state.top_k)
+    _, save_s = timed(lambda: (
+        state.save(recommendations.state_path(directory)),
+        np.save(recommendations.neighbors_path(directory), neighbors),
+    ))
+
+    new_orders, new_products = synthetic_lines(args.increment * 8, args.products, orders + 1, rng)
+    fresh = new_orders <= orders + args.increment
+    new_orders, new_products = new_orders[fresh], new_products[fresh]
+
+    def increment():
+        loaded = CoPurchaseState.load(recommendations.state_path(directory))
+        loaded.add(new_orders, new_products)
+        result = loaded.top_k()
+        loaded.save(recommendations.state_path(directory))
+        np.save(recommendations.neighbors_path(directory), result)
+
+    _, increment_s = timed(increment)
+
+    recommender = Recommender(recommendations.neighbors_path(directory))
+    recommender.also_bought(1)
+    ids = rng.integers(1, args.products + 1, size=args.lookups)
+    timings = []
+    for product_id in ids:
+        t0 = time.perf_counter()
+        recommender.also_bought(int(product_id), 4)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+
+    size_mb = os.path.getsize(recommendations.neighbors_path(directory)) / 1e6
+    print(f"order lines: {len(order_ids)}, orders: {orders}, products: {args.products}, "
+          f"pairs: {len(state.pair_keys) // 2}")
+    print(f"full build       count pairs {add_s:6.2f}s, top-{neighbors.shape[1]} {top_s:6.2f}s, "
+          f"write {save_s:5.2f}s, total {add_s + top_s + save_s:6.2f}s")
+    print(f"increment        {len(np.unique(new_orders))} orders ({len(new_orders)} lines): {increment_s:.2f}s incl. load/save")
+    print(f"neighbors.npy    {size_mb:.1f} MB")
+    print(f"also_bought      p50 {statistics.median(timings):.1f} us, p99 {timings[int(len(timings) * 0.99)]:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Стоимость продления сессии: вход по паролю (bcrypt) против ротации refresh-токена.
+
+    python -m benchmarks.bench_refresh --tokens 100000 --samples 50 --session-minutes 120
+
+Меряет процессорное время одной проверки пароля и одной ротации (поиск по
+хэшу в таблице с --tokens строк, отзыв, новый токен, commit) во временной
+SQLite-базе, затем считает CPU на вход для покупателя, который активен
+--session-minutes подряд: раньше каждые ACCESS_TOKEN_EXPIRE_MINUTES — новый
+вход по паролю, теперь — ротации и ни одного bcrypt у вернувшегося
+покупателя, пока жив refresh-токен.
+"""
+import argparse
+import math
+import os
+import secrets
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from auth_tokens import ACCESS_TOKEN_EXPIRE_MINUTES, hash_token, issue_refresh_token, rotate_refresh_token
+from database import Base, RefreshToken, User, pwd_context
+
+
+def cpu_ms(fn, samples: int) -> float:
+    timings = []
+    for _ in range(samples):
+        t0 = time.process_time()
+        fn()
+        timings.append((time.process_time() - t0) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=100_000, help="Строк в refresh_tokens")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--session-minutes", type=int, default=120)
+    parser.add_argument("--shoppers", type=int, default=1000, help="Активных покупателей для пересчёта в CPU-секунды")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_refresh.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+
+    password_hash = pwd_context.hash("bench-password")
+    user = User(username="bench", email="bench@example.com", password_hash=password_hash)
+    session.add(user)
+    session.commit()
+    expires = datetime.utcnow() + timedelta(days=14)
+    session.bulk_insert_mappings(RefreshToken, [
+        {"user_id": user.id, "token_hash": hash_token(secrets.token_urlsafe(32)), "family": secrets.token_hex(8),
+         "expires_at": expires}
+        for _ in range(args.tokens)
+    ])
+    session.commit()
+
+    login_ms = cpu_ms(lambda: pwd_context.verify("bench-password", password_hash), args.samples)
+
+    current = [issue_refresh_token(session, user)]
+    session.commit()
+
+    def rotate():
+        _, current[0] = rotate_refresh_token(session, current[0])
+        session.commit()
+
+    rotate_ms = cpu_ms(rotate, args.samples)
+
+    renewals = math.ceil(args.session_minutes / ACCESS_TOKEN_EXPIRE_MINUTES)
+    before = renewals * login_ms
+    first_visit = login_ms + (renewals - 1) * rotate_ms
+    returning = renewals * rotate_ms
+    print(f"refresh_tokens rows: {args.tokens}, access token: {ACCESS_TOKEN_EXPIRE_MINUTES} min")
+    print(f"bcrypt verify      {login_ms:8.2f} ms CPU")
+    print(f"refresh rotation   {rotate_ms:8.2f} ms CPU  ({login_ms / rotate_ms:.0f}x cheaper)")
+    print(f"{args.session_minutes}-minute session, {renewals} renewals:")
+    print(f"  password logins only      {before:8.1f} ms CPU")
+    print(f"  refresh, first visit      {first_visit:8.1f} ms CPU")
+    print(f"  refresh, returning        {returning:8.1f} ms CPU")
+    print(f"steady state for {args.shoppers} returning shoppers: "
+          f"{before * args.shoppers / 1000:.1f}s -> {returning * args.shoppers / 1000:.1f}s CPU per session")
+
+
+if __name__ == "__main__":
+    main()
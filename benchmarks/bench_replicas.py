@@ -0,0 +1,100 @@
+"""Реплики для чтения: read-your-writes для корзины и куда уходят запросы витрины.
+
+    python -m benchmarks.bench_replicas --lag 1 --rounds 40
+
+Наполняет временную SQLite-базу (benchmarks.seed), копирует её в реплику и
+запускает fakes.replica.Replicator, который догоняет основную базу раз в
+--lag секунд. main:app работает в этом же процессе через TestClient с
+DATABASE_REPLICA_URLS. Каждый раунд bench-пользователь добавляет товар в
+корзину и сразу читает /api/cart дважды: с cookie read_primary_until от
+POST и без неё. Печатает, сколько раз корзина оказалась устаревшей в обоих
+случаях (с cookie должно быть 0), сколько SQL-запросов каталога ушло в
+реплику и в основную БД, и медианы GET /api/products.
+
+Пропускная способность под смешанной нагрузкой:
+    python -m benchmarks.load --mix browse=70,cart=30 --replica-lag 1
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.load import ROOT
+from benchmarks.seed import BENCH_PASSWORD
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lag", type=float, default=1.0, help="Отставание реплики, секунды")
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--samples", type=int, default=300)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="shop-replicas-")
+    primary, replica = os.path.join(workdir, "primary.db"), os.path.join(workdir, "replica.db")
+    subprocess.run([sys.executable, "-m", "benchmarks.seed", "--database-url", f"sqlite:///{primary}",
+                    "--products", str(args.products), "--users", "1", "--carts", "0", "--orders", "0"],
+                   cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    from fakes.replica import Replicator, copy_once
+
+    copy_once(primary, replica)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{primary}", "DATABASE_REPLICA_URLS": f"sqlite:///{replica}",
+        "REPLICA_MAX_LAG": str(args.lag * 2), "RUN_EMBEDDED_WORKER": "false", "RATE_LIMIT_ENABLED": "false",
+        "GETRESPONSE_API_KEY": "fake", "GETRESPONSE_LIST_ID": "fake", "GETRESPONSE_FROM_FIELD_ID": "fake",
+    })
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    import main as shop
+    from database import engine, read_engines
+    from main import READ_PIN_COOKIE
+
+    queries = {"primary": 0, "replica": 0}
+    event.listen(engine, "before_cursor_execute", lambda *a: queries.__setitem__("primary", queries["primary"] + 1))
+    event.listen(read_engines[0], "before_cursor_execute",
+                 lambda *a: queries.__setitem__("replica", queries["replica"] + 1))
+
+    replicator = Replicator(primary, replica, args.lag)
+    replicator.start()
+    # Cookie передаются вручную, как в benchmarks.load; банку клиента очищаем после каждого ответа
+    client = TestClient(shop.app)
+    login = client.post("/login", data={"username": "bench0", "password": BENCH_PASSWORD}, follow_redirects=False)
+    auth = f"access_token={login.cookies['access_token']}"
+    client.cookies.clear()
+
+    stale = {"with_cookie": 0, "without_cookie": 0}
+    try:
+        for i in range(args.rounds):
+            added = client.post("/api/cart", headers={"Cookie": auth}, json={
+                "product_id": str(i + 1), "name": f"Product {i + 1}", "price": 10.0, "image": "", "quantity": 1})
+            pin = added.cookies.get(READ_PIN_COOKIE)
+            client.cookies.clear()
+            with_pin = client.get("/api/cart", headers={"Cookie": f"{auth}; {READ_PIN_COOKIE}={pin}"}).json()["data"]
+            without_pin = client.get("/api/cart", headers={"Cookie": auth}).json()["data"]
+            stale["with_cookie"] += len(with_pin) != i + 1
+            stale["without_cookie"] += len(without_pin) != i + 1
+            time.sleep(random.uniform(0, args.lag / 4))
+    finally:
+        replicator.stop()
+    print(f"cart reads after write, {args.rounds} rounds, replica lag {args.lag}s: stale {stale}")
+
+    queries.update(primary=0, replica=0)
+    timings = []
+    for _ in range(args.samples):
+        page = random.randint(1, 50)
+        t0 = time.perf_counter()
+        client.get(f"/api/products?page={page}&sort=price-low")
+        timings.append((time.perf_counter() - t0) * 1000)
+    print(f"GET /api/products x{args.samples}: median {statistics.median(timings):.2f} ms, SQL queries {queries}")
+
+
+if __name__ == "__main__":
+    main()
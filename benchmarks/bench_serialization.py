@@ -0,0 +1,99 @@
+"""Сериализация страницы каталога: Pydantic + response_model + json против fastjson.
+
+    python -m benchmarks.bench_serialization --sizes 9,100,1000 --repeat 200
+
+Для каждого размера страницы из несохранённых объектов Product сравнивает:
+  pydantic  — прежний путь /api/products: ProductBase.from_orm на каждый товар,
+              повторная проверка по response_model (serialize_response) и
+              JSONResponse со stdlib json;
+  orjson    — catalog.encode_product_list при пустом кэше (первый запрос);
+  cached    — то же с закодированными товарами из кэша (повторные запросы).
+Печатает медиану времени на ответ и размер тела; тела всех путей совпадают
+как JSON.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import warnings
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+import catalog
+from benchmarks.seed import ADJECTIVES, CATEGORIES, IMAGES, NOUNS
+from database import Product
+from main import ProductBase, ProductsResponse
+
+RESPONSE_FIELD = create_model_field("Response_get_products", ProductsResponse)
+LOOP = asyncio.new_event_loop()
+
+
+def make_products(n: int):
+    return [
+        Product(
+            id=i + 1,
+            name=f"{ADJECTIVES[i % len(ADJECTIVES)]} {NOUNS[i % len(NOUNS)]} {i}",
+            price=round(5 + (i * 37 % 500) + 0.99, 2),
+            image=IMAGES[i % len(IMAGES)],
+            category=CATEGORIES[i % len(CATEGORIES)],
+            is_new_arrival=i % 10 == 0,
+        )
+        for i in range(n)
+    ]
+
+
+def pydantic_path(products) -> bytes:
+    model = ProductsResponse(
+        success=True, data=[ProductBase.from_orm(p) for p in products],
+        total=len(products), page=1, limit=len(products),
+    )
+    content = LOOP.run_until_complete(serialize_response(field=RESPONSE_FIELD, response_content=model))
+    return JSONResponse(content).body
+
+
+def orjson_path(products) -> bytes:
+    catalog.invalidate_catalog_caches()
+    return catalog.encode_product_list(products, total=len(products), page=1, limit=len(products), facets=None)
+
+
+def cached_path(products) -> bytes:
+    return catalog.encode_product_list(products, total=len(products), page=1, limit=len(products), facets=None)
+
+
+def median_us(fn, products, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(products)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="9,100,1000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    catalog.logger.disabled = True  # invalidate_catalog_caches пишет в лог на каждой итерации
+    warnings.simplefilter("ignore", DeprecationWarning)  # from_orm, как в прежнем main.py
+
+    paths = {"pydantic": pydantic_path, "orjson": orjson_path, "cached": cached_path}
+    print(f"{'products':>8} {'path':<9} {'us/resp':>10} {'bytes':>8} {'speedup':>8}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        products = make_products(size)
+        bodies = {name: fn(products) for name, fn in paths.items()}
+        reference = json.loads(bodies["pydantic"])
+        for name, body in bodies.items():
+            assert json.loads(body) == reference, f"{name}: тело отличается"
+        base = None
+        for name, fn in paths.items():
+            us = median_us(fn, products, args.repeat)
+            base = base or us
+            print(f"{size:>8} {name:<9} {us:>10.1f} {len(bodies[name]):>8} {base / us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Всплеск подписок: локальная вставка и догоняющая синхронизация с GetResponse.
+
+    python -m benchmarks.bench_subscribers --signups 300 --upstream-rate 20 --rate 25
+
+Поднимает fakes.getresponse с FAKE_GETRESPONSE_RATE=--upstream-rate запросов
+в секунду, вставляет --signups подписок (каждая десятая — повтор) во
+временную SQLite-базу и меряет задержку add_subscriber — всё, что теперь
+делает /subscribe. Затем гоняет subscribers.sync_batch с tasks.create_contact,
+пока очередь не опустеет: --rate выше лимита заглушки, чтобы проверить
+паузы по 429. Печатает время синхронизации, число 429 и сверяет контакты в
+заглушке с уникальными email.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.load import ROOT, free_port, wait_ready
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--signups", type=int, default=300)
+    parser.add_argument("--upstream-rate", type=float, default=20, help="Лимит заглушки, запросов в секунду")
+    parser.add_argument("--rate", type=float, default=25, help="GETRESPONSE_RATE синхронизации")
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="shop-subscribers-")
+    port = free_port()
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'subscribers.db')}",
+        "GETRESPONSE_API_BASE": f"http://127.0.0.1:{port}/v3",
+        "GETRESPONSE_API_KEY": "fake",
+    })
+    log_path = os.path.join(workdir, "getresponse.log")
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "fakes.getresponse:app", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env={**os.environ, "FAKE_GETRESPONSE_RATE": str(args.upstream_rate)}, stdout=log, stderr=log,
+        )
+    try:
+        wait_ready(f"http://127.0.0.1:{port}/fake/stats", proc, log_path)
+
+        import subscribers
+        import tasks
+        from database import SessionLocal, init_db
+
+        init_db()
+        subscribers.GETRESPONSE_RATE = args.rate
+        subscribers.GETRESPONSE_SYNC_BATCH = args.batch
+        db = SessionLocal()
+
+        timings = []
+        for i in range(args.signups):
+            email = f"fan{i - 1 if i % 10 == 9 else i}@example.com"
+            t0 = time.perf_counter()
+            subscribers.add_subscriber(db, email, "fake")
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+
+        started = time.perf_counter()
+        totals = {"synced": 0, "retry": 0, "failed": 0, "postponed": 0}
+        while subscribers.status_counts(db).get("pending"):
+            counts = subscribers.sync_batch(db, tasks.create_contact)
+            for key, value in counts.items():
+                totals[key] += value
+            if not counts["synced"] and not counts["failed"]:
+                time.sleep(0.2)
+        elapsed = time.perf_counter() - started
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/fake/stats") as response:
+            stats = json.loads(response.read())
+        unique = subscribers.status_counts(db)
+        db.close()
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    print(f"signups: {args.signups}, upstream limit: {args.upstream_rate}/s, sync rate: {args.rate}/s")
+    print(f"add_subscriber   p50 {statistics.median(timings):.2f} ms, "
+          f"p99 {timings[int(len(timings) * 0.99) - 1]:.2f} ms, max {timings[-1]:.2f} ms")
+    print(f"sync             {elapsed:.1f}s, {totals}, subscribers by status: {unique}")
+    print(f"fake getresponse {stats}")
+    assert stats["known_contacts"] == unique.get("synced", 0), "контакты в заглушке не совпадают с synced"
+
+
+if __name__ == "__main__":
+    main()
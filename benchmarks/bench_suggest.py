@@ -0,0 +1,110 @@
+"""Подсказки поиска: индекс в памяти против /api/products?search= на каждый символ.
+
+    python -m benchmarks.bench_suggest --products 20000 --queries 2000
+
+Наполняет временную SQLite-базу (benchmarks.seed) и «печатает» случайные
+названия товаров по буквам: каждый префикс — один запрос. Печатает время
+сборки индекса и точечной правки (upsert), p50/p99 ответа индекса без
+HTTP (готовый ответ из памяти и промах с поиском по диапазону ключей) и
+медианы GET /api/products/suggest против прежнего GET /api/products?search=
+через TestClient.
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.load import ROOT
+
+
+def percentiles_us(timings) -> str:
+    timings = sorted(timings)
+    return (f"p50 {statistics.median(timings) * 1e6:.1f} µs, "
+            f"p99 {timings[int(len(timings) * 0.99) - 1] * 1e6:.1f} µs")
+
+
+def typed_prefixes(names, count: int, rng: random.Random):
+    """Префиксы так, как их набирает пользователь: «b», «bu», «bud», …"""
+    prefixes = []
+    while len(prefixes) < count:
+        name = rng.choice(names).lower()
+        prefixes.extend(name[:n] for n in range(1, min(len(name), 10) + 1))
+    return prefixes[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--http-queries", type=int, default=300)
+    args = parser.parse_args()
+
+    db_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='shop-suggest-'), 'suggest.db')}"
+    subprocess.run([sys.executable, "-m", "benchmarks.seed", "--database-url", db_url, "--products", str(args.products),
+                    "--users", "10", "--carts", "0", "--orders", str(args.products // 4)],
+                   cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ.update({"DATABASE_URL": db_url, "RUN_EMBEDDED_WORKER": "false", "RATE_LIMIT_ENABLED": "false",
+                       "GETRESPONSE_API_KEY": "fake", "GETRESPONSE_LIST_ID": "fake", "GETRESPONSE_FROM_FIELD_ID": "fake"})
+
+    from fastapi.testclient import TestClient
+
+    import catalog
+    import main as shop
+    import suggest
+    from database import SessionLocal
+
+    catalog.logger.disabled = True
+    suggest.logger.disabled = True
+    rng = random.Random(7)
+    db = SessionLocal()
+
+    started = time.perf_counter()
+    index = suggest.build_index(db)
+    print(f"build: {args.products} products, {len(index.entries)} keys, {time.perf_counter() - started:.2f} s")
+
+    names = [p["name"] for p in index.products.values()]
+    prefixes = typed_prefixes(names, args.queries, rng)
+
+    misses = []
+    for prefix in prefixes:
+        index._top.clear()
+        index._responses.clear()
+        t0 = time.perf_counter()
+        index.response(prefix)
+        misses.append(time.perf_counter() - t0)
+    for prefix in prefixes:
+        index.response(prefix)
+    hits = []
+    for prefix in prefixes:
+        t0 = time.perf_counter()
+        index.response(prefix)
+        hits.append(time.perf_counter() - t0)
+    print(f"response, memoized: {percentiles_us(hits)}")
+    print(f"response, cold (range scan + encode): {percentiles_us(misses)}")
+
+    product = dict(rng.choice(list(index.products.values())), name="Quantum Widget")
+    t0 = time.perf_counter()
+    index.upsert(product)
+    print(f"upsert: {(time.perf_counter() - t0) * 1000:.2f} ms, "
+          f"'quan' -> {[p['name'] for p in index.suggest('quan')['products']]}")
+    db.close()
+
+    client = TestClient(shop.app)
+    client.get("/api/products/suggest?q=a")
+    http_prefixes = prefixes[:args.http_queries]
+    for label, url in (("GET /api/products/suggest", "/api/products/suggest?q={}"),
+                       ("GET /api/products?search=", "/api/products?search={}&limit=8")):
+        timings = []
+        for prefix in http_prefixes:
+            t0 = time.perf_counter()
+            client.get(url.format(prefix))
+            timings.append(time.perf_counter() - t0)
+        print(f"{label}: median {statistics.median(timings) * 1000:.2f} ms over {len(timings)} typed prefixes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Пропускная способность каталога при одном и нескольких процессах gunicorn.
+
+    python -m benchmarks.bench_workers --workers 1,5 --concurrency 32 --duration 20
+
+Для каждого числа воркеров поднимает стенд benchmarks.load с --server serve
+(gunicorn.conf.py, UvicornWorker) и гоняет только просмотр и поиск по
+каталогу. По умолчанию сравнивает 1 воркер с 2 * ядра + 1. Прирост
+ограничен числом ядер: на одноядерной машине несколько воркеров дадут
+только накладные расходы на переключение, а клиент нагрузки делит то же
+ядро с приложением.
+"""
+import argparse
+import os
+
+from benchmarks import load
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default=f"1,{2 * cores + 1}", help="Числа воркеров через запятую")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--mix", default="browse=70,search=30")
+    parser.add_argument("--products", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = {}
+    for workers in [int(w) for w in args.workers.split(",")]:
+        run_args = load.build_parser().parse_args([
+            "--server", "serve", "--workers", str(workers), "--mix", args.mix,
+            "--concurrency", str(args.concurrency), "--duration", str(args.duration),
+            "--warmup", str(args.warmup), "--products", str(args.products),
+        ])
+        print(f"--- {workers} worker(s)")
+        summary = load.run(run_args)
+        load.print_summary(summary)
+        results[workers] = summary["total"]
+
+    print(f"cpu cores: {cores}, concurrency: {args.concurrency}, mix: {args.mix}")
+    print(f"{'workers':>8} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    base = results[min(results)]["rps"] or 1
+    for workers, total in results.items():
+        print(f"{workers:>8} {total['rps']:>8.1f} {total['p50_ms']:>8.1f} {total['p95_ms']:>8.1f} "
+              f"{total['p99_ms']:>8.1f} {total['errors']:>7}  x{total['rps'] / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
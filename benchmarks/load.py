@@ -0,0 +1,462 @@
+"""Нагрузочный прогон сценариев против main:app с заглушками PayPal, SMTP и GetResponse.
+
+    python -m benchmarks.load --concurrency 16 --duration 30 --output results/HEAD.json
+    python -m benchmarks.load --mix browse=60,search=20,cart=10,checkout=10
+    python -m benchmarks.load --compare results/base.json results/HEAD.json
+
+Во временной директории создаётся SQLite-база (benchmarks.seed), поднимаются
+fakes.paypal, fakes.getresponse, fakes.smtp и `uvicorn main:app` (или
+gunicorn через serve.py при --server serve) со встроенным воркером;
+ограничение частоты запросов отключено. Затем --concurrency виртуальных
+пользователей (у каждого свой bench-аккаунт) в цикле выполняют случайные
+сценарии с весами --mix, пока не истекут --warmup + --duration секунд;
+замеры прогрева отбрасываются. С --replica-lag витрина читает из копии базы
+(fakes.replica), отстающей на столько секунд.
+
+По каждому маршруту печатаются число запросов, ошибки, RPS и p50/p95/p99;
+--output сохраняет то же в JSON вместе с коммитом и параметрами прогона,
+--compare сравнивает два таких файла. Клиент работает в одном процессе с
+asyncio, поэтому на многоядерном сервере он может упереться в CPU раньше
+приложения — это видно по загрузке процесса benchmarks.load.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from datetime import datetime
+
+import httpx
+
+from benchmarks.seed import ADJECTIVES, BENCH_PASSWORD, CATEGORIES, NOUNS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = "browse=50,search=20,cart=15,checkout=10,login=5"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Ближайший ранг: значение, не превышенное долей q замеров"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.recording = False
+        self.latencies = {}  # маршрут -> [секунды]
+        self.errors = {}
+        self.iterations = {}
+
+    def record(self, route: str, seconds: float, ok: bool):
+        if not self.recording:
+            return
+        self.latencies.setdefault(route, []).append(seconds)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def iteration(self, scenario: str, ok: bool):
+        if not self.recording:
+            return
+        done, failed = self.iterations.get(scenario, (0, 0))
+        self.iterations[scenario] = (done + 1, failed + (0 if ok else 1))
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        everything = []
+        for route, values in sorted(self.latencies.items()):
+            values.sort()
+            everything.extend(values)
+            routes[route] = route_stats(values, self.errors.get(route, 0), elapsed)
+        everything.sort()
+        return {
+            "elapsed": round(elapsed, 2),
+            "total": route_stats(everything, sum(self.errors.values()), elapsed),
+            "routes": routes,
+            "scenarios": {name: {"iterations": done, "failed": failed} for name, (done, failed) in sorted(self.iterations.items())},
+        }
+
+
+def route_stats(values, errors: int, elapsed: float) -> dict:
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round((values[-1] if values else 0) * 1000, 2),
+    }
+
+
+class ScenarioFailed(Exception):
+    pass
+
+
+class VirtualUser:
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder: Recorder, products: int, paypal_url: str, seed: int):
+        self.username = f"bench{index}"
+        self.client = client
+        self.recorder = recorder
+        self.products = products
+        self.paypal_url = paypal_url
+        self.rng = random.Random(seed * 1000 + index)
+        self.token = None
+        self.read_pin = None  # read_primary_until после записи (read-your-writes при репликах)
+
+    async def call(self, method: str, route: str, url: str, expect=(200,), **kwargs):
+        # Cookie выставляются с secure=True, поэтому по http их передаём вручную
+        cookies = []
+        if self.token:
+            cookies.append(f"access_token={self.token}")
+        if self.read_pin:
+            cookies.append(f"read_primary_until={self.read_pin}")
+        if cookies:
+            kwargs.setdefault("headers", {})["Cookie"] = "; ".join(cookies)
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code in expect
+            for header in response.headers.get_list("set-cookie"):
+                if header.startswith("read_primary_until="):
+                    self.read_pin = header.split(";", 1)[0].split("=", 1)[1]
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.recorder.record(f"{method} {route}", time.perf_counter() - started, ok)
+        if not ok:
+            raise ScenarioFailed(f"{method} {url}: {response.status_code if response is not None else 'no response'}")
+        return response
+
+    def product_id(self) -> int:
+        # Популярные товары запрашиваются чаще (примерно закон Ципфа)
+        return min(self.products, int(self.rng.paretovariate(1.2)))
+
+    async def login(self):
+        response = await self.call("POST", "/login", "/login",
+                                   data={"username": self.username, "password": BENCH_PASSWORD})
+        for header in response.headers.get_list("set-cookie"):
+            if header.startswith("access_token="):
+                self.token = header.split(";", 1)[0].split("=", 1)[1]
+        if not self.token:
+            raise ScenarioFailed(f"login failed for {self.username}")
+
+    async def ensure_login(self):
+        if not self.token:
+            await self.login()
+
+    async def add_to_cart(self) -> int:
+        product_id = self.product_id()
+        await self.call("POST", "/api/cart", "/api/cart", json={
+            "product_id": str(product_id), "name": f"Product {product_id}",
+            "price": 10.0, "image": "", "quantity": self.rng.randint(1, 2),
+        })
+        return product_id
+
+
+async def scenario_browse(vu: VirtualUser):
+    page = vu.rng.randint(1, 5)
+    sort = vu.rng.choice(["default", "price-low", "price-high", "latest"])
+    await vu.call("GET", "/", "/")
+    await vu.call("GET", "/api/session", "/api/session")
+    await vu.call("GET", "/shop", f"/shop?page={page}&sort={sort}")
+    await vu.call("GET", "/api/products", f"/api/products?page={page}&sort={sort}&category={vu.rng.choice(CATEGORIES)}")
+    await vu.call("GET", "/api/products/{id}", f"/api/products/{vu.product_id()}")
+    await vu.call("GET", "/api/collections", "/api/collections")
+
+
+async def scenario_search(vu: VirtualUser):
+    term = vu.rng.choice(NOUNS + ADJECTIVES)
+    await vu.call("GET", "/api/products?search", f"/api/products?search={term}&facets=true")
+    await vu.call("GET", "/api/products?search", f"/api/products?search={term}&page=2")
+
+
+async def scenario_cart(vu: VirtualUser):
+    await vu.ensure_login()
+    product_id = await vu.add_to_cart()
+    await vu.call("GET", "/api/cart", "/api/cart")
+    await vu.call("PUT", "/api/cart/{id}", f"/api/cart/{product_id}", json={"quantity": 3})
+    await vu.call("DELETE", "/api/cart/{id}", f"/api/cart/{product_id}")
+
+
+async def scenario_login(vu: VirtualUser):
+    vu.token = None
+    await vu.login()
+
+
+async def scenario_checkout(vu: VirtualUser):
+    await vu.ensure_login()
+    await vu.add_to_cart()
+    created = (await vu.call("POST", "/api/create-paypal-order", "/api/create-paypal-order")).json()
+    # Одобрение на стороне PayPal в замеры не входит; заглушка шлёт приложению
+    # вебхук CHECKOUT.ORDER.APPROVED, и захват выполняет фоновая сверка
+    paypal_order_id = created["approval_url"].rstrip("/").rsplit("/", 1)[-1]
+    await vu.client.post(f"{vu.paypal_url}/fake/approve/{paypal_order_id}")
+    await vu.call("GET", "/api/capture-paypal-order", f"/api/capture-paypal-order?order_id={created['order_id']}&token={paypal_order_id}",
+                  expect=(303,), follow_redirects=False)
+
+
+async def scenario_subscribe(vu: VirtualUser):
+    await vu.call("POST", "/subscribe", "/subscribe", json={"email": f"load-{uuid.uuid4().hex[:12]}@example.com"})
+
+
+async def scenario_contact(vu: VirtualUser):
+    await vu.call("POST", "/contact", "/contact", json={
+        "email": f"{vu.username}@example.com", "phone": "+10000000000", "message": "Load test"})
+
+
+SCENARIOS = {
+    "browse": scenario_browse,
+    "search": scenario_search,
+    "cart": scenario_cart,
+    "login": scenario_login,
+    "checkout": scenario_checkout,
+    "subscribe": scenario_subscribe,
+    "contact": scenario_contact,
+}
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Неизвестный сценарий {name!r}; есть: {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def drive(base_url: str, paypal_url: str, args, mix: dict) -> dict:
+    recorder = Recorder()
+    names, weights = list(mix), list(mix.values())
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        deadline = time.monotonic() + args.warmup + args.duration
+
+        async def run_user(index: int):
+            vu = VirtualUser(index, client, recorder, args.products, paypal_url, args.seed)
+            while time.monotonic() < deadline:
+                name = vu.rng.choices(names, weights)[0]
+                try:
+                    await SCENARIOS[name](vu)
+                    recorder.iteration(name, True)
+                except ScenarioFailed:
+                    recorder.iteration(name, False)
+
+        async def start_recording():
+            await asyncio.sleep(args.warmup)
+            recorder.recording = True
+
+        started = time.monotonic()
+        await asyncio.gather(start_recording(), *(run_user(i) for i in range(args.concurrency)))
+        elapsed = time.monotonic() - started - args.warmup
+    return recorder.summary(elapsed)
+
+
+def wait_ready(url: str, proc: subprocess.Popen, log_path: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Процесс завершился при старте, см. {log_path}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status < 500:
+                    return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"{url} не ответил за {timeout:.0f}s, см. {log_path}")
+
+
+def spawn(command, env, workdir: str, name: str):
+    log_path = os.path.join(workdir, f"{name}.log")
+    log = open(log_path, "w")
+    proc = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return proc, log_path
+
+
+def app_command(args, port: int):
+    if args.server == "serve":
+        return [sys.executable, "serve.py", "--workers", str(args.workers), "--bind", f"127.0.0.1:{port}"]
+    return [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"]
+
+
+def start_stack(args, workdir: str):
+    """Заглушки и приложение: (app_url, paypal_url, процессы)"""
+    db_url = f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    subprocess.run([sys.executable, "-m", "benchmarks.seed", "--database-url", db_url,
+                    "--products", str(args.products), "--users", str(max(args.users, args.concurrency)),
+                    "--orders", str(args.orders), "--seed", str(args.seed)],
+                   cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    replica_env = {}
+    if args.replica_lag is not None:
+        # Каталог читается из копии базы, которую fakes.replica обновляет раз в --replica-lag секунд
+        from fakes.replica import copy_once
+
+        primary, replica = os.path.join(workdir, "load.db"), os.path.join(workdir, "replica.db")
+        copy_once(primary, replica)
+        replica_env = {"DATABASE_REPLICA_URLS": f"sqlite:///{replica}", "REPLICA_MAX_LAG": str(args.replica_lag * 2)}
+
+    ports = {name: free_port() for name in ("app", "paypal", "getresponse", "smtp")}
+    app_url = f"http://127.0.0.1:{ports['app']}"
+    paypal_url = f"http://127.0.0.1:{ports['paypal']}"
+    getresponse_url = f"http://127.0.0.1:{ports['getresponse']}"
+    env = {
+        **os.environ,
+        "DATABASE_URL": db_url,
+        "BASE_URL": app_url,
+        "SECRET_KEY": "load-test-secret",
+        "RATE_LIMIT_ENABLED": "false",
+        "PAYPAL_API_BASE": paypal_url,
+        "PAYPAL_CLIENT_ID": "fake",
+        "PAYPAL_SECRET": "fake",
+        "PAYPAL_WEBHOOK_ID": "fake-webhook",
+        "FAKE_PAYPAL_WEBHOOK_URL": f"{app_url}/webhook",
+        "GETRESPONSE_API_KEY": "fake",
+        "GETRESPONSE_LIST_ID": "fake",
+        "GETRESPONSE_FROM_FIELD_ID": "fake",
+        "GETRESPONSE_API_BASE": f"{getresponse_url}/v3",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(ports["smtp"]),
+        "SMTP_USE_TLS": "false",
+        "SMTP_USERNAME": "shop@example.com",
+        "SMTP_FROM": "shop@example.com",
+        "SMTP_PASSWORD": "fake",
+        **replica_env,
+    }
+    uvicorn = [sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--log-level", "warning"]
+    processes = []
+    if replica_env:
+        proc, _ = spawn([sys.executable, "-m", "fakes.replica", primary, replica, "--interval", str(args.replica_lag)],
+                        env, workdir, "replica")
+        processes.append(proc)
+    for name, command, ready_url in (
+        ("paypal", uvicorn + ["fakes.paypal:app", "--port", str(ports["paypal"])], f"{paypal_url}/fake/faults"),
+        ("getresponse", uvicorn + ["fakes.getresponse:app", "--port", str(ports["getresponse"])], f"{getresponse_url}/fake/stats"),
+        ("smtp", [sys.executable, "-m", "fakes.smtp", "--port", str(ports["smtp"])], None),
+        ("app", app_command(args, ports["app"]), f"{app_url}/api/products?limit=1"),
+    ):
+        proc, log_path = spawn(command, env, workdir, name)
+        processes.append(proc)
+        if ready_url:
+            wait_ready(ready_url, proc, log_path)
+    return app_url, paypal_url, processes
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except OSError:
+        return None, None
+
+
+def print_summary(summary: dict):
+    print(f"{'route':<34} {'req':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for route, s in list(summary["routes"].items()) + [("TOTAL", summary["total"])]:
+        print(f"{route:<34} {s['requests']:>7} {s['errors']:>5} {s['rps']:>8.1f} "
+              f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}")
+    print("scenarios: " + ", ".join(f"{k}={v['iterations']} ({v['failed']} failed)" for k, v in summary["scenarios"].items()))
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    print(f"{'route':<34} {'rps':>19} {'p50 ms':>19} {'p95 ms':>19} {'p99 ms':>19}")
+
+    def cell(a, b):
+        change = f"{(b - a) / a * 100:+.0f}%" if a else "n/a"
+        return f"{a:>7.1f}>{b:<7.1f}{change:>4}"
+
+    routes = sorted(set(old["routes"]) | set(new["routes"])) + ["TOTAL"]
+    for route in routes:
+        a = old["total"] if route == "TOTAL" else old["routes"].get(route)
+        b = new["total"] if route == "TOTAL" else new["routes"].get(route)
+        if not a or not b:
+            print(f"{route:<34} {'только в ' + (old_path if a else new_path)}")
+            continue
+        print(f"{route:<34} " + " ".join(cell(a[k], b[k]) for k in ("rps", "p50_ms", "p95_ms", "p99_ms")))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон магазина")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Веса сценариев; есть: {', '.join(SCENARIOS)}")
+    parser.add_argument("--server", choices=["uvicorn", "serve"], default="uvicorn",
+                        help="serve — gunicorn по gunicorn.conf.py (serve.py)")
+    parser.add_argument("--workers", type=int, default=1, help="Число процессов приложения")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--replica-lag", type=float, help="Читать каталог из реплики SQLite с таким отставанием, секунды")
+    parser.add_argument("--output", help="JSON с результатами")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Сравнить два JSON и выйти")
+    return parser
+
+
+def run(args) -> dict:
+    """Поднимает стенд во временном каталоге, гоняет нагрузку и гасит процессы"""
+    mix = parse_mix(args.mix)
+    workdir = tempfile.mkdtemp(prefix="shop-load-")
+    print(f"workdir: {workdir}")
+    app_url, paypal_url, processes = start_stack(args, workdir)
+    try:
+        return asyncio.run(drive(app_url, paypal_url, args, mix))
+    finally:
+        for proc in reversed(processes):
+            proc.terminate()
+        for proc in processes:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    summary = run(args)
+    print_summary(summary)
+    if args.output:
+        commit, dirty = git_commit()
+        result = {
+            "meta": {
+                "commit": commit, "dirty": dirty, "created_at": datetime.utcnow().isoformat() + "Z",
+                "python": platform.python_version(), "cpus": os.cpu_count(), "args": vars(args),
+            },
+            **summary,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
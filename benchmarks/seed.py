@@ -0,0 +1,135 @@
+"""Синтетические данные для нагрузочных тестов: товары, пользователи, корзины, заказы.
+
+    python -m benchmarks.seed --products 2000 --users 500 --carts 300 --orders 5000
+    python -m benchmarks.seed --database-url sqlite:////tmp/load.db --seed 7
+
+Пишет через модели database.py в DATABASE_URL (по умолчанию users.db) после
+bootstrap (схема, миграции, админ). Данные детерминированы при одинаковом
+--seed. У всех пользователей bench{i} пароль BENCH_PASSWORD: хэш считается
+один раз, поэтому 10 000 пользователей создаются за секунды.
+Оплаченные заказы раскладываются по последним --days дням, дневные агрегаты
+продаж пересчитываются через analytics.backfill.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+BENCH_PASSWORD = "bench-password"
+CATEGORIES = ["Earphone", "Gaming", "Watch", "Laptop", "Camera", "Speaker", "Phone", "Tablet"]
+ADJECTIVES = ["Pro", "Max", "Mini", "Ultra", "Air", "Lite", "Neo", "Prime", "Nano", "Sport"]
+NOUNS = ["Buds", "Pad", "Band", "Book", "Cam", "Box", "Phone", "Tab", "Beat", "Vision"]
+IMAGES = ["/image/Laptop.png", "/image/blue.jpeg", "/image/br-1.png", "/image/br-2.png", "/image/eso.png"]
+ORDER_STATUSES = ["paid"] * 8 + ["pending", "failed"]
+CHUNK = 5000
+
+
+def product_rows(rng: random.Random, count: int):
+    for i in range(count):
+        yield {
+            "name": f"{rng.choice(NOUNS)} {rng.choice(ADJECTIVES)} {i + 1}",
+            # Логнормальные цены: много недорогих товаров и длинный хвост
+            "price": round(min(2000.0, rng.lognormvariate(4, 0.8)), 2),
+            "image": rng.choice(IMAGES),
+            "category": rng.choice(CATEGORIES),
+            "is_new_arrival": rng.random() < 0.05,
+        }
+
+
+def insert_chunked(db, model, rows):
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == CHUNK:
+            db.bulk_insert_mappings(model, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        db.bulk_insert_mappings(model, batch)
+        total += len(batch)
+    return total
+
+
+def seed(db, products: int, users: int, carts: int, orders: int, days: int, rng: random.Random) -> dict:
+    from analytics import backfill
+    from database import CartItem, Order, OrderItem, Product, User, pwd_context
+
+    started = time.perf_counter()
+    insert_chunked(db, Product, product_rows(rng, products))
+    catalog = db.query(Product.id, Product.name, Product.price, Product.image).all()
+
+    password_hash = pwd_context.hash(BENCH_PASSWORD)
+    first_user = (db.query(User.id).order_by(User.id.desc()).limit(1).scalar() or 0) + 1
+    insert_chunked(db, User, (
+        {"username": f"bench{i}", "email": f"bench{i}@example.com", "password_hash": password_hash, "is_admin": False}
+        for i in range(users)
+    ))
+    user_ids = [uid for uid, in db.query(User.id).filter(User.id >= first_user)]
+
+    def cart_rows():
+        for user_id in rng.sample(user_ids, min(carts, len(user_ids))):
+            for product_id, name, price, image in rng.sample(catalog, rng.randint(1, 5)):
+                yield {"user_id": user_id, "product_id": str(product_id), "name": name,
+                       "price": price, "image": image, "quantity": rng.randint(1, 3)}
+
+    cart_count = insert_chunked(db, CartItem, cart_rows())
+
+    now = datetime.utcnow()
+    first_order = (db.query(Order.id).order_by(Order.id.desc()).limit(1).scalar() or 0) + 1
+    order_rows, item_rows = [], []
+    for n in range(orders):
+        lines = rng.sample(catalog, rng.randint(1, 4))
+        quantities = [rng.randint(1, 3) for _ in lines]
+        order_rows.append({
+            "id": first_order + n,
+            "user_id": rng.choice(user_ids),
+            "total": round(sum(p[2] * q for p, q in zip(lines, quantities)), 2),
+            "status": rng.choice(ORDER_STATUSES),
+            "created_at": now - timedelta(seconds=rng.randint(0, days * 86400)),
+        })
+        for (product_id, name, price, image), quantity in zip(lines, quantities):
+            item_rows.append({"order_id": first_order + n, "product_id": str(product_id), "name": name,
+                              "price": price, "image": image, "quantity": quantity})
+    insert_chunked(db, Order, order_rows)
+    insert_chunked(db, OrderItem, item_rows)
+    db.commit()
+    backfill(db, (now - timedelta(days=days)).date(), now.date())
+
+    return {
+        "products": products, "users": len(user_ids), "cart_lines": cart_count,
+        "orders": orders, "order_lines": len(item_rows), "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Наполняет БД синтетическими данными")
+    parser.add_argument("--database-url", help="По умолчанию DATABASE_URL или users.db")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--carts", type=int, default=300)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--append", action="store_true", help="Дописать к уже наполненной БД")
+    args = parser.parse_args()
+
+    # database.py читает DATABASE_URL при импорте
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    from bootstrap import run_bootstrap
+    from database import Product, SessionLocal
+
+    run_bootstrap()
+    db = SessionLocal()
+    try:
+        if db.query(Product.id).first() and not args.append:
+            raise SystemExit("В БД уже есть товары; --append, чтобы дописать")
+        stats = seed(db, args.products, args.users, args.carts, args.orders, args.days, random.Random(args.seed))
+    finally:
+        db.close()
+    print(" ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
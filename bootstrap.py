@@ -0,0 +1,25 @@
+"""Однократная подготовка окружения при деплое: схема БД, миграции и админ.
+
+    python bootstrap.py
+
+Импорт database.py больше ничего не создаёт, поэтому веб-воркеры и скрипты
+стартуют без обращения к БД и без bcrypt-хэширования.
+"""
+import logging
+
+from database import create_admin_if_not_exists, init_db
+from migrate import run_migrations
+
+logger = logging.getLogger(__name__)
+
+
+def run_bootstrap():
+    # Новые таблицы создаёт create_all, изменения существующих — миграции
+    init_db()
+    run_migrations()
+    create_admin_if_not_exists()
+    logger.info("Bootstrap завершён")
+
+
+if __name__ == "__main__":
+    run_bootstrap()
@@ -0,0 +1,203 @@
+"""Предохранители (circuit breakers) и ограничители параллелизма для внешних API.
+
+У каждой интеграции (PayPal, SMTP, GetResponse) свой предохранитель:
+
+* closed — вызовы идут как обычно, результаты последних BREAKER_WINDOW
+  вызовов запоминаются; если доля ошибок достигла порога, цепь размыкается;
+* open — вызовы сразу получают IntegrationUnavailable, без сетевого запроса;
+* half-open — после паузы пропускается одна пробная попытка: успех
+  замыкает цепь, ошибка снова размыкает.
+
+Отдельно каждая интеграция ограничена пулом одновременных вызовов
+(bulkhead), чтобы зависший сервис не занял все потоки.
+
+    with PAYPAL.guard() as call:
+        response = requests.post(url, timeout=PAYPAL.timeout)
+        if response.status_code >= 500:
+            call.failed(f"HTTP {response.status_code}")
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "10"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class IntegrationUnavailable(RuntimeError):
+    """Интеграция отключена предохранителем или её пул вызовов заполнен"""
+
+    def __init__(self, name: str, reason: str, retry_after: float = 1):
+        super().__init__(f"{name} unavailable: {reason}")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Call:
+    def __init__(self):
+        self.error = None
+
+    def failed(self, reason: str):
+        """Отмечает вызов как неудачный без исключения (например, ответ 5xx)"""
+        self.error = reason
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, max_concurrency: int, timeout,
+                 window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 failure_rate: float = BREAKER_FAILURE_RATE, open_seconds: float = BREAKER_OPEN_SECONDS):
+        self.name = name
+        # (connect, read) для requests: недоступный хост отсекается быстро
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._outcomes = deque(maxlen=window)  # True — успех
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.in_flight = 0
+        self.counters = {"success": 0, "failure": 0, "rejected_open": 0, "rejected_full": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def _admit(self):
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN:
+                self.counters["rejected_open"] += 1
+                retry_after = self.open_seconds - (time.monotonic() - self._opened_at)
+                raise IntegrationUnavailable(self.name, "circuit open", retry_after)
+            if state == HALF_OPEN:
+                # Пока идёт пробный вызов, остальные отклоняются
+                if self._probing:
+                    self.counters["rejected_open"] += 1
+                    raise IntegrationUnavailable(self.name, "circuit half-open", 1)
+                self._probing = True
+                return True
+            return False
+
+    def _record(self, success: bool, probe: bool, reason: str = None):
+        with self._lock:
+            self.counters["success" if success else "failure"] += 1
+            if probe:
+                self._probing = False
+                if success:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    logger.info(f"Circuit {self.name} closed after successful probe")
+                else:
+                    self._trip(reason)
+                return
+            self._outcomes.append(success)
+            if self._state != CLOSED or len(self._outcomes) < self.min_calls:
+                return
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.failure_rate:
+                self._trip(reason)
+
+    def _trip(self, reason: str):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.counters["opened"] += 1
+        logger.warning(f"Circuit {self.name} opened for {self.open_seconds:.0f}s: {reason}")
+
+    @contextmanager
+    def guard(self):
+        probe = self._admit()
+        if not self._slots.acquire(blocking=False):
+            if probe:
+                with self._lock:
+                    self._probing = False
+            with self._lock:
+                self.counters["rejected_full"] += 1
+            raise IntegrationUnavailable(self.name, f"all {self.max_concurrency} slots busy", 1)
+        with self._lock:
+            self.in_flight += 1
+        call = _Call()
+        try:
+            yield call
+        except Exception as e:
+            self._record(False, probe, f"{type(e).__name__}: {e}")
+            raise
+        else:
+            self._record(call.error is None, probe, call.error)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            outcomes = list(self._outcomes)
+        return {
+            "name": self.name,
+            "state": state,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "window_calls": len(outcomes),
+            "window_failures": outcomes.count(False),
+            **self.counters,
+        }
+
+
+def _timeout(prefix: str, connect: float, read: float):
+    return (float(os.getenv(f"{prefix}_CONNECT_TIMEOUT", str(connect))),
+            float(os.getenv(f"{prefix}_READ_TIMEOUT", str(read))))
+
+
+PAYPAL = CircuitBreaker("paypal", int(os.getenv("PAYPAL_MAX_CONCURRENCY", "8")), _timeout("PAYPAL", 3, 10))
+SMTP = CircuitBreaker("smtp", int(os.getenv("SMTP_MAX_CONCURRENCY", "4")), _timeout("SMTP", 5, 10))
+GETRESPONSE = CircuitBreaker("getresponse", int(os.getenv("GETRESPONSE_MAX_CONCURRENCY", "4")), _timeout("GETRESPONSE", 3, 10))
+
+BREAKERS = {b.name: b for b in (PAYPAL, SMTP, GETRESPONSE)}
+
+
+def prometheus_metrics() -> str:
+    """Состояние предохранителей в текстовом формате Prometheus"""
+    lines = [
+        "# HELP integration_circuit_state 0=closed, 1=half_open, 2=open",
+        "# TYPE integration_circuit_state gauge",
+    ]
+    snapshots = [b.snapshot() for b in BREAKERS.values()]
+    for s in snapshots:
+        lines.append(f'integration_circuit_state{{integration="{s["name"]}"}} {STATE_CODES[s["state"]]}')
+    lines += ["# TYPE integration_in_flight gauge"]
+    for s in snapshots:
+        lines.append(f'integration_in_flight{{integration="{s["name"]}"}} {s["in_flight"]}')
+    lines += ["# TYPE integration_calls_total counter"]
+    for s in snapshots:
+        for outcome in ("success", "failure", "rejected_open", "rejected_full"):
+            lines.append(f'integration_calls_total{{integration="{s["name"]}",outcome="{outcome}"}} {s[outcome]}')
+    lines += ["# TYPE integration_circuit_opened_total counter"]
+    for s in snapshots:
+        lines.append(f'integration_circuit_opened_total{{integration="{s["name"]}"}} {s["opened"]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,222 @@
+"""Хранилище корзин: таблица cart (по умолчанию) или Redis с отложенной записью.
+
+CART_BACKEND=redis держит активные корзины в Redis-хэшах cart:{user_id}.
+Изменённые корзины попадают в множество cart:dirty, и периодическая задача
+flush_carts (tasks.py) переносит их в таблицу cart. Ключи живут
+CART_TTL_SECONDS с последнего изменения; после истечения корзина снова
+читается из таблицы.
+
+Позиции возвращаются словарями с ключами product_id, name, price, image,
+quantity в порядке добавления.
+"""
+import json
+import logging
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from database import CartItem, insert_for
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+CART_BACKEND = os.getenv("CART_BACKEND", "sql")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CART_TTL_SECONDS = int(os.getenv("CART_TTL_SECONDS", str(7 * 24 * 3600)))
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "5"))
+CART_FLUSH_BATCH = int(os.getenv("CART_FLUSH_BATCH", "500"))
+
+ITEM_FIELDS = ("product_id", "name", "price", "image", "quantity")
+
+
+def _row_to_item(row: CartItem) -> dict:
+    return {field: getattr(row, field) for field in ITEM_FIELDS}
+
+
+class SqlCartStore:
+    def get(self, db: Session, user_id: int):
+        rows = db.query(CartItem).filter(CartItem.user_id == user_id).order_by(CartItem.id).all()
+        return [_row_to_item(row) for row in rows]
+
+    def add(self, db: Session, user_id: int, item: dict):
+        self.merge(db, user_id, [item])
+
+    def merge(self, db: Session, user_id: int, items):
+        """Добавляет позиции одним upsert-ом по уникальному ключу (user_id, product_id)"""
+        if not items:
+            return
+        insert = insert_for(db.get_bind())
+        stmt = insert(CartItem).values([{"user_id": user_id, **item} for item in items])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "product_id"],
+            set_={"quantity": CartItem.quantity + stmt.excluded.quantity}
+        ))
+        db.commit()
+
+    def set_quantity(self, db: Session, user_id: int, product_id: str, quantity: int) -> bool:
+        updated = db.query(CartItem).filter(
+            CartItem.user_id == user_id,
+            CartItem.product_id == product_id
+        ).update({CartItem.quantity: quantity}, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+
+    def remove(self, db: Session, user_id: int, product_id: str) -> bool:
+        deleted = db.query(CartItem).filter(
+            CartItem.user_id == user_id,
+            CartItem.product_id == product_id
+        ).delete(synchronize_session=False)
+        db.commit()
+        return bool(deleted)
+
+    def clear_many(self, db: Session, user_ids):
+        """Очищает корзины пользователей. Коммит — за вызывающим"""
+        db.query(CartItem).filter(CartItem.user_id.in_(list(user_ids))).delete(synchronize_session=False)
+
+
+class RedisCartStore:
+    """Корзина в хэше cart:{user_id}: q:{pid} — количество, m:{pid} — данные товара"""
+
+    DIRTY_KEY = "cart:dirty"
+    LOADED_FIELD = "_loaded"
+    SEQ_FIELD = "_seq"
+
+    def __init__(self, client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self.redis = client
+
+    @staticmethod
+    def key(user_id) -> str:
+        return f"cart:{user_id}"
+
+    def _ensure_loaded(self, db: Session, user_id: int):
+        """Прогревает корзину из таблицы, если ключа в Redis нет"""
+        key = self.key(user_id)
+        if self.redis.hexists(key, self.LOADED_FIELD):
+            return
+        rows = db.query(CartItem).filter(CartItem.user_id == user_id).order_by(CartItem.id).all()
+        mapping = {self.LOADED_FIELD: 1, self.SEQ_FIELD: len(rows)}
+        for seq, row in enumerate(rows):
+            item = _row_to_item(row)
+            mapping[f"q:{row.product_id}"] = item.pop("quantity")
+            mapping[f"m:{row.product_id}"] = json.dumps({**item, "seq": seq})
+        pipe = self.redis.pipeline()
+        # Параллельная загрузка запишет те же данные, блокировка не нужна
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, CART_TTL_SECONDS)
+        pipe.execute()
+
+    def _touch(self, pipe, user_id: int):
+        pipe.expire(self.key(user_id), CART_TTL_SECONDS)
+        pipe.sadd(self.DIRTY_KEY, user_id)
+
+    def get(self, db: Session, user_id: int):
+        self._ensure_loaded(db, user_id)
+        data = self.redis.hgetall(self.key(user_id))
+        items = []
+        for field, value in data.items():
+            if not field.startswith("m:"):
+                continue
+            product_id = field[2:]
+            quantity = data.get(f"q:{product_id}")
+            if quantity is None:
+                continue
+            meta = json.loads(value)
+            items.append({**meta, "product_id": product_id, "quantity": int(quantity)})
+        items.sort(key=lambda item: item.pop("seq", 0))
+        return items
+
+    def add(self, db: Session, user_id: int, item: dict):
+        self.merge(db, user_id, [item])
+
+    def merge(self, db: Session, user_id: int, items):
+        """Добавляет позиции одним конвейером команд; количества растут через HINCRBY"""
+        if not items:
+            return
+        self._ensure_loaded(db, user_id)
+        key = self.key(user_id)
+        last_seq = self.redis.hincrby(key, self.SEQ_FIELD, len(items))
+        pipe = self.redis.pipeline()
+        for seq, item in enumerate(items, start=last_seq - len(items) + 1):
+            product_id = item["product_id"]
+            meta = {field: item[field] for field in ("product_id", "name", "price", "image")}
+            pipe.hsetnx(key, f"m:{product_id}", json.dumps({**meta, "seq": seq}))
+            pipe.hincrby(key, f"q:{product_id}", item["quantity"])
+        self._touch(pipe, user_id)
+        pipe.execute()
+
+    def set_quantity(self, db: Session, user_id: int, product_id: str, quantity: int) -> bool:
+        self._ensure_loaded(db, user_id)
+        key = self.key(user_id)
+        if not self.redis.hexists(key, f"q:{product_id}"):
+            return False
+        pipe = self.redis.pipeline()
+        pipe.hset(key, f"q:{product_id}", quantity)
+        self._touch(pipe, user_id)
+        pipe.execute()
+        return True
+
+    def remove(self, db: Session, user_id: int, product_id: str) -> bool:
+        self._ensure_loaded(db, user_id)
+        key = self.key(user_id)
+        pipe = self.redis.pipeline()
+        pipe.hdel(key, f"q:{product_id}", f"m:{product_id}")
+        self._touch(pipe, user_id)
+        removed, *_ = pipe.execute()
+        return bool(removed)
+
+    def clear_many(self, db: Session, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        pipe = self.redis.pipeline()
+        pipe.delete(*[self.key(u) for u in user_ids])
+        pipe.srem(self.DIRTY_KEY, *user_ids)
+        pipe.execute()
+        SqlCartStore().clear_many(db, user_ids)
+
+    def flush(self, db: Session, batch_size: int = CART_FLUSH_BATCH) -> int:
+        """Переносит изменённые корзины в таблицу cart (write-behind)"""
+        user_ids = self.redis.spop(self.DIRTY_KEY, batch_size) or []
+        if not user_ids:
+            return 0
+        try:
+            rows, live_ids = [], []
+            for user_id in map(int, user_ids):
+                # Ключ истёк — в таблице уже последнее сохранённое состояние
+                if not self.redis.exists(self.key(user_id)):
+                    continue
+                live_ids.append(user_id)
+                rows.extend({"user_id": user_id, **item} for item in self.get(db, user_id))
+            db.query(CartItem).filter(CartItem.user_id.in_(live_ids)).delete(synchronize_session=False)
+            if rows:
+                db.bulk_insert_mappings(CartItem, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Вернём корзины в очередь на следующую попытку
+            self.redis.sadd(self.DIRTY_KEY, *user_ids)
+            raise
+        return len(user_ids)
+
+
+_store = None
+
+
+def set_cart_store(store):
+    """Подменяет хранилище (например, RedisCartStore(fakeredis.FakeRedis(...)))"""
+    global _store
+    _store = store
+
+
+def get_cart_store():
+    global _store
+    if _store is None:
+        _store = RedisCartStore() if CART_BACKEND == "redis" else SqlCartStore()
+        logger.info(f"Cart backend: {CART_BACKEND}")
+    return _store
@@ -0,0 +1,125 @@
+"""Кэш данных витрины в памяти процесса.
+
+Каталог меняется только из админки, а читается на каждой странице, поэтому
+готовые выборки держатся в памяти. Админские маршруты после изменения
+товаров вызывают invalidate_catalog_caches(), которая повышает версию
+каталога и сбрасывает кэш. Другие процессы увидят изменения не позже чем
+через CATALOG_CACHE_TTL секунд (с репликами — если их отставание меньше).
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import asc, desc
+from sqlalchemy.orm import Session
+
+from database import Product, pin_reads_to_primary
+from fastjson import dumps
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "60"))
+
+_lock = threading.Lock()
+_version = 0
+# name -> (version, expires_at, value)
+_cache = {}
+
+
+def catalog_version() -> int:
+    return _version
+
+
+def invalidate_catalog_caches():
+    global _version
+    with _lock:
+        _version += 1
+        _cache.clear()
+    # Кэш перечитается сразу, а реплики могут ещё не получить правку
+    pin_reads_to_primary()
+    logger.info(f"Catalog caches invalidated, version={_version}")
+
+
+def cached(name: str, loader):
+    """Значение из кэша или loader() — результат живёт до инвалидации или TTL"""
+    now = time.monotonic()
+    entry = _cache.get(name)
+    if entry and entry[0] == _version and entry[1] > now:
+        return entry[2]
+    version = _version
+    value = loader()
+    with _lock:
+        # Не кладём в кэш то, что успело устареть во время загрузки
+        if version == _version:
+            _cache[name] = (version, now + CATALOG_CACHE_TTL, value)
+    return value
+
+
+def encode_payload(payload) -> tuple:
+    """Компактный JSON и слабый ETag для него: (body, etag)"""
+    body = dumps(payload)
+    return body, f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+
+def product_to_dict(product: Product) -> dict:
+    return {
+        "id": product.id,
+        "name": product.name,
+        "price": product.price,
+        "image": product.image,
+        "category": product.category,
+        "is_new_arrival": product.is_new_arrival,
+    }
+
+
+def product_json(product: Product, encoded: dict = None) -> bytes:
+    """Закодированный товар; живёт до инвалидации каталога, как и прочие кэши"""
+    if encoded is None:
+        encoded = cached("product_json", dict)
+    body = encoded.get(product.id)
+    if body is None:
+        body = encoded[product.id] = dumps(product_to_dict(product))
+    return body
+
+
+def encode_product_list(products, **envelope) -> bytes:
+    """{"success":true,"data":[...],**envelope} из готовых кусков product_json"""
+    encoded = cached("product_json", dict)
+    items = b",".join(product_json(p, encoded) for p in products)
+    rest = b"," + dumps(envelope)[1:] if envelope else b"}"
+    return b'{"success":true,"data":[' + items + b"]" + rest
+
+
+PRODUCT_SORTS = {
+    "default": asc(Product.id),
+    "price-low": asc(Product.price),
+    "price-high": desc(Product.price),
+    "latest": desc(Product.id),
+}
+
+
+def product_page(db: Session, page: int = 1, limit: int = 9, sort: str = "default",
+                 category: str = None, search: str = None,
+                 min_price: float = None, max_price: float = None):
+    """Страница каталога: (products, total). Общая для /api/products и SSR /shop"""
+    query = db.query(Product)
+    if category:
+        query = query.filter(Product.category == category)
+    if search:
+        query = query.filter(Product.name.ilike(f"%{search}%"))
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+    total = query.count()
+    products = (
+        query.order_by(PRODUCT_SORTS.get(sort, PRODUCT_SORTS["default"]))
+        .offset((page - 1) * limit)
+        .limit(limit)
+        .all()
+    )
+    return products, total
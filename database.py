@@ -1,9 +1,12 @@
-from sqlalchemy import Column, Integer, String, create_engine, ForeignKey, Float, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, create_engine, ForeignKey, Float, Boolean, DateTime, Text, Index, Date, event
 from sqlalchemy.orm import sessionmaker, declarative_base, Session, relationship
 from passlib.context import CryptContext
+import itertools
 import logging
 from dotenv import load_dotenv
 import os
+import threading
+import time
 from datetime import datetime
 
 
@@ -14,9 +17,45 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'users.db')}"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'users.db')}")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+# Реплики только для чтения (витрина), через запятую. Без них чтение идёт в
+# основную БД, но отдельным пулом соединений и в режиме только для чтения
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Отставание реплик, секунды: столько после записи пользователь читает из основной БД
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+
+
+def _make_engine(url: str, read_only: bool = False):
+    is_sqlite = url.startswith("sqlite")
+    connect_args = {}
+    if is_sqlite:
+        connect_args["check_same_thread"] = False
+    elif read_only:
+        # PostgreSQL: случайная запись через сессию чтения — ошибка, а не расхождение с репликой
+        connect_args["options"] = "-c default_transaction_read_only=on"
+    new_engine = create_engine(url, connect_args=connect_args)
+
+    if is_sqlite:
+        @event.listens_for(new_engine, "connect")
+        def _sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+            else:
+                # WAL: чтение не блокируется записью (в том числе построением индексов)
+                cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA busy_timeout=5000")
+            cursor.close()
+    return new_engine
+
+
+engine = _make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+read_engines = [_make_engine(url, read_only=True) for url in DATABASE_REPLICA_URLS or [DATABASE_URL]]
+_read_sessions = itertools.cycle([sessionmaker(autocommit=False, autoflush=False, bind=e) for e in read_engines])
+_read_lock = threading.Lock()
+_primary_until = 0.0
 Base = declarative_base()
 
 class User(Base):
@@ -29,6 +68,7 @@ class User(Base):
     is_admin = Column(Boolean, default=False, nullable=False)
     password_resets = relationship("PasswordReset", back_populates="user", cascade="all, delete-orphan")
     orders = relationship("Order", back_populates="user", cascade="all, delete-orphan")
+    refresh_tokens = relationship("RefreshToken", cascade="all, delete-orphan")
 
 class CartItem(Base):
     __tablename__ = "cart"
@@ -40,6 +80,8 @@ class CartItem(Base):
     image = Column(String)
     quantity = Column(Integer, default=1)
     user = relationship("User", back_populates="cart_items")
+    # Одна строка на (пользователь, товар): количество увеличивается атомарным upsert
+    __table_args__ = (Index("ux_cart_user_product", "user_id", "product_id", unique=True),)
 
 class Product(Base):
     __tablename__ = "products"
@@ -48,7 +90,26 @@ class Product(Base):
     price = Column(Float)
     image = Column(String)
     category = Column(String, index=True)  # Для фильтрации по категориям
-    is_new_arrival = Column(Boolean, default=False, nullable=False)
+    is_new_arrival = Column(Boolean, default=False, nullable=False, index=True)
+    stock = Column(Integer, nullable=True)  # Остаток на складе; NULL — не ограничен (см. inventory.py)
+
+# Подборки на витрине (новинки, хиты продаж, категории); см. featured.py
+class Collection(Base):
+    __tablename__ = "collections"
+    id = Column(Integer, primary_key=True, index=True)
+    slug = Column(String, unique=True, index=True, nullable=False)
+    title = Column(String, nullable=False)
+    rule = Column(String, nullable=False, default="manual")  # manual, new_arrivals, bestsellers, category
+    rule_value = Column(String, nullable=True)  # Категория для rule=category
+    max_items = Column(Integer, nullable=False, default=12)
+    position = Column(Integer, nullable=False, default=0)
+    items = relationship("CollectionItem", order_by="CollectionItem.position", cascade="all, delete-orphan")
+
+class CollectionItem(Base):
+    __tablename__ = "collection_items"
+    collection_id = Column(Integer, ForeignKey("collections.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    position = Column(Integer, nullable=False, default=0)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -57,10 +118,22 @@ class PasswordReset(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     token = Column(String, unique=True, index=True, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     used = Column(Boolean, default=False, nullable=False)
     user = relationship("User", back_populates="password_resets")
 
+# Refresh-токены скользящей сессии (см. auth_tokens.py); хранится только хэш
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token_hash = Column(String, unique=True, index=True, nullable=False)  # SHA-256 токена
+    family = Column(String, nullable=False, index=True)  # Цепочка ротаций одного входа
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=True)
+    replaced_by = Column(Integer, nullable=True)  # id токена, выданного взамен
+
 
 
 class Order(Base):
@@ -69,15 +142,23 @@ class Order(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     total = Column(Float, nullable=False)
     paypal_order_id = Column(String, unique=True, index=True)  # ID заказа от PayPal
-    status = Column(String, default="pending")  # pending, paid, failed
+    status = Column(String, default="pending")  # pending, approved, paid, failed, expired
     created_at = Column(DateTime, default=datetime.utcnow)
+    approved_at = Column(DateTime, nullable=True)  # Покупатель вернулся с PayPal
+    stock_reserved = Column(Boolean, default=False, nullable=False)  # Остатки списаны под заказ
+    reserved_until = Column(DateTime, nullable=True)  # Без одобрения резерв снимается после этого
     user = relationship("User", back_populates="orders")
     order_items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
+    # История заказов: keyset-пагинация по (user_id, created_at desc, id desc)
+    __table_args__ = (
+        Index("ix_orders_user_created", "user_id", "created_at", "id"),
+        Index("ix_orders_status_reserved_until", "status", "reserved_until"),
+    )
 
 class OrderItem(Base):
     __tablename__ = "order_items"
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     product_id = Column(String, index=True)
     name = Column(String)
     price = Column(Float)
@@ -85,6 +166,72 @@ class OrderItem(Base):
     quantity = Column(Integer)
     order = relationship("Order", back_populates="order_items")
 
+class PaymentEvent(Base):
+    __tablename__ = "payment_events"
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(String, unique=True, index=True, nullable=False)  # ID события PayPal (дедупликация)
+    event_type = Column(String, nullable=False)
+    resource_id = Column(String, index=True)  # ID заказа PayPal
+    payload = Column(Text, nullable=False)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True, index=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    queue = Column(String, nullable=False, default="default")
+    name = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="{}")  # JSON с аргументами задачи
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    unique_key = Column(String, unique=True, nullable=True)  # Защита от повторной постановки
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_jobs_queue_status_run_at", "queue", "status", "run_at"),)
+
+# Дневные агрегаты продаж (обновляются при оплате заказа, см. analytics.py)
+class SalesDailyProduct(Base):
+    __tablename__ = "sales_daily_product"
+    day = Column(Date, primary_key=True)
+    product_id = Column(String, primary_key=True)
+    name = Column(String)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    orders = Column(Integer, nullable=False, default=0)
+
+class SalesDailyCategory(Base):
+    __tablename__ = "sales_daily_category"
+    day = Column(Date, primary_key=True)
+    category = Column(String, primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+# Подписчики рассылки: /subscribe пишет сюда, tasks.sync_subscribers переносит в GetResponse
+class Subscriber(Base):
+    __tablename__ = "subscribers"
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String, unique=True, nullable=False)  # В нижнем регистре
+    campaign_id = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="pending")  # pending, synced, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    synced_at = Column(DateTime, nullable=True)
+    __table_args__ = (Index("ix_subscribers_status_next_attempt", "status", "next_attempt_at"),)
+
+def insert_for(bind):
+    """INSERT с поддержкой ON CONFLICT для диалекта текущей БД"""
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
 # Функция для создания админа, если он не существует
 def create_admin_if_not_exists():
     db = SessionLocal()
@@ -122,16 +269,27 @@ def create_admin_if_not_exists():
     finally:
         db.close()
 
-try:
+def init_db():
+    """Создаёт недостающие таблицы. Вызывается из bootstrap.py, а не при импорте"""
     Base.metadata.create_all(bind=engine)
     logger.info("Database tables created successfully")
-    create_admin_if_not_exists()  # Создаём админа после создания таблиц
-except Exception as e:
-    logger.error(f"Error creating database tables: {str(e)}")
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def pin_reads_to_primary(seconds: float = REPLICA_MAX_LAG):
+    """Чтение всего процесса идёт в основную БД (например, пока кэш витрины перечитывается после правок)"""
+    global _primary_until
+    _primary_until = max(_primary_until, time.monotonic() + seconds)
+
+def read_session(primary: bool = False) -> Session:
+    """Сессия только для чтения: реплики по кругу, основная БД — если её запись должна быть видна сразу"""
+    if DATABASE_REPLICA_URLS and (primary or time.monotonic() < _primary_until):
+        return SessionLocal()
+    with _read_lock:
+        factory = next(_read_sessions)
+    return factory()
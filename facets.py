@@ -0,0 +1,97 @@
+"""Фасеты каталога: число товаров по категориям и гистограмма цен.
+
+Индекс строится одним запросом по (id, name, category, price) всех товаров
+и хранится в кэше витрины, поэтому после правок в админке он пересобирается
+при следующем запросе (invalidate_catalog_caches), а в других процессах — не
+позже CATALOG_CACHE_TTL. Без поиска и фильтра по цене ответ берётся из
+заранее посчитанных счётчиков; с ними — один проход по массивам в памяти,
+без GROUP BY в БД.
+
+Как принято для фасетов, каждый из них не учитывает собственный фильтр:
+счётчики категорий считаются без category (чтобы было видно, сколько товаров
+в соседних категориях), гистограмма цен — без min_price/max_price.
+"""
+import math
+from bisect import bisect_right
+from collections import Counter
+
+from sqlalchemy.orm import Session
+
+import catalog
+from database import Product
+
+PRICE_BUCKETS = 5
+
+
+def _nice_step(span: float, buckets: int) -> float:
+    """Шаг гистограммы вида 1, 2, 5 × 10^n"""
+    raw = span / buckets
+    if raw <= 0:
+        return 1.0
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if raw <= factor * magnitude:
+            return factor * magnitude
+    return 10 * magnitude
+
+
+def price_edges(prices, buckets: int = PRICE_BUCKETS):
+    """Границы корзин цен, округлённые до «красивого» шага"""
+    if not prices:
+        return []
+    low, high = min(prices), max(prices)
+    step = _nice_step(high - low, buckets)
+    start = math.floor(low / step) * step
+    edges = [start]
+    while edges[-1] <= high:
+        edges.append(round(edges[-1] + step, 2))
+    return edges
+
+
+class FacetIndex:
+    def __init__(self, rows):
+        self.names = [(name or "").lower() for _, name, _, _ in rows]
+        self.categories = [category for _, _, category, _ in rows]
+        self.prices = [price or 0.0 for _, _, _, price in rows]
+        self.edges = price_edges(self.prices)
+        # Номер корзины цены для каждого товара
+        self.buckets = [bisect_right(self.edges, p) - 1 for p in self.prices]
+
+        # Готовые ответы для запросов без поиска и фильтра по цене
+        self.category_counts = Counter(c for c in self.categories if c)
+        self.bucket_counts = {None: Counter(self.buckets)}
+        for category, bucket in zip(self.categories, self.buckets):
+            self.bucket_counts.setdefault(category, Counter())[bucket] += 1
+
+    def _histogram(self, counts: Counter):
+        return [
+            {"min": self.edges[i], "max": self.edges[i + 1], "count": counts.get(i, 0)}
+            for i in range(len(self.edges) - 1)
+        ]
+
+    def facets(self, category: str = None, search: str = None,
+               min_price: float = None, max_price: float = None) -> dict:
+        if not search and min_price is None and max_price is None:
+            categories = self.category_counts
+            buckets = self.bucket_counts.get(category or None, Counter())
+        else:
+            needle = (search or "").lower()
+            categories, buckets = Counter(), Counter()
+            for name, cat, price, bucket in zip(self.names, self.categories, self.prices, self.buckets):
+                if needle and needle not in name:
+                    continue
+                if (min_price is None or price >= min_price) and (max_price is None or price <= max_price) and cat:
+                    categories[cat] += 1
+                if not category or cat == category:
+                    buckets[bucket] += 1
+        return {
+            "categories": [{"value": c, "count": n} for c, n in sorted(categories.items())],
+            "price": self._histogram(buckets),
+        }
+
+
+def facet_index(db: Session) -> FacetIndex:
+    def load():
+        return FacetIndex(db.query(Product.id, Product.name, Product.category, Product.price).all())
+
+    return catalog.cached("facet_index", load)
@@ -0,0 +1 @@
+"""Локальные заглушки внешних сервисов для разработки и нагрузочных тестов."""
@@ -0,0 +1,50 @@
+"""Внедрение сбоев в заглушки: задержка и доля ошибочных ответов.
+
+    install_faults(app)  # добавляет middleware и POST/GET /fake/faults
+
+Начальные значения берутся из FAKE_FAULT_DELAY (секунды),
+FAKE_FAULT_ERROR_RATE (0..1) и FAKE_FAULT_STATUS; во время работы их можно
+поменять запросом POST /fake/faults {"delay": 2, "error_rate": 1}.
+"""
+import asyncio
+import os
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+def install_faults(app: FastAPI):
+    faults = {
+        "delay": float(os.getenv("FAKE_FAULT_DELAY", "0")),
+        "error_rate": float(os.getenv("FAKE_FAULT_ERROR_RATE", "0")),
+        "status": int(os.getenv("FAKE_FAULT_STATUS", "503")),
+    }
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        # Управляющие маршруты заглушки работают без сбоев
+        if request.url.path.startswith("/fake/"):
+            return await call_next(request)
+        if faults["delay"]:
+            await asyncio.sleep(faults["delay"])
+            # Клиент уже ушёл по таймауту — отвечать некому
+            if await request.is_disconnected():
+                return Response(status_code=499)
+        if random.random() < faults["error_rate"]:
+            return JSONResponse(status_code=faults["status"], content={"name": "SERVICE_UNAVAILABLE"})
+        return await call_next(request)
+
+    @app.get("/fake/faults")
+    async def get_faults():
+        return faults
+
+    @app.post("/fake/faults")
+    async def set_faults(request: Request):
+        body = await request.json()
+        for key in ("delay", "error_rate", "status"):
+            if key in body:
+                faults[key] = type(faults[key])(body[key])
+        return faults
+
+    return faults
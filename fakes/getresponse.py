@@ -0,0 +1,74 @@
+"""Локальная заглушка GetResponse API v3.
+
+Запуск:
+    uvicorn fakes.getresponse:app --port 8082
+
+И в .env магазина:
+    GETRESPONSE_API_BASE=http://127.0.0.1:8082/v3
+
+POST /v3/contacts отвечает 202 (409 для уже известного email),
+POST /v3/newsletters — 201. FAKE_GETRESPONSE_RATE ограничивает число
+запросов в секунду (лишние получают 429, как у настоящего API).
+Сбои (задержки, 5xx) включаются через /fake/faults — см. fakes/faults.py.
+"""
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from fakes.faults import install_faults
+
+RATE_LIMIT = float(os.getenv("FAKE_GETRESPONSE_RATE", "0"))  # 0 — без ограничения
+
+app = FastAPI(title="Fake GetResponse")
+faults = install_faults(app)
+
+contacts = {}  # email -> campaignId
+stats = {"contacts": 0, "duplicates": 0, "newsletters": 0, "throttled": 0}
+_window = {"second": 0, "count": 0}
+
+
+def throttled() -> bool:
+    if not RATE_LIMIT:
+        return False
+    second = int(time.time())
+    if _window["second"] != second:
+        _window.update(second=second, count=0)
+    _window["count"] += 1
+    return _window["count"] > RATE_LIMIT
+
+
+def too_many_requests():
+    stats["throttled"] += 1
+    return JSONResponse(status_code=429, content={"httpStatus": 429, "code": 1008, "message": "Throttling limit"},
+                        headers={"Retry-After": "1"})
+
+
+@app.post("/v3/contacts", status_code=202)
+async def create_contact(request: Request):
+    if throttled():
+        return too_many_requests()
+    body = await request.json()
+    email = body.get("email", "").lower()
+    if email in contacts:
+        stats["duplicates"] += 1
+        return JSONResponse(status_code=409, content={"httpStatus": 409, "code": 1008, "message": "Contact already added"})
+    contacts[email] = body.get("campaign", {}).get("campaignId")
+    stats["contacts"] += 1
+    return None
+
+
+@app.post("/v3/newsletters", status_code=201)
+async def create_newsletter(request: Request):
+    if throttled():
+        return too_many_requests()
+    body = await request.json()
+    stats["newsletters"] += 1
+    return {"newsletterId": uuid.uuid4().hex[:8], "subject": body.get("subject")}
+
+
+@app.get("/fake/stats")
+async def get_stats():
+    return {**stats, "known_contacts": len(contacts)}
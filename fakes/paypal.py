@@ -0,0 +1,105 @@
+"""Локальная заглушка PayPal REST API.
+
+Запуск:
+    uvicorn fakes.paypal:app --port 8081
+
+И в .env магазина:
+    PAYPAL_API_BASE=http://127.0.0.1:8081
+    PAYPAL_WEBHOOK_ID=fake-webhook
+
+POST /fake/approve/{paypal_order_id} имитирует одобрение покупателем и
+отправляет вебхук CHECKOUT.ORDER.APPROVED на FAKE_PAYPAL_WEBHOOK_URL.
+
+Сбои PayPal (задержки, 5xx) включаются через /fake/faults — см. fakes/faults.py.
+"""
+import os
+import uuid
+from datetime import datetime
+
+import requests
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from fakes.faults import install_faults
+
+WEBHOOK_URL = os.getenv("FAKE_PAYPAL_WEBHOOK_URL", "http://127.0.0.1:8000/webhook")
+
+app = FastAPI(title="Fake PayPal")
+faults = install_faults(app)
+
+# paypal_order_id -> {"status": ..., "amount": ..., "captures": {request_id: body}}
+orders = {}
+
+
+@app.post("/v1/oauth2/token")
+async def oauth_token():
+    return {"access_token": f"fake-{uuid.uuid4().hex}", "token_type": "Bearer", "expires_in": 32400}
+
+
+@app.post("/v2/checkout/orders", status_code=201)
+async def create_order(request: Request):
+    body = await request.json()
+    order_id = uuid.uuid4().hex[:17].upper()
+    orders[order_id] = {
+        "status": "CREATED",
+        "amount": body["purchase_units"][0]["amount"],
+        "captures": {},
+    }
+    return {
+        "id": order_id,
+        "status": "CREATED",
+        "links": [
+            {"rel": "approve", "href": f"{request.base_url}fake/checkout/{order_id}", "method": "GET"},
+        ],
+    }
+
+
+@app.post("/v2/checkout/orders/{order_id}/capture", status_code=201)
+async def capture_order(order_id: str, paypal_request_id: str = Header(None)):
+    order = orders.get(order_id)
+    if not order:
+        return JSONResponse(status_code=404, content={"name": "RESOURCE_NOT_FOUND"})
+    if paypal_request_id and paypal_request_id in order["captures"]:
+        return order["captures"][paypal_request_id]
+    if order["status"] == "COMPLETED":
+        return JSONResponse(status_code=422, content={"name": "UNPROCESSABLE_ENTITY", "details": [{"issue": "ORDER_ALREADY_CAPTURED"}]})
+    if order["status"] != "APPROVED":
+        return JSONResponse(status_code=422, content={"name": "UNPROCESSABLE_ENTITY", "details": [{"issue": "ORDER_NOT_APPROVED"}]})
+    order["status"] = "COMPLETED"
+    result = {"id": order_id, "status": "COMPLETED"}
+    if paypal_request_id:
+        order["captures"][paypal_request_id] = result
+    return result
+
+
+@app.post("/v1/notifications/verify-webhook-signature")
+async def verify_signature(request: Request):
+    body = await request.json()
+    # Подпись "invalid" позволяет проверить отказ
+    status = "FAILURE" if body.get("transmission_sig") == "invalid" else "SUCCESS"
+    return {"verification_status": status}
+
+
+# Обычная функция (пул потоков): пока вебхук ждёт ответа магазина, заглушка
+# должна отвечать на его запрос verify-webhook-signature
+@app.api_route("/fake/approve/{order_id}", methods=["GET", "POST"])
+def approve(order_id: str, send_webhook: bool = True):
+    order = orders.get(order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Unknown order")
+    order["status"] = "APPROVED"
+    event = {
+        "id": f"WH-{uuid.uuid4().hex}",
+        "event_type": "CHECKOUT.ORDER.APPROVED",
+        "create_time": datetime.utcnow().isoformat() + "Z",
+        "resource": {"id": order_id, "status": "APPROVED"},
+    }
+    if send_webhook:
+        requests.post(WEBHOOK_URL, json=event, headers={
+            "PAYPAL-AUTH-ALGO": "SHA256withRSA",
+            "PAYPAL-CERT-URL": "http://127.0.0.1/fake-cert.pem",
+            "PAYPAL-TRANSMISSION-ID": uuid.uuid4().hex,
+            "PAYPAL-TRANSMISSION-SIG": "fake",
+            "PAYPAL-TRANSMISSION-TIME": event["create_time"],
+        }, timeout=10)
+    return {"success": True, "event": event}
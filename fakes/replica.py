@@ -0,0 +1,78 @@
+"""Локальная реплика SQLite: копия основной базы, отстающая на --interval секунд.
+
+Запуск:
+    python -m fakes.replica users.db replica.db --interval 1
+
+И в .env магазина:
+    DATABASE_REPLICA_URLS=sqlite:///replica.db
+    REPLICA_MAX_LAG=2
+
+Раз в --interval секунд основная база целиком переносится в реплику через
+sqlite3 backup API. На одной машине это ведёт себя как асинхронная
+репликация: витрина видит правки с опозданием, а пользователь, который
+только что изменил корзину, читает из основной БД (main.get_read_db).
+"""
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def copy_once(primary: str, replica: str):
+    source = sqlite3.connect(f"file:{primary}?mode=ro", uri=True)
+    target = sqlite3.connect(replica, timeout=30)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+class Replicator(threading.Thread):
+    """Копирует primary в replica каждые interval секунд, пока не вызван stop()"""
+
+    def __init__(self, primary: str, replica: str, interval: float):
+        super().__init__(daemon=True)
+        self.primary = primary
+        self.replica = replica
+        self.interval = interval
+        self.copies = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                copy_once(self.primary, self.replica)
+                self.copies += 1
+            except sqlite3.Error as e:
+                logger.warning(f"Replica copy failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Реплика SQLite с задержкой")
+    parser.add_argument("primary")
+    parser.add_argument("replica")
+    parser.add_argument("--interval", type=float, default=1.0, help="Отставание реплики, секунды")
+    args = parser.parse_args()
+    copy_once(args.primary, args.replica)
+    logger.info(f"Replicating {args.primary} -> {args.replica} every {args.interval}s")
+    replicator = Replicator(args.primary, args.replica, args.interval)
+    replicator.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        replicator.stop()
+        logger.info(f"Replica stopped after {replicator.copies} copies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Локальный SMTP-приёмник: принимает любые письма и только считает их.
+
+Запуск:
+    python -m fakes.smtp --port 8025
+
+И в .env магазина:
+    SMTP_HOST=127.0.0.1
+    SMTP_PORT=8025
+    SMTP_USE_TLS=false
+
+Поддерживает EHLO/HELO, AUTH (любой логин), MAIL, RCPT, DATA, RSET, NOOP,
+QUIT. Сбои задаются теми же FAKE_FAULT_DELAY / FAKE_FAULT_ERROR_RATE, что и
+в HTTP-заглушках (fakes/faults.py): задержка перед каждым ответом и доля
+писем, отклонённых кодом 451.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+
+logger = logging.getLogger(__name__)
+
+stats = {"connections": 0, "messages": 0, "rejected": 0}
+
+
+class SmtpSession:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, delay: float, error_rate: float):
+        self.reader = reader
+        self.writer = writer
+        self.delay = delay
+        self.error_rate = error_rate
+
+    async def reply(self, line: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.writer.write(f"{line}\r\n".encode())
+        await self.writer.drain()
+
+    async def read_data(self) -> int:
+        size = 0
+        while True:
+            line = await self.reader.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                return size
+            size += len(line)
+
+    async def run(self):
+        stats["connections"] += 1
+        await self.reply("220 fake-smtp ready")
+        while True:
+            raw = await self.reader.readline()
+            if not raw:
+                return
+            command = raw.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                await self.reply("250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+            elif verb == "HELO":
+                await self.reply("250 fake-smtp")
+            elif verb == "AUTH":
+                parts = command.split()
+                if len(parts) == 2 and parts[1].upper() == "LOGIN":
+                    # Логин и пароль приходят отдельными строками
+                    await self.reply("334 VXNlcm5hbWU6")
+                    await self.reader.readline()
+                    await self.reply("334 UGFzc3dvcmQ6")
+                    await self.reader.readline()
+                await self.reply("235 2.7.0 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                await self.reply("250 OK")
+            elif verb == "DATA":
+                await self.reply("354 End data with <CR><LF>.<CR><LF>")
+                await self.read_data()
+                if random.random() < self.error_rate:
+                    stats["rejected"] += 1
+                    await self.reply("451 4.3.0 Temporary failure")
+                else:
+                    stats["messages"] += 1
+                    await self.reply("250 OK queued")
+            elif verb == "QUIT":
+                await self.reply("221 Bye")
+                return
+            else:
+                await self.reply("502 Command not implemented")
+
+
+async def serve(host: str, port: int, delay: float, error_rate: float):
+    async def handle(reader, writer):
+        try:
+            await SmtpSession(reader, writer, delay, error_rate).run()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Fake SMTP listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Заглушка SMTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+    delay = float(os.getenv("FAKE_FAULT_DELAY", "0"))
+    error_rate = float(os.getenv("FAKE_FAULT_ERROR_RATE", "0"))
+    try:
+        asyncio.run(serve(args.host, args.port, delay, error_rate))
+    except KeyboardInterrupt:
+        logger.info(f"Fake SMTP stopped: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Быстрая сериализация JSON-ответов.
+
+orjson кодирует в несколько раз быстрее stdlib json и сразу отдаёт bytes.
+FastJSONResponse — класс ответа по умолчанию для всего приложения. Горячие
+маршруты (каталог, корзина) собирают тело сами через json_response: словари
+из БД/корзины кодируются один раз, без построения Pydantic-моделей и
+повторной проверки через response_model (модели остаются для схемы OpenAPI).
+Без orjson — тот же компактный вывод через json.
+"""
+import json
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson есть в requirements.txt
+    orjson = None
+
+
+def _default(value):
+    # datetime для json без orjson, Decimal и прочее — как у jsonable_encoder
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(payload) -> bytes:
+    """Компактный UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def json_response(payload, status_code: int = 200, headers: dict = None) -> Response:
+    return raw_json_response(dumps(payload), status_code, headers)
+
+
+def raw_json_response(body: bytes, status_code: int = 200, headers: dict = None) -> Response:
+    """Уже закодированное тело; FastAPI не проверяет его повторно по response_model"""
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
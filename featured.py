@@ -0,0 +1,174 @@
+"""Подборки товаров на витрине: новинки, хиты продаж, категории, ручные списки.
+
+Подборка — строка collections с правилом:
+
+* manual — товары в порядке, заданном админом (collection_items.position);
+* new_arrivals — товары с is_new_arrival, сначала самые новые;
+* bestsellers — больше всего проданных единиц за BESTSELLER_DAYS дней
+  (по агрегатам sales_daily_product, без чтения order_items);
+* category — последние товары категории rule_value.
+
+Все подборки материализуются разом: готовые списки товаров и JSON-тела с
+ETag лежат в кэше витрины (catalog.cached), поэтому главная страница не
+ходит в БД. Админские маршруты сбрасывают кэш через
+invalidate_catalog_caches(), хиты продаж обновляются по CATALOG_CACHE_TTL.
+Подборки из DEFAULT_COLLECTIONS есть всегда, пока админ не сохранит свою
+с тем же slug.
+"""
+import logging
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+
+import catalog
+from database import Collection, CollectionItem, Product, SalesDailyProduct
+
+logger = logging.getLogger(__name__)
+
+RULES = ("manual", "new_arrivals", "bestsellers", "category")
+BESTSELLER_DAYS = 30
+MAX_ITEMS_LIMIT = 48
+NEW_ARRIVALS_SLUG = "new-arrivals"
+NEW_ARRIVALS_LIMIT = 4
+SLUG_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,63}$")
+
+DEFAULT_COLLECTIONS = [
+    {"slug": NEW_ARRIVALS_SLUG, "title": "Новинки", "rule": "new_arrivals", "rule_value": None,
+     "max_items": NEW_ARRIVALS_LIMIT, "position": 0},
+    {"slug": "bestsellers", "title": "Хиты продаж", "rule": "bestsellers", "rule_value": None,
+     "max_items": 8, "position": 1},
+]
+
+
+class FeaturedSnapshot:
+    """Материализованные подборки и их закодированные ответы"""
+
+    def __init__(self, collections: list):
+        self.collections = {c["slug"]: c for c in collections}
+        self.index_body, self.index_etag = catalog.encode_payload({"success": True, "data": collections})
+        # slug -> (тело, ETag): подборка целиком и только список товаров (/api/new-arrivals)
+        self.bodies = {c["slug"]: catalog.encode_payload({"success": True, "data": c}) for c in collections}
+        self.product_lists = {c["slug"]: catalog.encode_payload(c["products"]) for c in collections}
+
+
+def _definitions(db: Session):
+    definitions = {d["slug"]: {**d, "product_ids": [], "builtin": True} for d in DEFAULT_COLLECTIONS}
+    for row in db.query(Collection).options(selectinload(Collection.items)):
+        definitions[row.slug] = {
+            "slug": row.slug,
+            "title": row.title,
+            "rule": row.rule,
+            "rule_value": row.rule_value,
+            "max_items": row.max_items,
+            "position": row.position,
+            "product_ids": [item.product_id for item in row.items],
+            "builtin": False,
+        }
+    return sorted(definitions.values(), key=lambda d: (d["position"], d["slug"]))
+
+
+def _bestseller_ids(db: Session, limit: int):
+    since = datetime.utcnow().date() - timedelta(days=BESTSELLER_DAYS)
+    units = func.sum(SalesDailyProduct.units)
+    rows = (
+        db.query(SalesDailyProduct.product_id)
+        .filter(SalesDailyProduct.day >= since)
+        .group_by(SalesDailyProduct.product_id)
+        .order_by(units.desc())
+        .limit(limit)
+        .all()
+    )
+    return [int(pid) for pid, in rows if pid and pid.isdigit()]
+
+
+def _resolve(db: Session, definition: dict):
+    """Товары подборки в порядке показа"""
+    rule, limit = definition["rule"], definition["max_items"]
+    if rule == "new_arrivals":
+        return (
+            db.query(Product).filter(Product.is_new_arrival == True)
+            .order_by(Product.id.desc()).limit(limit).all()
+        )
+    if rule == "category":
+        return (
+            db.query(Product).filter(Product.category == definition["rule_value"])
+            .order_by(Product.id.desc()).limit(limit).all()
+        )
+    ids = _bestseller_ids(db, limit) if rule == "bestsellers" else definition["product_ids"][:limit]
+    if not ids:
+        return []
+    # Удалённые товары просто выпадают из подборки
+    by_id = {p.id: p for p in db.query(Product).filter(Product.id.in_(ids))}
+    return [by_id[pid] for pid in ids if pid in by_id]
+
+
+def build_snapshot(db: Session) -> FeaturedSnapshot:
+    collections = []
+    for definition in _definitions(db):
+        collections.append({
+            "slug": definition["slug"],
+            "title": definition["title"],
+            "products": [catalog.product_to_dict(p) for p in _resolve(db, definition)],
+        })
+    logger.info(f"Featured collections materialized: {len(collections)}")
+    return FeaturedSnapshot(collections)
+
+
+def snapshot(db: Session) -> FeaturedSnapshot:
+    return catalog.cached("featured", lambda: build_snapshot(db))
+
+
+def new_arrivals(db: Session, limit: int = NEW_ARRIVALS_LIMIT):
+    collection = snapshot(db).collections.get(NEW_ARRIVALS_SLUG)
+    return collection["products"][:limit] if collection else []
+
+
+# --- Управление подборками (админка) ---
+
+def list_definitions(db: Session):
+    return _definitions(db)
+
+
+def save_collection(db: Session, slug: str, data: dict) -> Collection:
+    """Создаёт или заменяет подборку; фиксирует транзакцию вызывающий код"""
+    if not SLUG_PATTERN.match(slug):
+        raise ValueError("Slug: латинские буквы в нижнем регистре, цифры и дефис")
+    if data["rule"] not in RULES:
+        raise ValueError(f"Неизвестное правило подборки: {data['rule']}")
+    if data["rule"] == "category" and not data.get("rule_value"):
+        raise ValueError("Для подборки по категории нужна категория")
+    if not 1 <= data["max_items"] <= MAX_ITEMS_LIMIT:
+        raise ValueError(f"max_items должен быть от 1 до {MAX_ITEMS_LIMIT}")
+
+    product_ids = list(dict.fromkeys(data.get("product_ids") or []))
+    if data["rule"] == "manual" and product_ids:
+        found = {pid for pid, in db.query(Product.id).filter(Product.id.in_(product_ids))}
+        missing = [pid for pid in product_ids if pid not in found]
+        if missing:
+            raise ValueError(f"Товары не найдены: {missing}")
+
+    collection = db.query(Collection).filter(Collection.slug == slug).first()
+    if not collection:
+        collection = Collection(slug=slug)
+        db.add(collection)
+    collection.title = data["title"]
+    collection.rule = data["rule"]
+    collection.rule_value = data.get("rule_value")
+    collection.max_items = data["max_items"]
+    collection.position = data.get("position", 0)
+    collection.items = [
+        CollectionItem(product_id=pid, position=i)
+        for i, pid in enumerate(product_ids if data["rule"] == "manual" else [])
+    ]
+    return collection
+
+
+def delete_collection(db: Session, slug: str) -> bool:
+    """Удаляет подборку админа; встроенная с тем же slug снова станет видна"""
+    collection = db.query(Collection).filter(Collection.slug == slug).first()
+    if not collection:
+        return False
+    db.delete(collection)
+    return True
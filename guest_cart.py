@@ -0,0 +1,99 @@
+"""Корзина гостя в подписанной cookie.
+
+Cookie хранит только пары [product_id, quantity] и HMAC-подпись, поэтому
+гостю не нужна ни учётная запись, ни строка в БД. Название, цена и
+картинка берутся из таблицы products одним запросом при чтении — цене из
+cookie не доверяем. При входе (auth.login_post) корзина гостя одним
+upsert-ом переносится в корзину пользователя, а cookie удаляется.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from cart_store import get_cart_store
+from database import Product
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")  # Matches main.py
+
+GUEST_CART_COOKIE = "guest_cart"
+GUEST_CART_MAX_AGE = 30 * 24 * 3600
+# Ограничение держит cookie в пределах 4 КБ
+GUEST_CART_MAX_ITEMS = 50
+
+
+def _sign(data: bytes) -> str:
+    digest = hmac.new(SECRET_KEY.encode(), data, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).decode().rstrip("=")
+
+
+def read_guest_cart(request) -> dict:
+    """{product_id: quantity} в порядке добавления; пустой словарь при неверной подписи"""
+    raw = request.cookies.get(GUEST_CART_COOKIE)
+    if not raw or "." not in raw:
+        return {}
+    body, signature = raw.rsplit(".", 1)
+    if not hmac.compare_digest(_sign(body.encode()), signature):
+        logger.warning("Guest cart cookie with invalid signature ignored")
+        return {}
+    try:
+        padded = body + "=" * (-len(body) % 4)
+        pairs = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return {str(pid): int(qty) for pid, qty in pairs if int(qty) > 0}
+    except (ValueError, TypeError):
+        return {}
+
+
+def write_guest_cart(response, items: dict):
+    if not items:
+        response.delete_cookie(GUEST_CART_COOKIE, path="/")
+        return
+    pairs = list(items.items())[:GUEST_CART_MAX_ITEMS]
+    body = base64.urlsafe_b64encode(json.dumps(pairs, separators=(",", ":")).encode()).decode().rstrip("=")
+    response.set_cookie(
+        key=GUEST_CART_COOKIE,
+        value=f"{body}.{_sign(body.encode())}",
+        httponly=True,
+        samesite="lax",
+        secure=True,
+        max_age=GUEST_CART_MAX_AGE,
+        path="/"
+    )
+
+
+def hydrate(db: Session, items: dict):
+    """Позиции корзины в формате cart_store; неизвестные товары отбрасываются"""
+    if not items:
+        return []
+    ids = [int(pid) for pid in items if pid.isdigit()]
+    products = {str(p.id): p for p in db.query(Product).filter(Product.id.in_(ids))}
+    return [
+        {
+            "product_id": pid,
+            "name": products[pid].name,
+            "price": products[pid].price,
+            "image": products[pid].image,
+            "quantity": qty,
+        }
+        for pid, qty in items.items()
+        if pid in products
+    ]
+
+
+def merge_guest_cart(request, response, db: Session, user_id: int) -> int:
+    """Переносит корзину гостя в корзину пользователя. Возвращает число позиций"""
+    items = hydrate(db, read_guest_cart(request))
+    if items:
+        get_cart_store().merge(db, user_id, items)
+        logger.info(f"Merged {len(items)} guest cart items into user_id={user_id}")
+    if GUEST_CART_COOKIE in request.cookies:
+        response.delete_cookie(GUEST_CART_COOKIE, path="/")
+    return len(items)
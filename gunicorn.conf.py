@@ -0,0 +1,53 @@
+"""Настройки gunicorn для продакшена; их использует serve.py.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Воркеры — uvicorn (uvloop + httptools, если установлены). Приложение
+загружается до fork (preload_app): шаблоны, модули и код делятся между
+воркерами copy-on-write, а упавший при импорте код не запускает ни одного
+воркера. Воркеры перезапускаются каждые MAX_REQUESTS запросов (с разбросом,
+чтобы не все сразу) и при остановке дообслуживают начатые запросы
+GRACEFUL_TIMEOUT секунд.
+"""
+import multiprocessing
+import os
+
+CORES = multiprocessing.cpu_count()
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+# Обработчики частично блокируют event loop (синхронный SQLAlchemy), поэтому
+# воркеров больше, чем ядер; WEB_CONCURRENCY — как на Render/Heroku
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(2 * CORES + 1, 12))))
+worker_class = "serve.ShopUvicornWorker"
+preload_app = True
+
+# Keep-alive дольше простоя соединения у балансировщика — иначе он изредка
+# отправляет запрос в уже закрытое соединение и отдаёт 502
+keepalive = int(os.getenv("KEEPALIVE", "65"))
+backlog = int(os.getenv("BACKLOG", "2048"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+max_requests = int(os.getenv("MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "500"))
+
+# Адреса прокси, которым доверяем X-Forwarded-For / X-Forwarded-Proto
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# Heartbeat воркеров в памяти, а не на диске (на медленном диске воркеры «зависают»)
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+accesslog = "-" if os.getenv("ACCESS_LOG", "false").lower() == "true" else None
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    # Соединения пулов, открытые до fork, нельзя делить между процессами
+    from database import engine, read_engines
+
+    for pool_engine in [engine, *read_engines]:
+        pool_engine.dispose(close=False)
+
+
+def when_ready(server):
+    server.log.info(
+        f"Serving on {bind}: workers={workers}, cores={CORES}, keepalive={keepalive}s, "
+        f"max_requests={max_requests}±{max_requests_jitter}"
+    )
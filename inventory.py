@@ -0,0 +1,162 @@
+"""Остатки товаров и резервирование при оформлении заказа.
+
+products.stock — сколько единиц можно продать; NULL — остаток не ведётся
+(товар продаётся без ограничений, как до появления складского учёта).
+
+Резерв списывается одним условным UPDATE на все строки корзины:
+    UPDATE products SET stock = stock - CASE id WHEN … END
+    WHERE id IN (…) AND (stock IS NULL OR stock >= CASE id WHEN … END)
+Если обновилось меньше строк, чем товаров в корзине, чего-то не хватает —
+транзакция откатывается целиком. Проверка и списание происходят в одной
+инструкции под блокировкой строки, поэтому параллельные покупки одного
+товара не продают больше, чем есть, и не ждут друг друга дольше самого
+UPDATE (в отличие от SELECT … FOR UPDATE на время всего оформления).
+
+Резерв принадлежит заказу (orders.stock_reserved) и возвращается:
+* при отказе в оплате (payments.reconcile_payments);
+* если покупатель не одобрил платёж за RESERVATION_MINUTES — заказ
+  переходит в expired (задача tasks.expire_reservations);
+* при ошибке создания заказа в PayPal.
+Флаг снимается условным UPDATE, поэтому остаток не вернётся дважды.
+"""
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import case, or_, update
+from sqlalchemy.orm import Session
+
+from database import Order, OrderItem, Product
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+RESERVATION_MINUTES = int(os.getenv("RESERVATION_MINUTES", "30"))
+RESERVATION_EXPIRE_INTERVAL = float(os.getenv("RESERVATION_EXPIRE_INTERVAL", "60"))
+RESERVATION_EXPIRE_BATCH = int(os.getenv("RESERVATION_EXPIRE_BATCH", "200"))
+
+
+class OutOfStock(Exception):
+    def __init__(self, shortages: list):
+        super().__init__(", ".join(f"{s['name']} (доступно {s['available']})" for s in shortages))
+        self.shortages = shortages
+
+
+class InvalidQuantity(ValueError):
+    """Количество в строке меньше 1: такой «резерв» добавил бы товар на склад"""
+
+
+def order_lines(items) -> dict:
+    """{product_id: quantity} по строкам корзины или заказа"""
+    lines = defaultdict(int)
+    for item in items:
+        product_id = item["product_id"] if isinstance(item, dict) else item.product_id
+        quantity = item["quantity"] if isinstance(item, dict) else item.quantity
+        # Позиции не из каталога (нечисловой product_id) остатков не имеют
+        if product_id is not None and str(product_id).isdigit():
+            if int(quantity) < 1:
+                raise InvalidQuantity(f"товар {product_id}, количество {quantity}")
+            lines[int(product_id)] += int(quantity)
+    return dict(lines)
+
+
+def reserve(db: Session, lines: dict):
+    """Списывает остатки по всем строкам одним UPDATE. При нехватке откатывает транзакцию и бросает OutOfStock,
+    при количестве меньше 1 — InvalidQuantity, ничего не меняя"""
+    if not lines:
+        return
+    invalid = {product_id: qty for product_id, qty in lines.items() if qty < 1}
+    if invalid:
+        raise InvalidQuantity(", ".join(f"товар {pid}, количество {qty}" for pid, qty in invalid.items()))
+    quantity = case(lines, value=Product.id)
+    result = db.execute(
+        update(Product)
+        .where(Product.id.in_(list(lines)), or_(Product.stock.is_(None), Product.stock >= quantity))
+        .values(stock=Product.stock - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(lines):
+        db.rollback()
+        raise OutOfStock(shortages(db, lines))
+
+
+def shortages(db: Session, lines: dict) -> list:
+    found = {
+        row.id: row
+        for row in db.query(Product.id, Product.name, Product.stock).filter(Product.id.in_(list(lines)))
+    }
+    result = []
+    for product_id, quantity in lines.items():
+        row = found.get(product_id)
+        if row is None:
+            result.append({"product_id": product_id, "name": f"#{product_id}", "available": 0})
+        elif row.stock is not None and row.stock < quantity:
+            result.append({"product_id": product_id, "name": row.name, "available": row.stock})
+    return result
+
+
+def mark_reserved(order: Order):
+    order.stock_reserved = True
+    order.reserved_until = datetime.utcnow() + timedelta(minutes=RESERVATION_MINUTES)
+
+
+def reclaim(db: Session, order: Order) -> bool:
+    """Новый резерв для заказа expired, одобренного покупателем после истечения срока.
+    False — товара уже нет (транзакция откачена). Коммит — за вызывающим"""
+    try:
+        reserve(db, order_lines(order.order_items))
+    except OutOfStock as e:
+        logger.warning(f"Order {order.id} cannot be resumed: {e}")
+        return False
+    mark_reserved(order)
+    return True
+
+
+def release(db: Session, order_ids) -> int:
+    """Возвращает на склад резервы заказов; коммит — за вызывающим. Число заказов, чей резерв снят"""
+    released = []
+    for order_id in order_ids:
+        claimed = (
+            db.query(Order)
+            .filter(Order.id == order_id, Order.stock_reserved == True)  # noqa: E712
+            .update({Order.stock_reserved: False}, synchronize_session=False)
+        )
+        if claimed:
+            released.append(order_id)
+    if not released:
+        return 0
+    lines = order_lines(
+        db.query(OrderItem.product_id, OrderItem.quantity).filter(OrderItem.order_id.in_(released)).all()
+    )
+    if lines:
+        quantity = case(lines, value=Product.id)
+        db.execute(
+            update(Product)
+            .where(Product.id.in_(list(lines)), Product.stock.isnot(None))
+            .values(stock=Product.stock + quantity)
+            .execution_options(synchronize_session=False)
+        )
+    logger.info(f"Stock released for orders {released}")
+    return len(released)
+
+
+def expire_reservations(db: Session, batch_size: int = RESERVATION_EXPIRE_BATCH) -> int:
+    """Неодобренные вовремя заказы: резерв возвращается, статус — expired"""
+    candidates = [
+        order_id for (order_id,) in db.query(Order.id)
+        .filter(Order.status == "pending", Order.reserved_until < datetime.utcnow())
+        .order_by(Order.reserved_until)
+        .limit(batch_size)
+    ]
+    # Условный переход pending -> expired: заказ, одобренный в этот момент, не теряет резерв
+    expired_ids = [
+        order_id for order_id in candidates
+        if db.query(Order).filter(Order.id == order_id, Order.status == "pending")
+        .update({Order.status: "expired"}, synchronize_session=False)
+    ]
+    release(db, expired_ids)
+    db.commit()
+    return len(expired_ids)
+
@@ -0,0 +1,241 @@
+"""Фоновые задачи на таблице jobs.
+
+Задача регистрируется декоратором @job, ставится в очередь через enqueue()
+и выполняется воркером (python worker.py). Периодические задачи (@periodic)
+планируются самими воркерами; unique_key не даёт поставить один и тот же
+запуск дважды, даже если воркеров несколько.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from breakers import IntegrationUnavailable
+from database import Job, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Лимит одновременно выполняемых задач на очередь (по всем воркерам)
+QUEUE_CONCURRENCY = {
+    "default": int(os.getenv("JOBS_DEFAULT_CONCURRENCY", "4")),
+    "email": int(os.getenv("JOBS_EMAIL_CONCURRENCY", "2")),
+    "getresponse": int(os.getenv("JOBS_GETRESPONSE_CONCURRENCY", "1")),
+    "payments": int(os.getenv("JOBS_PAYMENTS_CONCURRENCY", "1")),
+    # Один писатель файлов рекомендаций (recommendations.py)
+    "recommendations": 1,
+}
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "1"))
+JOBS_BACKOFF_BASE = float(os.getenv("JOBS_BACKOFF_BASE", "5"))
+JOBS_BACKOFF_MAX = float(os.getenv("JOBS_BACKOFF_MAX", "3600"))
+# Задача в статусе running дольше этого времени считается потерянной (воркер упал)
+JOBS_LOCK_TIMEOUT = int(os.getenv("JOBS_LOCK_TIMEOUT", "600"))
+
+JOB_HANDLERS = {}   # name -> (func, queue, max_attempts)
+PERIODIC_JOBS = []  # (name, every_seconds)
+
+
+def job(name: str, queue: str = "default", max_attempts: int = 5):
+    """Регистрирует функцию как фоновую задачу. Функция получает payload как kwargs"""
+    def decorator(func):
+        JOB_HANDLERS[name] = (func, queue, max_attempts)
+        return func
+    return decorator
+
+
+def periodic(name: str, every: float):
+    """Запускает зарегистрированную задачу раз в every секунд"""
+    def decorator(func):
+        PERIODIC_JOBS.append((name, every))
+        return func
+    return decorator
+
+
+def enqueue(db: Session, name: str, payload: dict = None, delay: float = 0,
+            unique_key: str = None, commit: bool = True):
+    """Ставит задачу в очередь. Возвращает Job или None, если unique_key уже занят"""
+    if name not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job: {name}")
+    _, queue, max_attempts = JOB_HANDLERS[name]
+    new_job = Job(
+        queue=queue,
+        name=name,
+        payload=json.dumps(payload or {}),
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        unique_key=unique_key,
+    )
+    db.add(new_job)
+    if not commit:
+        return new_job
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    logger.info(f"Job queued: {name} (queue={queue}, id={new_job.id})")
+    return new_job
+
+
+def backoff_delay(attempts: int) -> float:
+    """Экспоненциальная задержка с джиттером перед повторной попыткой"""
+    delay = min(JOBS_BACKOFF_BASE * (2 ** (attempts - 1)), JOBS_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class Worker:
+    def __init__(self, queues=None, poll_interval: float = JOBS_POLL_INTERVAL):
+        self.queues = list(queues or QUEUE_CONCURRENCY)
+        self.poll_interval = poll_interval
+        self.executors = {
+            q: ThreadPoolExecutor(max_workers=QUEUE_CONCURRENCY.get(q, 1), thread_name_prefix=f"job-{q}")
+            for q in self.queues
+        }
+        self.in_flight = {q: 0 for q in self.queues}
+        self.scheduled_slots = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def run(self):
+        logger.info(f"Job worker started: queues={self.queues}")
+        while not self.stopping.is_set():
+            try:
+                self.schedule_periodic()
+                self.requeue_stale()
+                claimed = self.claim_and_dispatch()
+            except Exception as e:
+                logger.error(f"Job worker loop error: {e}")
+                claimed = 0
+            if not claimed:
+                self.stopping.wait(self.poll_interval)
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+        logger.info("Job worker stopped")
+
+    def stop(self):
+        self.stopping.set()
+
+    def schedule_periodic(self):
+        now = time.time()
+        db = SessionLocal()
+        try:
+            for name, every in PERIODIC_JOBS:
+                if JOB_HANDLERS[name][1] not in self.queues:
+                    continue
+                slot = int(now // every)
+                if self.scheduled_slots.get(name) == slot:
+                    continue
+                enqueue(db, name, unique_key=f"periodic:{name}:{slot}")
+                self.scheduled_slots[name] = slot
+        finally:
+            db.close()
+
+    def requeue_stale(self):
+        deadline = datetime.utcnow() - timedelta(seconds=JOBS_LOCK_TIMEOUT)
+        db = SessionLocal()
+        try:
+            count = db.query(Job).filter(
+                Job.status == "running", Job.locked_at < deadline, Job.queue.in_(self.queues)
+            ).update({Job.status: "queued", Job.locked_at: None}, synchronize_session=False)
+            db.commit()
+            if count:
+                logger.warning(f"Requeued {count} stale jobs")
+        finally:
+            db.close()
+
+    def claim_and_dispatch(self) -> int:
+        claimed = 0
+        db = SessionLocal()
+        try:
+            for queue in self.queues:
+                limit = QUEUE_CONCURRENCY.get(queue, 1)
+                with self.lock:
+                    free = limit - self.in_flight[queue]
+                if free <= 0:
+                    continue
+                candidates = (
+                    db.query(Job.id)
+                    .filter(Job.queue == queue, Job.status == "queued", Job.run_at <= datetime.utcnow())
+                    .order_by(Job.run_at, Job.id)
+                    .limit(free)
+                    .all()
+                )
+                for (job_id,) in candidates:
+                    running = (
+                        db.query(func.count(Job.id))
+                        .filter(Job.queue == queue, Job.status == "running")
+                        .scalar_subquery()
+                    )
+                    # Атомарный захват: задача ещё свободна и лимит очереди не исчерпан
+                    won = db.query(Job).filter(
+                        Job.id == job_id, Job.status == "queued", running < limit
+                    ).update(
+                        {Job.status: "running", Job.locked_at: datetime.utcnow(), Job.attempts: Job.attempts + 1},
+                        synchronize_session=False,
+                    )
+                    db.commit()
+                    if not won:
+                        continue
+                    with self.lock:
+                        self.in_flight[queue] += 1
+                    self.executors[queue].submit(self.execute, job_id, queue)
+                    claimed += 1
+        finally:
+            db.close()
+        return claimed
+
+    def execute(self, job_id: int, queue: str):
+        db = SessionLocal()
+        try:
+            current = db.get(Job, job_id)
+            handler = JOB_HANDLERS.get(current.name)
+            try:
+                if handler is None:
+                    raise RuntimeError(f"No handler registered for {current.name}")
+                handler[0](**json.loads(current.payload))
+            except IntegrationUnavailable as e:
+                # Интеграция отключена предохранителем: откладываем, не расходуя попытку
+                db.rollback()
+                current.status = "queued"
+                current.attempts -= 1
+                current.last_error = str(e)
+                current.run_at = datetime.utcnow() + timedelta(seconds=max(e.retry_after, 1))
+                logger.info(f"Job {current.name}#{job_id} deferred until {current.run_at}: {e}")
+            except Exception as e:
+                db.rollback()
+                current.last_error = "".join(traceback.format_exception_only(type(e), e)).strip()
+                if current.attempts >= current.max_attempts:
+                    current.status = "failed"
+                    current.finished_at = datetime.utcnow()
+                    logger.error(f"Job {current.name}#{job_id} failed permanently: {e}")
+                else:
+                    current.status = "queued"
+                    current.run_at = datetime.utcnow() + timedelta(seconds=backoff_delay(current.attempts))
+                    logger.warning(f"Job {current.name}#{job_id} failed (attempt {current.attempts}), retry at {current.run_at}: {e}")
+            else:
+                current.status = "done"
+                current.finished_at = datetime.utcnow()
+            current.locked_at = None
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Job bookkeeping error for #{job_id}: {e}")
+        finally:
+            db.close()
+            with self.lock:
+                self.in_flight[queue] -= 1
+
+
+def start_embedded_worker(queues=None) -> Worker:
+    """Запускает воркер в фоновом потоке текущего процесса (однопроцессный деплой)"""
+    worker = Worker(queues)
+    threading.Thread(target=worker.run, name="job-worker", daemon=True).start()
+    return worker
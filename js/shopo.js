@@ -21,14 +21,6 @@ function showNotification(message, isSuccess) {
     }, 3000);
 }
 
-function saveCartToSession() {
-    sessionStorage.setItem('cart', JSON.stringify(cart));
-}
-
-function loadCartFromSession() {
-    return JSON.parse(sessionStorage.getItem('cart') || '[]');
-}
-
 function saveCartToLocal() {
     localStorage.setItem('cart', JSON.stringify(cart));
 }
@@ -46,20 +38,17 @@ function updateCartUI() {
     if (checkoutBtn) {
     checkoutBtn.addEventListener('click', async () => {
         try {
-            // Проверяем аутентификацию
-            const userResponse = await fetch('/api/me', { credentials: 'include' });
-            const userData = await userResponse.json();
-            if (!userData.success) {
-                showNotification('Please log in to checkout', false);
-                return;
-            }
-
             // Создаём PayPal order
             const response = await fetch('/api/create-paypal-order', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 credentials: 'include'
             });
+            // Гость может собрать корзину, но оплата — только после входа
+            if (response.status === 401) {
+                showNotification('Please log in to checkout', false);
+                return;
+            }
             const result = await response.json();
             if (result.success) {
                 window.location.href = result.approval_url;  // Редирект на PayPal
@@ -139,76 +128,23 @@ function updateCartUI() {
     });
 }
 
-async function fetchServerCart() {
-    try {
-        console.log('Fetching server cart from /api/cart');
-        const response = await fetch('/api/cart', {
-            method: 'GET',
-            credentials: 'include'
-        });
-        console.log('fetchServerCart status:', response.status);
-        console.log('fetchServerCart headers:', [...response.headers]);
-        const text = await response.text();
-        console.log('fetchServerCart response text:', text);
-        let result;
-        try {
-            result = JSON.parse(text);
-        } catch (e) {
-            console.error('fetchServerCart JSON parse error:', e);
-            throw new Error('Invalid JSON response');
-        }
-        console.log('fetchServerCart result:', result);
-        if (result.success && result.data) {
-            cart = result.data;
-            saveCartToLocal();
-            updateCartUI();
-            return true;
-        } else {
-            console.error('fetchServerCart failed:', result.error || 'No data');
-            return false;
-        }
-    } catch (error) {
-        console.error('fetchServerCart error:', error.message);
-        showNotification('Error loading cart from server: ' + error.message, false);
-        return false;
-    }
-}
-
-async function loadCart() {
+async function sendCartRequest(url, options, label) {
+    const response = await fetch(url, {
+        headers: { 'Content-Type': 'application/json' },
+        credentials: 'include',
+        ...options
+    });
+    console.log(`${label} status:`, response.status);
+    const text = await response.text();
+    let result;
     try {
-        console.log('Fetching user data from /api/me for loadCart');
-        const response = await fetch('/api/me', {
-            credentials: 'include'
-        });
-        console.log('loadCart /api/me status:', response.status);
-        console.log('loadCart /api/me headers:', [...response.headers]);
-        const text = await response.text();
-        console.log('loadCart /api/me response text:', text);
-        let userData;
-        try {
-            userData = JSON.parse(text);
-        } catch (e) {
-            console.error('loadCart JSON parse error:', e);
-            throw new Error('Invalid JSON response');
-        }
-        console.log('loadCart /api/me result:', userData);
-
-        if (userData.success) {
-            const success = await fetchServerCart();
-            if (!success) {
-                cart = loadCartFromLocal();
-                updateCartUI();
-            }
-        } else {
-            console.log('loadCart: User not authenticated, using session cart');
-            cart = loadCartFromSession();
-            updateCartUI();
-        }
-    } catch (error) {
-        console.error('loadCart error:', error.message);
-        cart = loadCartFromSession();
-        updateCartUI();
+        result = JSON.parse(text);
+    } catch (e) {
+        console.error(`${label} JSON parse error:`, e);
+        throw new Error('Invalid JSON response');
     }
+    console.log(`${label} result:`, result);
+    return result;
 }
 
 async function addToCart(product) {
@@ -219,7 +155,7 @@ async function addToCart(product) {
     }
 
     const cartItem = {
-        product_id: product.id,
+        product_id: String(product.id),
         name: product.name,
         price: parseFloat(product.price),
         image: product.image,
@@ -227,55 +163,10 @@ async function addToCart(product) {
     };
 
     try {
-        console.log('Checking user with /api/me for addToCart');
-        const userResponse = await fetch('/api/me', {
-            credentials: 'include'
-        });
-        console.log('addToCart /api/me status:', userResponse.status);
-        console.log('addToCart /api/me headers:', [...userResponse.headers]);
-        const userText = await userResponse.text();
-        console.log('addToCart /api/me response text:', userText);
-        let userData;
-        try {
-            userData = JSON.parse(userText);
-        } catch (e) {
-            console.error('addToCart JSON parse error:', e);
-            throw new Error('Invalid JSON response');
-        }
-        console.log('addToCart /api/me result:', userData);
-
-        if (!userData.success) {
-            const existingItem = cart.find(item => item.product_id === product.id);
-            if (existingItem) {
-                existingItem.quantity += cartItem.quantity;
-            } else {
-                cart.push(cartItem);
-            }
-            saveCartToSession();
-            updateCartUI();
-            showNotification(`${product.name} added to cart!`, true);
-            return;
-        }
-
-        console.log('Adding to server cart at /api/cart');
-        const response = await fetch('/api/cart', {
+        const result = await sendCartRequest('/api/cart', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            credentials: 'include',
             body: JSON.stringify(cartItem)
-        });
-        console.log('addToCart status:', response.status);
-        console.log('addToCart headers:', [...response.headers]);
-        const text = await response.text();
-        console.log('addToCart response text:', text);
-        let result;
-        try {
-            result = JSON.parse(text);
-        } catch (e) {
-            console.error('addToCart JSON parse error:', e);
-            throw new Error('Invalid JSON response');
-        }
-        console.log('addToCart result:', result);
+        }, 'addToCart');
 
         if (result.success && result.data) {
             cart = result.data;
@@ -289,7 +180,7 @@ async function addToCart(product) {
     } catch (error) {
         console.error('addToCart error:', error.message);
         showNotification('Error syncing with server: ' + error.message, false);
-        const existingItem = cart.find(item => item.product_id === product.id);
+        const existingItem = cart.find(item => item.product_id === cartItem.product_id);
         if (existingItem) {
             existingItem.quantity += cartItem.quantity;
         } else {
@@ -311,58 +202,21 @@ async function updateQuantity(productId, change, isDirect = false) {
     }
 
     item.quantity = newQuantity;
+    saveCartToLocal();
+    updateCartUI();
     try {
-        console.log('Checking user with /api/me for updateQuantity');
-        const userResponse = await fetch('/api/me', {
-            credentials: 'include'
-        });
-        console.log('updateQuantity /api/me status:', userResponse.status);
-        console.log('updateQuantity /api/me headers:', [...userResponse.headers]);
-        const userText = await userResponse.text();
-        console.log('updateQuantity /api/me response text:', userText);
-        let userData;
-        try {
-            userData = JSON.parse(userText);
-        } catch (e) {
-            console.error('updateQuantity JSON parse error:', e);
-            throw new Error('Invalid JSON response');
-        }
-        console.log('updateQuantity /api/me result:', userData);
-
-        if (userData.success) saveCartToLocal();
-        else saveCartToSession();
-
-        updateCartUI();
+        const result = await sendCartRequest(`/api/cart/${productId}`, {
+            method: 'PUT',
+            body: JSON.stringify({ quantity: newQuantity })
+        }, 'updateQuantity');
 
-        if (userData.success) {
-            console.log(`Updating quantity for product ${productId} to ${newQuantity}`);
-            const response = await fetch(`/api/cart/${productId}`, {
-                method: 'PUT',
-                headers: { 'Content-Type': 'application/json' },
-                credentials: 'include',
-                body: JSON.stringify({ quantity: newQuantity })
-            });
-            console.log('updateQuantity status:', response.status);
-            console.log('updateQuantity headers:', [...response.headers]);
-            const text = await response.text();
-            console.log('updateQuantity response text:', text);
-            let result;
-            try {
-                result = JSON.parse(text);
-            } catch (e) {
-                console.error('updateQuantity JSON parse error:', e);
-                throw new Error('Invalid JSON response');
-            }
-            console.log('updateQuantity result:', result);
-
-            if (result.success && result.data) {
-                cart = result.data;
-                saveCartToLocal();
-                updateCartUI();
-            } else {
-                console.error('updateQuantity failed:', result.error || 'No data');
-                showNotification('Error updating quantity: ' + (result.error || 'Unknown error'), false);
-            }
+        if (result.success && result.data) {
+            cart = result.data;
+            saveCartToLocal();
+            updateCartUI();
+        } else {
+            console.error('updateQuantity failed:', result.error || result.detail || 'No data');
+            showNotification('Error updating quantity: ' + (result.error || result.detail || 'Unknown error'), false);
         }
     } catch (error) {
         console.error('updateQuantity error:', error.message);
@@ -372,58 +226,21 @@ async function updateQuantity(productId, change, isDirect = false) {
 
 async function removeFromCart(productId) {
     cart = cart.filter(item => item.product_id !== productId);
+    saveCartToLocal();
+    updateCartUI();
+    showNotification('Item removed from cart', true);
     try {
-        console.log('Checking user with /api/me for removeFromCart');
-        const userResponse = await fetch('/api/me', {
-            credentials: 'include'
-        });
-        console.log('removeFromCart /api/me status:', userResponse.status);
-        console.log('removeFromCart /api/me headers:', [...userResponse.headers]);
-        const userText = await userResponse.text();
-        console.log('removeFromCart /api/me response text:', userText);
-        let userData;
-        try {
-            userData = JSON.parse(userText);
-        } catch (e) {
-            console.error('removeFromCart JSON parse error:', e);
-            throw new Error('Invalid JSON response');
-        }
-        console.log('removeFromCart /api/me result:', userData);
+        const result = await sendCartRequest(`/api/cart/${productId}`, {
+            method: 'DELETE'
+        }, 'removeFromCart');
 
-        if (userData.success) saveCartToLocal();
-        else saveCartToSession();
-
-        updateCartUI();
-        showNotification('Item removed from cart', true);
-
-        if (userData.success) {
-            console.log(`Removing product ${productId} from server cart`);
-            const response = await fetch(`/api/cart/${productId}`, {
-                method: 'DELETE',
-                headers: { 'Content-Type': 'application/json' },
-                credentials: 'include'
-            });
-            console.log('removeFromCart status:', response.status);
-            console.log('removeFromCart headers:', [...response.headers]);
-            const text = await response.text();
-            console.log('removeFromCart response text:', text);
-            let result;
-            try {
-                result = JSON.parse(text);
-            } catch (e) {
-                console.error('removeFromCart JSON parse error:', e);
-                throw new Error('Invalid JSON response');
-            }
-            console.log('removeFromCart result:', result);
-
-            if (result.success && result.data) {
-                cart = result.data;
-                saveCartToLocal();
-                updateCartUI();
-            } else {
-                console.error('removeFromCart failed:', result.error || 'No data');
-                showNotification('Error removing item: ' + (result.error || 'Unknown error'), false);
-            }
+        if (result.success && result.data) {
+            cart = result.data;
+            saveCartToLocal();
+            updateCartUI();
+        } else {
+            console.error('removeFromCart failed:', result.error || result.detail || 'No data');
+            showNotification('Error removing item: ' + (result.error || result.detail || 'Unknown error'), false);
         }
     } catch (error) {
         console.error('removeFromCart error:', error.message);
@@ -431,81 +248,70 @@ async function removeFromCart(productId) {
     }
 }
 
-async function loadNewArrivals() {
-    console.log('Starting loadNewArrivals');
-    try {
-        const response = await fetch('/api/new-arrivals', {
-            method: 'GET',
-            headers: {
-                'Accept': 'application/json'
-            }
-        });
-        console.log('loadNewArrivals status:', response.status);
-        if (!response.ok) {
-            throw new Error(`HTTP error! Status: ${response.status}`);
-        }
-        const text = await response.text();
-        console.log('loadNewArrivals response text:', text);
-        let data;
-        try {
-            data = JSON.parse(text);
-        } catch (e) {
-            console.error('loadNewArrivals JSON parse error:', e);
-            throw new Error('Invalid JSON response');
-        }
-        console.log('loadNewArrivals parsed data:', data);
+function renderNewArrivals(data) {
+    const grid = document.getElementById('new-arrivals-grid');
+    if (!grid) {
+        console.error('New arrivals grid not found');
+        return;
+    }
 
-        const grid = document.getElementById('new-arrivals-grid');
-        if (!grid) {
-            console.error('New arrivals grid not found');
-            return;
-        }
+    console.log('Clearing new-arrivals-grid');
+    grid.innerHTML = '';
 
-        console.log('Clearing new-arrivals-grid');
-        grid.innerHTML = '';
+    if (!Array.isArray(data) || data.length === 0) {
+        console.log('No new arrivals found');
+        grid.innerHTML = '<p class="fs-montserrat">No new arrivals found</p>';
+        return;
+    }
 
-        if (!Array.isArray(data) || data.length === 0) {
-            console.log('No new arrivals found');
-            grid.innerHTML = '<p class="fs-montserrat">No new arrivals found</p>';
+    console.log(`Rendering ${data.length} new arrivals`);
+    data.forEach(product => {
+        if (!product.id || !product.name || !product.price || !product.image) {
+            console.warn('Invalid product data:', product);
             return;
         }
+        const productDiv = document.createElement('div');
+        productDiv.className = 'product-box';
+        productDiv.innerHTML = `
+            <img src="${product.image}" alt="${product.name}" loading="lazy" decoding="async" />
+            <p class="product-name">${product.name}</p>
+            <p class="price">$${parseFloat(product.price).toFixed(2)}</p>
+            <div class="product-details">
+                <button class="add-to-cart" 
+                        data-id="${product.id}" 
+                        data-name="${product.name}" 
+                        data-price="${product.price}" 
+                        data-image="${product.image}">
+                    <i class="uil uil-shopping-cart-alt"></i>
+                </button>
+                <i class="uil uil-heart-alt"></i>
+            </div>
+        `;
+        grid.appendChild(productDiv);
+    });
 
-        console.log(`Rendering ${data.length} new arrivals`);
-        data.forEach(product => {
-            if (!product.id || !product.name || !product.price || !product.image) {
-                console.warn('Invalid product data:', product);
-                return;
-            }
-            const productDiv = document.createElement('div');
-            productDiv.className = 'product-box';
-            productDiv.innerHTML = `
-                <img src="${product.image}" alt="${product.name}" loading="lazy" decoding="async" />
-                <p class="product-name">${product.name}</p>
-                <p class="price">$${parseFloat(product.price).toFixed(2)}</p>
-                <div class="product-details">
-                    <button class="add-to-cart" 
-                            data-id="${product.id}" 
-                            data-name="${product.name}" 
-                            data-price="${product.price}" 
-                            data-image="${product.image}">
-                        <i class="uil uil-shopping-cart-alt"></i>
-                    </button>
-                    <i class="uil uil-heart-alt"></i>
-                </div>
-            `;
-            grid.appendChild(productDiv);
-        });
+    console.log('Attaching event listeners to add-to-cart buttons');
+    attachAddToCartListeners();
+}
 
-        console.log('Attaching event listeners to add-to-cart buttons');
-        attachAddToCartListeners();
-    } catch (error) {
-        console.error('loadNewArrivals error:', error.message);
-        showNotification('Failed to load new arrivals: ' + error.message, false);
-        const grid = document.getElementById('new-arrivals-grid');
-        if (grid) {
-            grid.innerHTML = '<p class="fs-montserrat">Failed to load new arrivals</p>';
-        }
-    }
+// Делаем карточку кликабельной — открывает детальную страницу
+function enhanceProductCard(productDiv) {
+    productDiv.style.cursor = 'pointer';
+    productDiv.style.transition = 'transform 0.2s ease, box-shadow 0.2s ease';
+    productDiv.addEventListener('mouseenter', () => {
+      productDiv.style.transform = 'translateY(-4px)';
+      productDiv.style.boxShadow = '0 8px 20px rgba(0,0,0,0.1)';
+    }, { passive: true });
+    productDiv.addEventListener('mouseleave', () => {
+      productDiv.style.transform = 'translateY(0)';
+      productDiv.style.boxShadow = '0 4px 8px rgba(0,0,0,0.05)';
+    }, { passive: true });
+    productDiv.addEventListener('click', (e) => {
+      // Проверяем, не кликнули ли на кнопку "Add to Cart" (чтобы не мешать)
+      if (!e.target.closest('.add-to-cart')) {
+        window.location.href = `product.html?id=${productDiv.dataset.id}`;
+      }
+    });
 }
 
 async function loadProducts(page = 1, sort = 'default', query = null) {
@@ -563,24 +369,7 @@ async function loadProducts(page = 1, sort = 'default', query = null) {
                     ${product.category && ['Earphone', 'Gaming'].includes(product.category) ? '<div class="pup-up"><p class="fs-poppins">Sell</p></div>' : ''}
                 `;
 
-                // Делаем карточку кликабельной — открывает детальную страницу
-                productDiv.style.cursor = 'pointer';
-                productDiv.style.transition = 'transform 0.2s ease, box-shadow 0.2s ease';
-                productDiv.addEventListener('mouseenter', () => {
-                  productDiv.style.transform = 'translateY(-4px)';
-                  productDiv.style.boxShadow = '0 8px 20px rgba(0,0,0,0.1)';
-                }, { passive: true });
-                productDiv.addEventListener('mouseleave', () => {
-                  productDiv.style.transform = 'translateY(0)';
-                  productDiv.style.boxShadow = '0 4px 8px rgba(0,0,0,0.05)';
-                }, { passive: true });
-                productDiv.addEventListener('click', (e) => {
-                  // Проверяем, не кликнули ли на кнопку "Add to Cart" (чтобы не мешать)
-                  if (!e.target.closest('.add-to-cart')) {
-                    window.location.href = `product.html?id=${product.id}`;
-                  }
-                });
-
+                enhanceProductCard(productDiv);
                 if (productContainer) productContainer.appendChild(productDiv);
             });
 
@@ -664,7 +453,7 @@ function handleAddToCart(event) {
     addToCart(product);
 }
 
-function updateAuthState() {
+function applyAuthState(user) {
     const authButtons = document.getElementById('auth-buttons');
     const userProfile = document.getElementById('user-profile');
     const userInitial = document.getElementById('user-initial');
@@ -674,60 +463,45 @@ function updateAuthState() {
         return;
     }
 
-    console.log('Cookies in updateAuthState:', document.cookie);
-
-    console.log('Fetching user data from /api/me for auth state');
-    fetch('/api/me', {
-        method: 'GET',
-        credentials: 'include'
-    })
-    .then(response => {
-        console.log('updateAuthState /api/me status:', response.status);
-        console.log('updateAuthState /api/me headers:', [...response.headers]);
-        return response.text().then(text => ({ text, response }));
-    })
-    .then(({ text, response }) => {
-        console.log('updateAuthState /api/me response text:', text);
-        let data;
-        try {
-            data = JSON.parse(text);
-        } catch (e) {
-            console.error('updateAuthState JSON parse error:', e);
-            throw new Error('Invalid JSON response');
-        }
-        console.log('updateAuthState /api/me result:', data);
-        if (data.success && data.user && data.user.username) {
-            console.log('User authenticated, updating UI');
-            authButtons.style.display = 'none';
-            userProfile.style.display = 'flex';
-            userInitial.textContent = data.user.username.charAt(0).toUpperCase();
-            localStorage.setItem('username', data.user.username);
-            loadCart();
-        } else {
-            console.log('User not authenticated, resetting UI');
-            authButtons.style.display = 'flex';
-            userProfile.style.display = 'none';
-            userInitial.textContent = '';
-            localStorage.removeItem('username');
-            cart = loadCartFromSession();
-            updateCartUI();
-        }
-        console.log('Current display state:', {
-            authButtons: authButtons.style.display,
-            userProfile: userProfile.style.display,
-            userInitial: userInitial.textContent
-        });
-    })
-    .catch(error => {
-        console.error('updateAuthState error:', error.message);
-        showNotification('Error checking auth state: ' + error.message, false);
+    if (user && user.username) {
+        authButtons.style.display = 'none';
+        userProfile.style.display = 'flex';
+        userInitial.textContent = user.username.charAt(0).toUpperCase();
+        localStorage.setItem('username', user.username);
+    } else {
         authButtons.style.display = 'flex';
         userProfile.style.display = 'none';
         userInitial.textContent = '';
         localStorage.removeItem('username');
-        cart = loadCartFromSession();
+    }
+}
+
+// Пользователь, корзина и новинки приходят одним запросом /api/session
+async function loadSession() {
+    try {
+        const response = await fetch('/api/session', {
+            credentials: 'include',
+            headers: { 'Accept': 'application/json' }
+        });
+        console.log('loadSession status:', response.status);
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        const data = await response.json();
+        applyAuthState(data.user);
+        cart = data.cart.items;
+        saveCartToLocal();
         updateCartUI();
-    });
+        if (document.getElementById('new-arrivals-grid')) {
+            renderNewArrivals(data.new_arrivals);
+        }
+    } catch (error) {
+        console.error('loadSession error:', error.message);
+        showNotification('Error loading session: ' + error.message, false);
+        applyAuthState(null);
+        cart = loadCartFromLocal();
+        updateCartUI();
+    }
 }
 
 function validateSignupForm(formData) {
@@ -755,6 +529,39 @@ function validateSignupForm(formData) {
     return true;
 }
 
+// Подсказки поиска: /api/products/suggest отвечает из памяти и кэшируется браузером
+const suggestionLabels = new Map();
+
+async function loadSuggestions(query, datalist) {
+    if (!datalist) return;
+    if (!query) {
+        datalist.innerHTML = '';
+        suggestionLabels.clear();
+        return;
+    }
+    try {
+        const response = await fetch(`/api/products/suggest?q=${encodeURIComponent(query)}`);
+        if (!response.ok) return;
+        const { data } = await response.json();
+        datalist.innerHTML = '';
+        suggestionLabels.clear();
+        const options = [
+            ...data.categories.map(c => [c.name, `${c.name} (${c.count})`]),
+            ...data.products.map(p => [p.name, `$${Number(p.price).toFixed(2)}`]),
+        ];
+        for (const [value, label] of options) {
+            if (suggestionLabels.has(value)) continue;
+            suggestionLabels.set(value, label);
+            const option = document.createElement('option');
+            option.value = value;
+            option.label = label;
+            datalist.appendChild(option);
+        }
+    } catch (e) {
+        console.error('loadSuggestions error:', e);
+    }
+}
+
 function debounce(func, wait) {
     let timeout;
     return function executedFunction(...args) {
@@ -829,7 +636,7 @@ document.addEventListener('DOMContentLoaded', () => {
             console.log('Cart toggle clicked');
             if (cartContainer) cartContainer.classList.add('open');
             if (cartOverlay) cartOverlay.classList.add('visible');
-            loadCart();
+            updateCartUI();
         });
     } else {
         console.error('Cart toggle not found');
@@ -906,7 +713,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (result.success) {
                     console.log('Login successful, setting username and updating auth state');
                     localStorage.setItem('username', result.username);
-                    updateAuthState();
+                    // Сервер уже перенёс гостевую корзину в корзину пользователя
+                    loadSession();
                     closeAll();
                     showNotification('Login successful!', true);
                     loginForm.reset();
@@ -953,7 +761,7 @@ if (signupForm) {
             if (response.ok && result.success) {
                 console.log('Signup successful, setting username and updating auth state');
                 localStorage.setItem('username', result.username);
-                updateAuthState();
+                loadSession();
                 closeAll();
                 showNotification(result.message || 'Registration successful! You can now log in.', true);
                 signupForm.reset();
@@ -1022,7 +830,8 @@ if (signupForm) {
             localStorage.removeItem('cart');
             sessionStorage.removeItem('cart');
             cart = [];
-            updateAuthState();
+            applyAuthState(null);
+            updateCartUI();
             showNotification('Logged out! Cart cleared.', true);
             fetch('/admin/logout', {
                 method: 'GET',
@@ -1053,9 +862,18 @@ if (signupForm) {
             loadProducts(currentPage, sortSelect ? sortSelect.value : 'default', currentSearchQuery);
         }, 300);
 
+        const suggestionList = document.getElementById('search-suggestions');
+        const debouncedSuggest = debounce((query) => loadSuggestions(query, suggestionList), 120);
+
         if (searchInput) {
+            // Пока пользователь печатает — только подсказки; список товаров — по Enter,
+            // кнопке, выбору подсказки или очистке поля
             searchInput.addEventListener('input', (e) => {
-                debouncedSearch(e.target.value.trim());
+                const query = e.target.value.trim();
+                if (!query || suggestionLabels.has(query)) {
+                    debouncedSearch(query);
+                }
+                debouncedSuggest(query);
             });
             searchInput.addEventListener('keypress', (event) => {
                 if (event.key === 'Enter') {
@@ -1083,12 +901,18 @@ if (signupForm) {
             console.error('Sort select not found');
         }
 
-        loadProducts(currentPage, sortSelect ? sortSelect.value : 'default', currentSearchQuery);
+        if (productContainer.dataset.ssrPage) {
+            // Первая страница уже отрисована сервером (/shop), повторный запрос не нужен
+            currentPage = parseInt(productContainer.dataset.ssrPage, 10);
+            if (sortSelect) sortSelect.value = productContainer.dataset.ssrSort;
+            productContainer.querySelectorAll('.product-list').forEach(enhanceProductCard);
+            attachAddToCartListeners();
+        } else {
+            loadProducts(currentPage, sortSelect ? sortSelect.value : 'default', currentSearchQuery);
+        }
     } else {
         console.error('Product container not found');
     }
 
-    updateAuthState();
-    loadNewArrivals();
-    loadCart();
+    loadSession();
 });
\ No newline at end of file
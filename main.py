@@ -1,25 +1,64 @@
-from fastapi import FastAPI, Request, HTTPException, Depends, Form, status, File, UploadFile, Query
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi import FastAPI, Request, Response, HTTPException, Depends, Form, status, File, UploadFile, Query
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
-from datetime import datetime, timedelta
+from pydantic import BaseModel, EmailStr, Field
+from datetime import date, datetime, timedelta
 from typing import List, Optional
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from urllib.parse import urlencode
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
+import math
 import os
-import requests
+import time
 from dotenv import load_dotenv
 from jose import JWTError, jwt
 from auth import router as auth_router
-from database import User, CartItem, Product, get_db, pwd_context, PasswordReset
+from auth_tokens import (
+    ACCESS_COOKIE,
+    REFRESH_COOKIE,
+    InvalidRefreshToken,
+    access_token_valid,
+    clear_session_cookies,
+    create_access_token,
+    issue_refresh_token,
+    refresh_session,
+    revoke_refresh_token,
+    revoke_user_tokens,
+    set_session_cookies,
+)
+from database import (
+    DATABASE_REPLICA_URLS, REPLICA_MAX_LAG, User, Product, get_db,
+    pwd_context, PasswordReset, CollectionItem, read_session,
+)
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, asc
 import logging
-from werkzeug.utils import secure_filename
 from database import Order, OrderItem
+from orders import fetch_order_page
+import catalog
+import featured
+import suggest
+from fastjson import FastJSONResponse, json_response, raw_json_response
+from facets import facet_index
+from related import RELATED_PRODUCTS_LIMIT, related_index
+from recommender import recommender
+from inventory import InvalidQuantity, OutOfStock, mark_reserved, order_lines, reclaim, release, reserve
+from cart_store import get_cart_store
+from guest_cart import hydrate as hydrate_guest_cart, read_guest_cart, write_guest_cart
+from analytics import sales_summary
+from breakers import BREAKERS, IntegrationUnavailable, prometheus_metrics
+from payments import (
+    create_paypal_checkout,
+    is_paypal_webhook,
+    store_webhook_event,
+    verify_webhook_signature,
+)
+from jobs import enqueue, start_embedded_worker
+from subscribers import add_subscriber, status_counts as subscriber_counts
+from ratelimit import RATE_LIMIT_BACKEND, RATE_LIMIT_ENABLED, bcrypt_slots, rate_limit, run_bcrypt
+import tasks  # noqa: F401  регистрирует фоновые задачи
 
 
 # Настройка логирования
@@ -29,44 +68,52 @@ logger = logging.getLogger(__name__)
 # Загрузка переменных окружения
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        logger.info(f"API Key: {GETRESPONSE_API_KEY}")
+        logger.info(f"List ID: {GETRESPONSE_LIST_ID}")
+        logger.info(f"From Field ID: {GETRESPONSE_FROM_FIELD_ID}")
+        if not all([GETRESPONSE_API_KEY, GETRESPONSE_LIST_ID, GETRESPONSE_FROM_FIELD_ID]):
+            raise ValueError("Одна или несколько переменных окружения GetResponse отсутствуют")
+        
+        # Проверка SMTP
+        if not ADMIN_EMAIL or not ADMIN_PASSWORD:
+            logger.warning("SMTP credentials not configured - email sending may fail")
+        
+        logger.info(f"Rate limiting: enabled={RATE_LIMIT_ENABLED}, backend={RATE_LIMIT_BACKEND}")
+
+        # Схему и админа создаёт `python bootstrap.py` один раз на деплой;
+        # для локальной разработки можно включить BOOTSTRAP_ON_STARTUP=true
+        if os.getenv("BOOTSTRAP_ON_STARTUP", "false").lower() == "true":
+            from bootstrap import run_bootstrap
+            await asyncio.to_thread(run_bootstrap)
+
+        # Фоновые задачи (письма, GetResponse, сверка PayPal, очистка).
+        # При отдельном `python worker.py` выставьте RUN_EMBEDDED_WORKER=false
+        worker = None
+        if os.getenv("RUN_EMBEDDED_WORKER", "true").lower() == "true":
+            worker = start_embedded_worker()
+        
+    except Exception as e:
+        logger.error(f"Ошибка при старте: {e}")
+        raise
+    yield
+    if worker:
+        worker.stop()
+
+# Ответы кодирует orjson; горячие маршруты отдают готовые байты (fastjson.py)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # JWT настройки
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-PAYPAL_CLIENT_ID = os.getenv("PAYPAL_CLIENT_ID")
-PAYPAL_SECRET = os.getenv("PAYPAL_SECRET")
-PAYPAL_MODE = os.getenv("PAYPAL_MODE", "sandbox")
 ADMIN_EMAIL = os.getenv("SMTP_FROM", os.getenv("SMTP_USERNAME", ""))
 ADMIN_PASSWORD = os.getenv("SMTP_PASSWORD", "")
-
-def get_paypal_base_url():
-    """Возвращает базовый URL для PayPal в зависимости от режима"""
-    if PAYPAL_MODE == "sandbox":
-        return "https://api-m.sandbox.paypal.com"
-    else:
-        return "https://api-m.paypal.com"
-
-def get_paypal_access_token():
-    base_url = get_paypal_base_url()
-    url = f"{base_url}/v1/oauth2/token"
-    headers = {"Accept": "application/json", "Accept-Language": "en_US"}
-    data = {"grant_type": "client_credentials"}
-    auth = (PAYPAL_CLIENT_ID, PAYPAL_SECRET)
-    logger.info(f"Requesting PayPal token from: {url}")
-    try:
-        response = requests.post(url, headers=headers, data=data, auth=auth, timeout=10)
-        if response.status_code == 200:
-            token = response.json()["access_token"]
-            logger.info("PayPal token acquired successfully")
-            return token
-        else:
-            logger.error(f"PayPal token error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=500, detail="Ошибка аутентификации PayPal")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"PayPal request error: {e}")
-        raise HTTPException(status_code=500, detail="Ошибка соединения с PayPal")
+# Bearer-токен для /metrics; пусто — без проверки (закрыт на уровне сети)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Публичный адрес магазина (ссылки в письмах и return_url PayPal)
+BASE_URL = os.getenv("BASE_URL", "https://fastestore.onrender.com").rstrip("/")
 
 # Подключение роутера auth
 app.include_router(auth_router)
@@ -80,6 +127,67 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Статика и выход не продлевают сессию
+NO_REFRESH_PREFIXES = ("/css/", "/js/", "/image/", "/static/", "/favicon.ico", "/admin/logout")
+
+@app.middleware("http")
+async def sliding_session(request: Request, call_next):
+    """Истёкший access_token заменяется по refresh_token до обработки запроса"""
+    refresh_token = request.cookies.get(REFRESH_COOKIE)
+    if (not refresh_token or request.url.path.startswith(NO_REFRESH_PREFIXES)
+            or access_token_valid(request.cookies.get(ACCESS_COOKIE))):
+        return await call_next(request)
+    try:
+        session = await asyncio.to_thread(refresh_session, refresh_token)
+    except InvalidRefreshToken as e:
+        logger.warning(f"Refresh rejected: {e}")
+        response = await call_next(request)
+        clear_session_cookies(response)
+        return response
+
+    # Обработчик запроса увидит уже новый access_token
+    cookies = {**request.cookies, ACCESS_COOKIE: session["access_token"]}
+    headers = [(k, v) for k, v in request.scope["headers"] if k != b"cookie"]
+    headers.append((b"cookie", "; ".join(f"{k}={v}" for k, v in cookies.items()).encode("latin-1")))
+    request.scope["headers"] = headers
+    response = await call_next(request)
+    set_session_cookies(response, session["is_admin"], session["access_token"], session["refresh_token"])
+    logger.info(f"Session refreshed for {session['username']}")
+    return response
+
+# Read-your-writes: после успешной записи браузер REPLICA_MAX_LAG секунд читает из основной БД
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+READ_PIN_COOKIE = "read_primary_until"
+
+
+def reads_pinned(cookie_value: str) -> bool:
+    """Cookie READ_PIN_COOKIE ставит read_your_writes; в ней время окончания"""
+    try:
+        return float(cookie_value) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+
+def get_read_db(request: Request):
+    """Зависимость для маршрутов, которые только читают (каталог, корзина)"""
+    db = read_session(primary=reads_pinned(request.cookies.get(READ_PIN_COOKIE)))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+if DATABASE_REPLICA_URLS:
+    @app.middleware("http")
+    async def read_your_writes(request: Request, call_next):
+        response = await call_next(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                READ_PIN_COOKIE, f"{time.time() + REPLICA_MAX_LAG:.3f}", max_age=math.ceil(REPLICA_MAX_LAG),
+                httponly=True, samesite="lax", secure=request.url.scheme == "https", path="/",
+            )
+        return response
+
 # Подключение статических файлов
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 app.mount("/css", StaticFiles(directory=os.path.join(BASE_DIR, "css")), name="css")
@@ -104,25 +212,15 @@ ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.on_event("startup")
-async def startup():
-    try:
-        logger.info(f"API Key: {GETRESPONSE_API_KEY}")
-        logger.info(f"List ID: {GETRESPONSE_LIST_ID}")
-        logger.info(f"From Field ID: {GETRESPONSE_FROM_FIELD_ID}")
-        if not all([GETRESPONSE_API_KEY, GETRESPONSE_LIST_ID, GETRESPONSE_FROM_FIELD_ID]):
-            raise ValueError("Одна или несколько переменных окружения GetResponse отсутствуют")
-        
-        # Проверка SMTP
-        if not ADMIN_EMAIL or not ADMIN_PASSWORD:
-            logger.warning("SMTP credentials not configured - email sending may fail")
-        
-        # Rate limiting отключён (Redis не используется)
-        logger.info("Rate limiting отключён")
-        
-    except Exception as e:
-        logger.error(f"Ошибка при старте: {e}")
-        raise
+def parse_stock(value: Optional[str]) -> Optional[int]:
+    """Остаток из формы админки: пусто — не ограничен"""
+    if value is None or not value.strip():
+        return None
+    stock = int(value)
+    if stock < 0:
+        raise ValueError("остаток не может быть отрицательным")
+    return stock
+
 # Модели
 class ContactForm(BaseModel):
     email: str
@@ -147,7 +245,7 @@ class CartItemBase(BaseModel):
         from_attributes = True
 
 class CartItemCreate(CartItemBase):
-    pass
+    quantity: int = Field(ge=1)
 
 class CartItemUpdate(BaseModel):
     quantity: int
@@ -174,11 +272,45 @@ class ProductsResponse(BaseModel):
     total: int
     page: int
     limit: int
+    facets: dict | None = None
 
 class ProductResponse(BaseModel): 
     success: bool
     data: ProductBase  # Для одного продукта
 
+class OrderItemOut(BaseModel):
+    product_id: str
+    name: str
+    price: float
+    image: str | None = None
+    quantity: int
+
+    class Config:
+        from_attributes = True
+
+class OrderOut(BaseModel):
+    id: int
+    total: float
+    status: str
+    created_at: datetime
+    order_items: List[OrderItemOut] = []
+
+    class Config:
+        from_attributes = True
+
+class OrdersResponse(BaseModel):
+    success: bool
+    data: List[OrderOut]
+    next_cursor: str | None = None
+
+class CollectionForm(BaseModel):
+    title: str
+    rule: str = "manual"
+    rule_value: str | None = None
+    max_items: int = 12
+    position: int = 0
+    product_ids: List[int] = []
+
 class UserInfo(BaseModel):
     username: str
     is_admin: bool
@@ -226,50 +358,155 @@ async def get_current_admin(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Доступ запрещен: только для админов")
     return current_user
 
-# Функция для отправки email (общая для contact и forgot)
-def send_email(to_email: str, subject: str, body: str, from_email: str = None):
-    from_email = from_email or ADMIN_EMAIL
-    if not from_email or not ADMIN_PASSWORD:
-        raise HTTPException(status_code=500, detail="SMTP credentials not configured")
-    
-    logger.info(f"Attempting SMTP connection: email={from_email}")
-    msg = MIMEMultipart()
-    msg['From'] = from_email
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain', 'utf-8'))
-    
-    server = smtplib.SMTP('smtp.yandex.ru', 587)
-    server.set_debuglevel(1)
-    logger.info("Connecting to smtp.yandex.ru:587...")
-    server.starttls()
-    logger.info("TLS activated")
-    server.login(from_email, ADMIN_PASSWORD)
-    logger.info("SMTP authentication successful")
-    text = msg.as_string()
-    server.sendmail(from_email, to_email, text)
-    logger.info("Email sent successfully")
-    server.quit()
-
 # Маршруты
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request, current_user: Optional[User] = Depends(get_current_user_optional)):
     logger.info(f"Request to /: cookies={request.cookies}")
     return templates.TemplateResponse("index.html", {"request": request, "user": current_user})
 
+SHOP_SSR = os.getenv("SHOP_SSR", "true").lower() == "true"
+SHOP_PAGE_SIZE = 9  # Совпадает с limit в shopo.js
+SSR_SLOT = "@@ssr-slot@@"
+
+
+def shop_page_count(category: Optional[str]) -> Optional[int]:
+    """Число страниц каталога по индексу фасетов; None — такой категории нет"""
+    db = read_session()
+    try:
+        index = facet_index(db)
+    finally:
+        db.close()
+    total = index.category_counts.get(category) if category else len(index.categories)
+    return None if total is None else -(-total // SHOP_PAGE_SIZE)
+
+
+def render_shop_fragments(page: int, sort: str, category: Optional[str], cache: bool = True):
+    """HTML первой страницы каталога: (счётчик, карточки, пагинация), кэшируется по (category, sort, page).
+    Ключей не больше, чем существующих категорий × сортировок × страниц: page уже ограничен, а
+    неизвестные категории (cache=False) рендерятся без кэша"""
+    def load():
+        db = read_session()
+        try:
+            products, total = catalog.product_page(db, page, SHOP_PAGE_SIZE, sort, category)
+        finally:
+            db.close()
+        pages = -(-total // SHOP_PAGE_SIZE)
+
+        def link(i):
+            params = {"page": i, "sort": sort}
+            if category:
+                params["category"] = category
+            return f"/shop?{urlencode(params)}"
+
+        macros = templates.get_template("shop_products.html").module
+        start = (page - 1) * SHOP_PAGE_SIZE + 1
+        return (
+            str(macros.results(start, min(page * SHOP_PAGE_SIZE, total), total)),
+            str(macros.cards(products)),
+            str(macros.pagination(page, pages, link)),
+        )
+
+    if not cache:
+        return load()
+    return catalog.cached(f"shop:{category or ''}:{sort}:{page}", load)
+
+
 @app.get("/shop", response_class=HTMLResponse)
-async def shop(request: Request, current_user: Optional[User] = Depends(get_current_user_optional)):
-    logger.info(f"Request to /shop: cookies={request.cookies}")
-    return templates.TemplateResponse("shop.html", {"request": request, "user": current_user})
+async def shop(
+    request: Request,
+    page: int = Query(1, ge=1),
+    sort: str = "default",
+    category: Optional[str] = None,
+    search: Optional[str] = None
+):
+    # Поиск остаётся на клиенте: его результаты не кэшируются
+    if not SHOP_SSR or search:
+        return templates.TemplateResponse("shop.html", {"request": request, "ssr": None})
+    if sort not in catalog.PRODUCT_SORTS:
+        sort = "default"
+    # Страница за последней показывает последнюю, а не пустую сетку
+    pages = await asyncio.to_thread(shop_page_count, category)
+    page = min(page, max(1, pages or 0))
+
+    shell = templates.get_template("shop.html").render(
+        {"request": request, "ssr": {"page": page, "sort": sort}, "slot": SSR_SLOT}
+    )
+    head, after_results, after_cards, tail = shell.split(SSR_SLOT)
+
+    async def stream():
+        # Шапка уходит клиенту до запроса к БД; фрагменты обычно берутся из кэша
+        yield head
+        results, cards, pagination = await asyncio.to_thread(render_shop_fragments, page, sort, category, pages is not None)
+        yield results + after_results + cards + after_cards + pagination + tail
 
-@app.get("/api/me", response_model=dict)
-async def get_me(request: Request, db: Session = Depends(get_db)):
-    logger.info(f"Request to /api/me: cookies={request.cookies}")
+    return StreamingResponse(stream(), media_type="text/html")
+
+# /api/me объявлен в auth.py; здесь — сводный ответ для загрузки страницы
+@app.get("/api/session")
+async def get_session(request: Request, current_user: Optional[User] = Depends(get_current_user_optional), db: Session = Depends(get_read_db)):
+    """Пользователь, корзина и новинки одним ответом вместо /api/me + /api/cart + /api/new-arrivals"""
     try:
-        user = await get_current_user(request, db)
-        return {"success": True, "user": {"username": user.username, "is_admin": user.is_admin}}
-    except HTTPException:
-        return {"success": False, "user": None}
+        items = load_cart_items(request, db, current_user)
+        payload = {
+            "success": True,
+            "user": {"username": current_user.username, "is_admin": current_user.is_admin} if current_user else None,
+            "cart": {
+                "count": sum(item["quantity"] for item in items),
+                "total": round(sum(item["price"] * item["quantity"] for item in items), 2),
+                "items": items,
+            },
+            "new_arrivals": featured.new_arrivals(db),
+        }
+    except Exception as e:
+        logger.error(f"Error in get_session: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка загрузки сессии: {str(e)}")
+
+    body, etag = catalog.encode_payload(payload)
+    # Ответ личный: браузер хранит его, но перепроверяет через If-None-Match
+    return etag_response(request, body, etag, {"Cache-Control": "private, no-cache", "Vary": "Cookie"})
+
+
+def etag_response(request: Request, body: bytes, etag: str, headers: dict) -> Response:
+    """JSON-ответ с ETag; 304 без тела, если у клиента та же версия"""
+    headers = {"ETag": etag, **headers}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Подборки отдаются из памяти; после правок в админке меняется ETag
+PUBLIC_REVALIDATE = {"Cache-Control": "public, no-cache"}
+
+@app.get("/api/collections")
+async def get_collections(request: Request, db: Session = Depends(get_read_db)):
+    snapshot = featured.snapshot(db)
+    return etag_response(request, snapshot.index_body, snapshot.index_etag, PUBLIC_REVALIDATE)
+
+@app.get("/api/collections/{slug}")
+async def get_collection(slug: str, request: Request, db: Session = Depends(get_read_db)):
+    encoded = featured.snapshot(db).bodies.get(slug)
+    if not encoded:
+        raise HTTPException(status_code=404, detail="Подборка не найдена")
+    return etag_response(request, *encoded, PUBLIC_REVALIDATE)
+
+# Интеграция отключена предохранителем — быстрый 503 вместо ожидания таймаута
+@app.exception_handler(IntegrationUnavailable)
+async def integration_unavailable_handler(request: Request, exc: IntegrationUnavailable):
+    logger.warning(f"{request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "error": f"Сервис {exc.name} временно недоступен, попробуйте позже"},
+        headers={"Retry-After": str(max(1, int(exc.retry_after)))},
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Недействительный токен")
+    return Response(content=prometheus_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/admin/integrations", response_model=dict)
+async def admin_integrations(current_admin: User = Depends(get_current_admin), db: Session = Depends(get_db)):
+    return {"success": True, "data": [b.snapshot() for b in BREAKERS.values()], "subscribers": subscriber_counts(db)}
 
 @app.exception_handler(422)
 async def validation_exception_handler(request, exc):
@@ -279,8 +516,10 @@ async def validation_exception_handler(request, exc):
         content={"detail": exc.errors()}
     )
 
-@app.post("/contact")
-async def contact_submit(form_data: ContactForm):
+@app.post("/contact", dependencies=[Depends(rate_limit("contact", 5, 600))])
+async def contact_submit(form_data: ContactForm, db: Session = Depends(get_db)):
+    if not ADMIN_EMAIL or not ADMIN_PASSWORD:
+        raise HTTPException(status_code=500, detail="SMTP credentials not configured")
     try:
         subject = "Новое сообщение с формы контактов"
         body = f"""
@@ -292,72 +531,32 @@ async def contact_submit(form_data: ContactForm):
 
         Время: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         """
-        send_email(ADMIN_EMAIL, subject, body)
+        # Письмо отправит воркер (tasks.send_email)
+        enqueue(db, "send_email", {"to_email": ADMIN_EMAIL, "subject": subject, "body": body})
         return {"success": True, "message": "Сообщение отправлено успешно"}
-    except smtplib.SMTPAuthenticationError as e:
-        logger.error(f"SMTP authentication error: {e}")
-        raise HTTPException(status_code=500, detail=f"Ошибка аутентификации: неверный email или пароль")
     except Exception as e:
-        logger.error(f"Error sending email: {e}")
+        logger.error(f"Error queueing email: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка при отправке сообщения: {str(e)}")
 
-@app.post("/subscribe")
-async def subscribe(form_data: SubscribeForm):
+@app.post("/subscribe", dependencies=[Depends(rate_limit("subscribe", 5, 600))])
+async def subscribe(form_data: SubscribeForm, db: Session = Depends(get_db)):
     try:
-        url = "https://api.getresponse.com/v3/contacts"
-        headers = {
-            "X-Auth-Token": f"api-key {GETRESPONSE_API_KEY}",
-            "Client-Id": "eStoreApp",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "name": form_data.email.split('@')[0],
-            "email": form_data.email,
-            "campaign": {"campaignId": GETRESPONSE_LIST_ID},
-            "dayOfCycle": 0
-        }
-        logger.info(f"Sending to GetResponse: {data}")
-        response = requests.post(url, headers=headers, json=data, timeout=10)
-        logger.info(f"GetResponse response: status={response.status_code}, body={response.text}")
-        if response.status_code == 200 or response.status_code == 202:
-            return {"success": True, "message": "Подписка создана! Проверьте email для подтверждения."}
-        elif response.status_code == 429:
-            logger.error("GetResponse rate limit exceeded")
-            raise HTTPException(status_code=429, detail="Слишком много запросов, попробуйте позже")
-        elif response.status_code == 409:
-            return {"success": True, "message": "Этот email уже подписан."}
-        else:
-            try:
-                error_msg = response.json().get("message", f"Неизвестная ошибка (статус {response.status_code})")
-            except ValueError:
-                error_msg = f"Невалидный или пустой ответ от GetResponse: {response.text or 'пусто'}"
-            logger.error(f"GetResponse error: {error_msg}")
-            raise HTTPException(status_code=response.status_code, detail=f"Ошибка подписки: {error_msg}")
-    except requests.exceptions.Timeout:
-        logger.error("Timeout connecting to GetResponse")
-        raise HTTPException(status_code=504, detail="Таймаут соединения с GetResponse, попробуйте позже")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error connecting to GetResponse API: {e}")
-        raise HTTPException(status_code=500, detail=f"Ошибка соединения с GetResponse: {str(e)}")
+        # Только запись в subscribers; в GetResponse контакт отправит tasks.sync_subscribers
+        add_subscriber(db, form_data.email, GETRESPONSE_LIST_ID)
+        return {"success": True, "message": "Подписка создана! Проверьте email для подтверждения."}
     except Exception as e:
         logger.error(f"General error: {e}")
         raise HTTPException(status_code=500, detail=f"Попробуйте позже: {str(e)}")
 
 @app.post("/send-newsletter")
-async def send_newsletter(form_data: NewsletterForm):
+async def send_newsletter(form_data: NewsletterForm, db: Session = Depends(get_db)):
     try:
-        url = "https://api.getresponse.com/v3/newsletters"
-        headers = {
-            "X-Auth-Token": f"api-key {GETRESPONSE_API_KEY}",
-            "Client-Id": "eStoreApp",
-            "Content-Type": "application/json"
-        }
         html_content = f"""
         <html>
             <body>
                 <h2>{form_data.subject}</h2>
                 <p>{form_data.content}</p>
-                <p><a href="https://fastestore.onrender.com">Посетите наш магазин</a></p>
+                <p><a href="{BASE_URL}">Посетите наш магазин</a></p>
                 <p><small>Отписаться: {{unsubscribe}}</small></p>
             </body>
         </html>
@@ -380,34 +579,30 @@ async def send_newsletter(form_data: NewsletterForm):
                 "perfectTiming": "no"
             }
         }
-        logger.info(f"Sending newsletter: {newsletter_data}")
-        response = requests.post(url, headers=headers, json=newsletter_data)
-        logger.info(f"Newsletter response: status={response.status_code}, body={response.text}")
-        if response.status_code == 201:
-            return {"success": True, "message": "Рассылка успешно отправлена!"}
-        else:
-            try:
-                error_msg = response.json().get("message", "Неизвестная ошибка")
-            except ValueError:
-                error_msg = f"Невалидный ответ от GetResponse: {response.text}"
-            logger.error(f"Newsletter error: {error_msg}")
-            raise HTTPException(status_code=400, detail=f"Ошибка при отправке рассылки: {error_msg}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error connecting to GetResponse API: {e}")
-        raise HTTPException(status_code=500, detail=f"Ошибка соединения с GetResponse: {str(e)}")
+        enqueue(db, "send_newsletter", {"newsletter_data": newsletter_data})
+        return {"success": True, "message": "Рассылка поставлена в очередь на отправку"}
     except Exception as e:
         logger.error(f"General error: {e}")
         raise HTTPException(status_code=500, detail=f"Попробуйте позже: {str(e)}")
 
 @app.post("/webhook")
-async def handle_webhook(request: Request):
+async def handle_webhook(request: Request, db: Session = Depends(get_db)):
     try:
         payload = await request.json()
         logger.info(f"Received webhook: {payload}")
+        if is_paypal_webhook(request.headers):
+            # Только проверяем и сохраняем — заказ обновит фоновая сверка
+            if not await asyncio.to_thread(verify_webhook_signature, request.headers, payload):
+                raise HTTPException(status_code=400, detail="Неверная подпись вебхука")
+            if not store_webhook_event(db, payload):
+                logger.info(f"Duplicate PayPal event ignored: {payload.get('id')}")
+            return {"success": True}
         event_type = payload.get("type")
         if event_type == "subscription":
             logger.info("Subscription confirmed!")
         return {"success": True}
+    except (HTTPException, IntegrationUnavailable):
+        raise
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         raise HTTPException(status_code=500, detail="Ошибка обработки вебхука")
@@ -419,58 +614,51 @@ async def get_products(
     sort: str = "default",
     category: str | None = None,
     search: str | None = None,
-    db: Session = Depends(get_db)
+    min_price: float | None = None,
+    max_price: float | None = None,
+    facets: bool = False,
+    db: Session = Depends(get_read_db)
 ):
     try:
-        query = db.query(Product)
-        if category:
-            query = query.filter(Product.category == category)
-        if search:
-            like_pattern = f"%{search}%"
-            query = query.filter(Product.name.ilike(like_pattern))
-        
-        if sort == "price-low":
-            query = query.order_by(asc(Product.price))
-        elif sort == "price-high":
-            query = query.order_by(desc(Product.price))
-        elif sort == "latest":
-            query = query.order_by(desc(Product.id))
-        else:
-            query = query.order_by(asc(Product.id))
-
-        total = query.count()
-        offset = (page - 1) * limit
-        db_products = query.offset(offset).limit(limit).all()
-        products = [ProductBase.from_orm(p) for p in db_products]
-        
-        return ProductsResponse(
-            success=True,
-            data=products,
+        db_products, total = catalog.product_page(db, page, limit, sort, category, search, min_price, max_price)
+        # Тело ProductsResponse собирается из закодированных товаров без Pydantic
+        return raw_json_response(catalog.encode_product_list(
+            db_products,
             total=total,
             page=page,
-            limit=limit
-        )
+            limit=limit,
+            # Счётчики для боковой панели: категории и гистограмма цен
+            facets=facet_index(db).facets(category, search, min_price, max_price) if facets else None
+        ))
     except Exception as e:
         logger.error(f"Error fetching products: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка получения товаров: {str(e)}")
 
+# Подсказки поиска из индекса в памяти (suggest.py); объявлен раньше /api/products/{product_id}
+SUGGEST_CACHE = {"Cache-Control": f"public, max-age={suggest.SUGGEST_CACHE_SECONDS}"}
+
+@app.get("/api/products/suggest")
+async def get_suggestions(
+    request: Request,
+    q: str = Query("", max_length=200),
+    limit: int = Query(suggest.SUGGEST_LIMIT, ge=1, le=suggest.SUGGEST_LIMIT),
+    db: Session = Depends(get_read_db)
+):
+    body, etag = suggest.suggest_index(db).response(q, limit)
+    return etag_response(request, body, etag, SUGGEST_CACHE)
+
 # Новый роут для single
 @app.get("/api/products/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     try:
         product = db.query(Product).filter(Product.id == product_id).first()
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        product_data = ProductBase.from_orm(product)
-        
-        return ProductResponse(
-            success=True,
-            data=product_data
-        )
+        return raw_json_response(b'{"success":true,"data":' + catalog.product_json(product) + b"}")
     except HTTPException:
         raise
     except Exception as e:
@@ -478,100 +666,147 @@ async def get_product(
         raise HTTPException(status_code=500, detail=f"Ошибка получения товара: {str(e)}")
 
 
+def also_bought_products(index, product_id: int, limit: int) -> list:
+    """Рекомендации по совместным покупкам; удалённые товары пропускаются"""
+    # Берём все RECOMMENDATIONS_TOP_K соседей: часть могла быть удалена из каталога
+    ids = recommender.also_bought(product_id)
+    return [index.products[i] for i in ids if i in index.products][:limit]
+
+@app.get("/api/products/{product_id}/also-bought")
+async def get_also_bought(product_id: int, limit: int = Query(4, ge=1, le=20), db: Session = Depends(get_read_db)):
+    return json_response({"success": True, "data": also_bought_products(related_index(db), product_id, limit)})
+
+# Карточки магазина ссылаются на product.html?id=…; маршрут объявлен раньше общего /{page_name}.html
 @app.get("/product", response_class=HTMLResponse)
-async def product(request: Request):
-    return templates.TemplateResponse("product.html", {"request": request})
+@app.get("/product.html", response_class=HTMLResponse)
+async def product(request: Request, id: Optional[int] = None, db: Session = Depends(get_read_db)):
+    """Товар встраивается в страницу как JSON, похожие товары — готовой разметкой"""
+    item, related, also_bought = None, [], []
+    if id is not None:
+        index = related_index(db)
+        item = index.products.get(id)
+        if item is None:
+            # Добавлен в другом процессе, а индекс ещё не пересобран
+            row = db.get(Product, id)
+            item = catalog.product_to_dict(row) if row else None
+        related = index.related(id)
+        also_bought = also_bought_products(index, id, RELATED_PRODUCTS_LIMIT)
+    return templates.TemplateResponse(
+        "product.html",
+        {"request": request, "product": item, "related": related, "also_bought": also_bought},
+        status_code=200 if item or id is None else 404,
+    )
+
+
+def load_cart_items(request: Request, db: Session, user: Optional[User]):
+    """Корзина пользователя из cart_store или гостя из подписанной cookie.
+
+    Словари с полями CartItemBase: оба источника уже отдают нужные типы,
+    поэтому модели не строятся и ответ кодируется сразу (cart_response).
+    """
+    if user:
+        return get_cart_store().get(db, user.id)
+    return hydrate_guest_cart(db, read_guest_cart(request))
+
+
+def cart_response(items: list, response: Response = None) -> Response:
+    """CartResponse готовыми байтами; cookie гостевой корзины переносятся из response"""
+    result = json_response({"success": True, "data": items})
+    if response is not None:
+        for name, value in response.raw_headers:
+            if name == b"set-cookie":
+                result.raw_headers.append((name, value))
+    return result
 
 
+# Корзина доступна и гостям: вместо 401 используется cookie guest_cart
 @app.get("/api/cart", response_model=CartResponse)
-async def get_cart(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_cart(request: Request, current_user: Optional[User] = Depends(get_current_user_optional), db: Session = Depends(get_read_db)):
     try:
-        logger.info(f"Fetching cart for user: {current_user.username}")
-        items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-        cart_items = [CartItemBase.from_orm(item) for item in items]
-        return CartResponse(success=True, data=cart_items)
+        return cart_response(load_cart_items(request, db, current_user))
     except Exception as e:
         logger.error(f"Error in get_cart: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка получения корзины: {str(e)}")
 
 @app.post("/api/cart", response_model=CartResponse)
 async def add_to_cart(
-    item: CartItemBase,
-    current_user: User = Depends(get_current_user),
+    item: CartItemCreate,
+    request: Request,
+    response: Response,
+    current_user: Optional[User] = Depends(get_current_user_optional),
     db: Session = Depends(get_db)
 ):
     try:
-        logger.info(f"Adding to cart for user {current_user.username}: {item}")
-        existing_item = db.query(CartItem).filter(
-            CartItem.user_id == current_user.id,
-            CartItem.product_id == item.product_id
-        ).first()
-
-        if existing_item:
-            existing_item.quantity += item.quantity
-            db.commit()
-            db.refresh(existing_item)
-            logger.info(f"Updated existing item: {existing_item.product_id}, new quantity: {existing_item.quantity}")
-        else:
-            new_item = CartItem(
-                user_id=current_user.id,
-                product_id=item.product_id,
-                name=item.name,
-                price=item.price,
-                image=item.image,
-                quantity=item.quantity
-            )
-            db.add(new_item)
-            db.commit()
-            db.refresh(new_item)
-            logger.info(f"Added new item: {new_item.product_id}")
-
-        items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-        cart_items = [CartItemBase.from_orm(item) for item in items]
-        return CartResponse(success=True, data=cart_items)
+        if current_user:
+            logger.info(f"Adding to cart for user {current_user.username}: {item}")
+            # SQL: атомарный upsert по (user_id, product_id); Redis: HINCRBY по полю товара
+            get_cart_store().add(db, current_user.id, item.model_dump())
+            return cart_response(load_cart_items(request, db, current_user))
+
+        guest_items = read_guest_cart(request)
+        guest_items[item.product_id] = guest_items.get(item.product_id, 0) + item.quantity
+        write_guest_cart(response, guest_items)
+        return cart_response(hydrate_guest_cart(db, guest_items), response)
     except Exception as e:
         db.rollback()
         logger.error(f"Error in add_to_cart: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка добавления в корзину: {str(e)}")
 
 @app.put("/api/cart/{product_id}", response_model=CartResponse)
-async def update_cart(product_id: str, update_data: CartItemUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def update_cart(
+    product_id: str,
+    update_data: CartItemUpdate,
+    request: Request,
+    response: Response,
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: Session = Depends(get_db)
+):
+    if update_data.quantity < 1:
+        raise HTTPException(status_code=400, detail="Количество должно быть больше 0")
     try:
-        logger.info(f"Updating cart item {product_id} for user {current_user.username}: quantity={update_data.quantity}")
-        if update_data.quantity < 1:
-            raise HTTPException(status_code=400, detail="Количество должно быть больше 0")
-        item = db.query(CartItem).filter(
-            CartItem.user_id == current_user.id,
-            CartItem.product_id == product_id
-        ).first()
-        if not item:
+        if current_user:
+            logger.info(f"Updating cart item {product_id} for user {current_user.username}: quantity={update_data.quantity}")
+            if not get_cart_store().set_quantity(db, current_user.id, product_id, update_data.quantity):
+                raise HTTPException(status_code=404, detail="Товар не найден в корзине")
+            return cart_response(load_cart_items(request, db, current_user))
+
+        guest_items = read_guest_cart(request)
+        if product_id not in guest_items:
             raise HTTPException(status_code=404, detail="Товар не найден в корзине")
-        item.quantity = update_data.quantity
-        db.commit()
-        db.refresh(item)
-        items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-        cart_items = [CartItemBase.from_orm(item) for item in items]
-        return CartResponse(success=True, data=cart_items)
+        guest_items[product_id] = update_data.quantity
+        write_guest_cart(response, guest_items)
+        return cart_response(hydrate_guest_cart(db, guest_items), response)
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Error in update_cart: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка обновления корзины: {str(e)}")
 
 @app.delete("/api/cart/{product_id}", response_model=CartResponse)
-async def remove_from_cart(product_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def remove_from_cart(
+    product_id: str,
+    request: Request,
+    response: Response,
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: Session = Depends(get_db)
+):
     try:
-        logger.info(f"Removing cart item {product_id} for user {current_user.username}")
-        item = db.query(CartItem).filter(
-            CartItem.user_id == current_user.id,
-            CartItem.product_id == product_id
-        ).first()
-        if not item:
+        if current_user:
+            logger.info(f"Removing cart item {product_id} for user {current_user.username}")
+            if not get_cart_store().remove(db, current_user.id, product_id):
+                raise HTTPException(status_code=404, detail="Товар не найден в корзине")
+            return cart_response(load_cart_items(request, db, current_user))
+
+        guest_items = read_guest_cart(request)
+        if guest_items.pop(product_id, None) is None:
             raise HTTPException(status_code=404, detail="Товар не найден в корзине")
-        db.delete(item)
-        db.commit()
-        items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-        cart_items = [CartItemBase.from_orm(item) for item in items]
-        return CartResponse(success=True, data=cart_items)
+        write_guest_cart(response, guest_items)
+        return cart_response(hydrate_guest_cart(db, guest_items), response)
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Error in remove_from_cart: {str(e)}")
@@ -585,7 +820,11 @@ async def admin_login_page(request: Request, current_user: Optional[User] = Depe
         return RedirectResponse(url="/admin/dashboard", status_code=303)
     return templates.TemplateResponse("admin_login.html", {"request": request, "user": current_user})
 
-@app.post("/admin/login", response_class=HTMLResponse)
+@app.post("/admin/login", response_class=HTMLResponse, dependencies=[
+    Depends(rate_limit("admin-login", 5, 60)),
+    Depends(rate_limit("admin-login-user", 5, 300, key="field", field="username")),
+    Depends(bcrypt_slots),
+])
 async def admin_login(
     request: Request,
     username: str = Form(...),
@@ -594,29 +833,18 @@ async def admin_login(
 ):
     logger.info(f"Admin login attempt: username={username}")
     user = db.query(User).filter(User.username == username).first()
-    if not user or not pwd_context.verify(password, user.password_hash) or not user.is_admin:
+    if not user or not await run_bcrypt(pwd_context.verify, password, user.password_hash) or not user.is_admin:
         logger.warning(f"Admin login failed: username={username}")
         return templates.TemplateResponse(
             "admin_login.html",
             {"request": request, "error": "Неверный логин, пароль или не админ"}
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = jwt.encode(
-        {"sub": user.username, "is_admin": user.is_admin, "exp": datetime.utcnow() + access_token_expires},
-        SECRET_KEY,
-        algorithm=ALGORITHM
-    )
+    access_token = create_access_token(user.username, user.is_admin)
+    refresh_token = issue_refresh_token(db, user)
+    db.commit()
     response = RedirectResponse(url="/admin/dashboard", status_code=303)
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,
-        samesite="lax",
-        secure=False,
-        max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        path="/"
-    )
+    set_session_cookies(response, user.is_admin, access_token, refresh_token)
     logger.info(f"Admin login successful: username={username}, set cookie: access_token={access_token[:20]}...")
     return response
 
@@ -650,10 +878,11 @@ async def add_product(
     image: UploadFile = File(...),
     category: str = Form(None),
     is_new_arrival: bool = Form(False),
+    stock: str = Form(""),
     current_admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    logger.info(f"Adding product: name={name}, price={price}, category={category}, is_new_arrival={is_new_arrival}")
+    logger.info(f"Adding product: name={name}, price={price}, category={category}, is_new_arrival={is_new_arrival}, stock={stock}")
     try:
         if not image.filename or not allowed_file(image.filename):
             logger.error("Invalid file type or no file uploaded")
@@ -662,6 +891,8 @@ async def add_product(
                 status_code=303
             )
 
+        from werkzeug.utils import secure_filename
+
         filename = secure_filename(image.filename)
         file_path = os.path.join(UPLOAD_FOLDER, filename)
         
@@ -675,11 +906,14 @@ async def add_product(
             price=price,
             image=image_path,
             category=category,
-            is_new_arrival=is_new_arrival
+            is_new_arrival=is_new_arrival,
+            stock=parse_stock(stock)
         )
         db.add(new_product)
         db.commit()
         db.refresh(new_product)
+        catalog.invalidate_catalog_caches()
+        suggest.product_changed(new_product)
         logger.info(f"Product added successfully: id={new_product.id}")
         return RedirectResponse(url="/admin/dashboard?message=Товар добавлен&success=true", status_code=303)
     except Exception as e:
@@ -708,10 +942,11 @@ async def edit_product(
     image: UploadFile = File(None),
     category: str = Form(None),
     is_new_arrival: bool = Form(False),
+    stock: str = Form(""),
     current_admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    logger.info(f"Editing product {product_id}: name={name}, price={price}, category={category}, is_new_arrival={is_new_arrival}")
+    logger.info(f"Editing product {product_id}: name={name}, price={price}, category={category}, is_new_arrival={is_new_arrival}, stock={stock}")
     try:
         product = db.query(Product).filter(Product.id == product_id).first()
         if not product:
@@ -722,8 +957,11 @@ async def edit_product(
         product.price = price
         product.category = category
         product.is_new_arrival = is_new_arrival
+        product.stock = parse_stock(stock)
 
         if image and allowed_file(image.filename):
+            from werkzeug.utils import secure_filename
+
             filename = secure_filename(image.filename)
             file_path = os.path.join(UPLOAD_FOLDER, filename)
             with open(file_path, "wb") as f:
@@ -732,6 +970,8 @@ async def edit_product(
 
         db.commit()
         db.refresh(product)
+        catalog.invalidate_catalog_caches()
+        suggest.product_changed(product)
         logger.info(f"Product {product_id} updated successfully")
         return RedirectResponse(url="/admin/dashboard?message=Товар обновлён&success=true", status_code=303)
     except Exception as e:
@@ -754,8 +994,11 @@ async def delete_product(
         if not product:
             logger.error(f"Product {product_id} not found")
             return RedirectResponse(url="/admin/dashboard?message=Товар не найден&success=false", status_code=303)
+        db.query(CollectionItem).filter(CollectionItem.product_id == product_id).delete()
         db.delete(product)
         db.commit()
+        catalog.invalidate_catalog_caches()
+        suggest.product_deleted(product_id)
         logger.info(f"Product {product_id} deleted successfully")
         return RedirectResponse(url="/admin/dashboard?message=Товар удалён&success=true", status_code=303)
     except Exception as e:
@@ -766,23 +1009,77 @@ async def delete_product(
             status_code=303
         )
 
+@app.get("/api/admin/analytics", response_model=dict)
+async def admin_analytics(
+    start: date | None = None,
+    end: date | None = None,
+    top: int = Query(10, ge=1, le=100),
+    current_admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    # По умолчанию — последние 30 дней
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="Начало периода позже конца")
+    return {"success": True, "data": sales_summary(db, start, end, top)}
+
+@app.get("/api/admin/collections", response_model=dict)
+async def admin_collections(current_admin: User = Depends(get_current_admin), db: Session = Depends(get_db)):
+    return {"success": True, "data": featured.list_definitions(db)}
+
+@app.put("/api/admin/collections/{slug}", response_model=dict)
+async def admin_save_collection(
+    slug: str,
+    form_data: CollectionForm,
+    current_admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    logger.info(f"Saving collection {slug}: username={current_admin.username}, rule={form_data.rule}")
+    try:
+        featured.save_collection(db, slug, form_data.model_dump())
+        db.commit()
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    catalog.invalidate_catalog_caches()
+    return {"success": True}
+
+@app.delete("/api/admin/collections/{slug}", response_model=dict)
+async def admin_delete_collection(
+    slug: str,
+    current_admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    if not featured.delete_collection(db, slug):
+        raise HTTPException(status_code=404, detail="Подборка не найдена")
+    db.commit()
+    catalog.invalidate_catalog_caches()
+    return {"success": True}
+
 @app.get("/admin/logout")
-async def admin_logout():
+async def admin_logout(request: Request, db: Session = Depends(get_db)):
     logger.info("Admin logout requested")
+    # Отзываем цепочку refresh-токенов, иначе сессия продлилась бы снова
+    refresh_token = request.cookies.get(REFRESH_COOKIE)
+    if refresh_token:
+        revoked = revoke_refresh_token(db, refresh_token)
+        db.commit()
+        logger.info(f"Refresh tokens revoked on logout: {revoked}")
     response = RedirectResponse(url="/administrator")
-    response.delete_cookie("access_token", path="/")
+    clear_session_cookies(response)
     return response
 
 @app.get("/api/new-arrivals", response_model=List[ProductBase])
-async def get_new_arrivals(db: Session = Depends(get_db)):
-    logger.info("Fetching new arrivals")
+async def get_new_arrivals(request: Request, db: Session = Depends(get_read_db)):
     try:
-        products = db.query(Product).filter(Product.is_new_arrival == True).limit(4).all()
-        logger.info(f"New arrivals fetched: {len(products)} products")
-        return products
+        encoded = featured.snapshot(db).product_lists.get(featured.NEW_ARRIVALS_SLUG)
     except Exception as e:
         logger.error(f"Error fetching new arrivals: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка получения новинок: {str(e)}")
+    if not encoded:
+        encoded = catalog.encode_payload([])
+    return etag_response(request, *encoded, PUBLIC_REVALIDATE)
 
 # Основные маршруты
 @app.get("/about", response_class=HTMLResponse)
@@ -805,7 +1102,7 @@ async def contactus(request: Request):
 async def forgot_password_page(request: Request):
     return templates.TemplateResponse("forgot-password.html", {"request": request})
 
-@app.post("/forgot-password")
+@app.post("/forgot-password", dependencies=[Depends(rate_limit("forgot-password", 5, 900))])
 async def forgot_password(
     form_data: ForgotPasswordForm,
     db: Session = Depends(get_db)
@@ -845,7 +1142,7 @@ async def forgot_password(
         logger.info(f"Sending reset email to: {form_data.email}")
         
         # Use your ngrok domain or localhost for reset link
-        RESET_URL = f"https://fastestore.onrender.com/reset-password?token={reset_token}"
+        RESET_URL = f"{BASE_URL}/reset-password?token={reset_token}"
         
         subject = "Password Reset for eStore"
         body = f"""
@@ -860,13 +1157,10 @@ async def forgot_password(
         eStore Team
       """
         
-        send_email(form_data.email, subject, body, ADMIN_EMAIL)
+        enqueue(db, "send_email", {"to_email": form_data.email, "subject": subject, "body": body, "from_email": ADMIN_EMAIL})
         
         return {"success": True, "message": "Проверьте email для ссылки на сброс пароля!"}
         
-    except smtplib.SMTPAuthenticationError as e:
-        logger.error(f"SMTP authentication error: {e}")
-        raise HTTPException(status_code=500, detail="Ошибка аутентификации email")
     except Exception as e:
         db.rollback()
         logger.error(f"Error in forgot_password: {e}")
@@ -880,7 +1174,7 @@ async def reset_password_page(request: Request, token: str = Query(..., descript
     return templates.TemplateResponse("reset-password.html", {"request": request, "token": token})
     
 
-@app.post("/reset-password")
+@app.post("/reset-password", dependencies=[Depends(rate_limit("reset-password", 5, 600)), Depends(bcrypt_slots)])
 async def reset_password(
     form_data: ResetPasswordForm,
     token: str = Query(..., description="Reset token from email link"),
@@ -920,11 +1214,12 @@ async def reset_password(
             raise HTTPException(status_code=400, detail="Password must be at least 8 characters")
 
         # Обновить пароль
-        hashed_password = pwd_context.hash(form_data.password)
+        hashed_password = await run_bcrypt(pwd_context.hash, form_data.password)
         user.password_hash = hashed_password
 
         # Отметить токен как used
         reset_entry.used = True
+        revoke_user_tokens(db, user.id)
         db.commit()
         logger.info(f"Password reset successful for user {user.username}")
 
@@ -949,127 +1244,142 @@ async def render_page(request: Request, page_name: str):
     return templates.TemplateResponse(template_file, {"request": request})
 
 # PayPal
-@app.post("/api/create-paypal-order", response_model=dict)
+@app.post("/api/create-paypal-order", response_model=dict, dependencies=[Depends(rate_limit("checkout", 10, 60, key="user"))])
 async def create_paypal_order(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     try:
         # Получаем корзину
-        cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
+        cart_items = get_cart_store().get(db, current_user.id)
         if not cart_items:
             raise HTTPException(status_code=400, detail="Корзина пуста")
 
-        total = sum(item.price * item.quantity for item in cart_items)
+        total = sum(item["price"] * item["quantity"] for item in cart_items)
 
-        # Создаём заказ в БД (pending)
+        # Резерв остатков одним условным UPDATE, заказ и его позиции — в той же транзакции
+        try:
+            reserve(db, order_lines(cart_items))
+        except OutOfStock as e:
+            raise HTTPException(status_code=409, detail=f"Недостаточно товара на складе: {e}")
+        except InvalidQuantity as e:
+            raise HTTPException(status_code=400, detail=f"Некорректное количество товара: {e}")
         order = Order(user_id=current_user.id, total=total)
+        order.order_items = [OrderItem(**item) for item in cart_items]
+        mark_reserved(order)
         db.add(order)
         db.commit()
         db.refresh(order)
 
-        # Добавляем items в заказ
-        for item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item.product_id,
-                name=item.name,
-                price=item.price,
-                image=item.image,
-                quantity=item.quantity
+        # Создаём PayPal order вне event loop: медленный PayPal не блокирует другие запросы
+        try:
+            paypal_order = await asyncio.to_thread(
+                create_paypal_checkout,
+                order.id,
+                total,
+                f"{BASE_URL}/api/capture-paypal-order?order_id={order.id}",
+                f"{BASE_URL}/cart",  # На корзину при отмене
             )
-            db.add(order_item)
-        db.commit()
-
-        # Создаём PayPal order
-        access_token = get_paypal_access_token()
-        base_url = get_paypal_base_url()
-        paypal_url = f"{base_url}/v2/checkout/orders"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-            "PayPal-Request-Id": str(order.id)  # Для идемпотентности
-        }
-        body = {
-            "intent": "CAPTURE",
-            "purchase_units": [{
-                "amount": {
-                    "currency_code": "USD",  # Или твоя валюта
-                    "value": f"{total:.2f}"
-                },
-                "description": f"Order #{order.id} from eStore"
-            }],
-            "application_context": {
-                "return_url": f"https://fastestore.onrender.com/api/capture-paypal-order?order_id={order.id}",  # Замени на ngrok или домен
-                "cancel_url": f"https://fastestore.onrender.com/cart"  # На корзину при отмене
-            }
-        }
-        logger.info(f"Creating PayPal order at: {paypal_url}")
-        response = requests.post(paypal_url, headers=headers, json=body, timeout=10)
-        if response.status_code != 201:
-            db.delete(order)  # Откатываем заказ
+        except Exception:
+            release(db, [order.id])  # Возвращаем резерв и откатываем заказ
+            db.delete(order)
             db.commit()
-            logger.error(f"PayPal create order error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=500, detail="PayPal error")
+            raise
 
-        paypal_order = response.json()
         order.paypal_order_id = paypal_order["id"]
         db.commit()
 
         # Возвращаем approval URL
-        approval_url = next(link["href"] for link in paypal_order["links"] if link["rel"] == "approve")
+        approval_url = paypal_order["approval_url"]
         logger.info(f"PayPal approval URL generated: {approval_url}")
         return {"success": True, "approval_url": approval_url, "order_id": order.id}
 
+    except (HTTPException, IntegrationUnavailable):
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Create PayPal order error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/capture-paypal-order")
+# PayPal возвращает покупателя сюда (GET) после одобрения платежа
+@app.api_route("/api/capture-paypal-order", methods=["GET", "POST"])
 async def capture_paypal_order(
     order_id: int = Query(...),
+    token: str = Query(...),  # PayPal добавляет к return_url свой id заказа
     db: Session = Depends(get_db)
 ):
     try:
         order = db.query(Order).filter(Order.id == order_id).first()
-        if not order or order.status != "pending":
+        if not order or order.status not in ("pending", "approved", "expired"):
             raise HTTPException(status_code=400, detail="Invalid order")
-
-        access_token = get_paypal_access_token()
-        base_url = get_paypal_base_url()
-        paypal_url = f"{base_url}/v2/checkout/orders/{order.paypal_order_id}/capture"
-        headers = {"Authorization": f"Bearer {access_token}"}
-        logger.info(f"Capturing PayPal order at: {paypal_url}")
-        response = requests.post(paypal_url, headers=headers, timeout=10)
-        if response.status_code != 201:
-            order.status = "failed"
+        # Адрес открыт без входа: статус меняет только тот, кто вернулся от PayPal с этим заказом
+        if not order.paypal_order_id or not hmac.compare_digest(token, order.paypal_order_id):
+            logger.warning(f"PayPal token mismatch for order {order_id}")
+            raise HTTPException(status_code=400, detail="Invalid PayPal token")
+
+        # Захват платежа и очистку корзины выполняет фоновая сверка (payments.py).
+        # Переходы условные: задача expire_reservations могла успеть закрыть заказ
+        now = datetime.utcnow()
+        if order.status == "pending":
+            db.query(Order).filter(Order.id == order_id, Order.status == "pending").update(
+                {Order.status: "approved", Order.approved_at: now}, synchronize_session=False
+            )
             db.commit()
-            logger.error(f"PayPal capture error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=500, detail="Payment failed")
-
-        # Успех: обновляем статус, очищаем корзину
-        order.status = "paid"
-        db.commit()
-
-        # Очищаем корзину пользователя
-        db.query(CartItem).filter(CartItem.user_id == order.user_id).delete()
-        db.commit()
+            db.refresh(order)
+
+        # Оплата одобрена после истечения резерва: резервируем заново, если товар ещё есть.
+        # Сюда доходит только запрос с token этого заказа (проверка выше): иначе по
+        # перебору order_id брошенные заказы можно было бы резервировать снова и снова
+        if order.status == "expired":
+            if not reclaim(db, order):
+                db.query(Order).filter(Order.id == order_id, Order.status == "expired").update(
+                    {Order.status: "failed"}, synchronize_session=False
+                )
+                db.commit()
+                return RedirectResponse(url="/cart", status_code=303)
+            approved = db.query(Order).filter(Order.id == order_id, Order.status == "expired").update(
+                {Order.status: "approved", Order.approved_at: now}, synchronize_session=False
+            )
+            if approved:
+                db.commit()
+            else:
+                db.rollback()  # Заказ возобновил параллельный запрос, второй резерв не нужен
 
-        # Перенаправляем на success страницу
-        logger.info(f"PayPal order {order_id} captured successfully")
-        return RedirectResponse(url=f"https://fastestore.onrender.com/order-success?order_id={order_id}", status_code=303)
+        logger.info(f"PayPal order {order_id} approved, capture queued")
+        return RedirectResponse(url=f"/order-success?order_id={order_id}", status_code=303)
 
+    except HTTPException:
+        raise
     except Exception as e:
+        db.rollback()
         logger.error(f"Capture PayPal order error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+
+@app.get("/api/orders", response_model=OrdersResponse)
+async def get_orders(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        orders, next_cursor = fetch_order_page(db, current_user.id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    return OrdersResponse(
+        success=True,
+        data=[OrderOut.from_orm(order) for order in orders],
+        next_cursor=next_cursor
+    )
 
 
 @app.get("/order-success", response_class=HTMLResponse)
 async def order_success(request: Request, order_id: int, db: Session = Depends(get_db)):
     order = db.query(Order).filter(Order.id == order_id).first()
-    if not order or order.status != "paid":
+    # approved — платёж ещё подтверждается фоновой сверкой
+    if not order or order.status not in ("approved", "paid"):
         raise HTTPException(status_code=404, detail="Order not found")
     return templates.TemplateResponse("order-success.html", {"request": request, "order": order})
\ No newline at end of file
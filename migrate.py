@@ -0,0 +1,161 @@
+"""Версионные миграции схемы.
+
+Скрипты лежат в migrations/NNNN_name.py и определяют upgrade(conn).
+Применённые версии записываются в таблицу schema_migrations.
+
+    python migrate.py            # применить новые миграции
+    python migrate.py status     # показать состояние
+
+Миграция с TRANSACTIONAL = False выполняется без общей транзакции — это
+нужно для CREATE INDEX CONCURRENTLY в PostgreSQL.
+"""
+import argparse
+import importlib
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+
+def discover():
+    """Список (version, name, module_path) по возрастанию версии"""
+    found = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            found.append((int(match.group(1)), match.group(2), f"migrations.{filename[:-3]}"))
+    return found
+
+
+def ensure_migrations_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(bind=engine):
+    with bind.begin() as conn:
+        ensure_migrations_table(conn)
+        done = applied_versions(conn)
+
+    for version, name, module_path in discover():
+        if version in done:
+            continue
+        module = importlib.import_module(module_path)
+        started = time.perf_counter()
+        logger.info(f"Applying migration {version:04d}_{name}")
+        if getattr(module, "TRANSACTIONAL", True):
+            with bind.begin() as conn:
+                module.upgrade(conn)
+        else:
+            with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                module.upgrade(conn)
+        with bind.begin() as conn:
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()},
+            )
+        logger.info(f"Migration {version:04d}_{name} applied in {time.perf_counter() - started:.2f}s")
+
+
+# --- Помощники для скриптов миграций ---
+
+def has_column(conn, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _pg_index_valid(conn, name: str):
+    """indisvalid индекса в PostgreSQL; None — индекса нет"""
+    return conn.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+
+
+def has_index(conn, table: str, name: str) -> bool:
+    """Есть ли рабочий индекс. Недостроенный CREATE INDEX CONCURRENTLY оставляет
+    в PostgreSQL индекс INVALID: он не используется, и такого индекса как бы нет"""
+    if conn.dialect.name == "postgresql":
+        return bool(_pg_index_valid(conn, name))
+    return name in {i["name"] for i in inspect(conn).get_indexes(table)}
+
+
+def add_column_if_missing(conn, table: str, column: str, ddl_type: str):
+    if not has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def create_index_online(conn, name: str, table: str, columns, unique: bool = False):
+    """Создаёт индекс, не блокируя запись там, где это возможно.
+
+    PostgreSQL: CREATE INDEX CONCURRENTLY (миграция должна быть
+    TRANSACTIONAL = False). SQLite строит индекс одной короткой транзакцией;
+    в режиме WAL чтение при этом не блокируется.
+
+    Индекс INVALID от прерванной прошлой попытки удаляется и строится заново:
+    IF NOT EXISTS его бы пропустил, и миграция записалась бы как применённая.
+    """
+    if has_index(conn, table, name):
+        return
+    if conn.dialect.name == "postgresql" and _pg_index_valid(conn, name) is False:
+        logger.warning(f"Index {name} is INVALID after an interrupted build, rebuilding")
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    unique_sql = "UNIQUE " if unique else ""
+    cols = ", ".join(columns)
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({cols})"))
+    else:
+        conn.execute(text(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({cols})"))
+
+
+def run_in_batches(conn, statement: str, batch_size: int = 5000, **params) -> int:
+    """Повторяет изменяющий запрос, пока он затрагивает строки.
+
+    Запрос сам ограничивает выборку через :batch_size (например, WHERE id IN
+    (SELECT ... LIMIT :batch_size)). В миграции с TRANSACTIONAL = False каждая
+    пачка фиксируется отдельно и держит блокировку недолго.
+    """
+    total = 0
+    while True:
+        result = conn.execute(text(statement), {"batch_size": batch_size, **params})
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+
+
+def status():
+    with engine.begin() as conn:
+        ensure_migrations_table(conn)
+        done = applied_versions(conn)
+    for version, name, _ in discover():
+        mark = "applied" if version in done else "pending"
+        print(f"{version:04d}_{name}: {mark}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("command", nargs="?", default="upgrade", choices=["upgrade", "status"])
+    args = parser.parse_args()
+    if args.command == "status":
+        status()
+    else:
+        run_migrations()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""orders.approved_at для асинхронного захвата платежей PayPal."""
+from migrate import add_column_if_missing
+
+
+def upgrade(conn):
+    add_column_if_missing(conn, "orders", "approved_at", "TIMESTAMP")
@@ -0,0 +1,12 @@
+"""Индексы под частые запросы корзины, истории заказов и очистки токенов."""
+from migrate import create_index_online
+
+# CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+TRANSACTIONAL = False
+
+
+def upgrade(conn):
+    create_index_online(conn, "ix_cart_user_product", "cart", ["user_id", "product_id"])
+    create_index_online(conn, "ix_orders_user_created", "orders", ["user_id", "created_at", "id"])
+    create_index_online(conn, "ix_order_items_order_id", "order_items", ["order_id"])
+    create_index_online(conn, "ix_password_resets_expires_at", "password_resets", ["expires_at"])
@@ -0,0 +1,50 @@
+"""Уникальный ключ cart(user_id, product_id).
+
+Дубликаты строк корзины сливаются в строку с наименьшим id (количества
+суммируются), лишние удаляются, затем строится уникальный индекс. Слияние
+и удаление идут одной транзакцией: прерванный запуск откатывается целиком,
+и повторный не суммирует уже слитую строку второй раз. Строки, добавленные
+после начала чистки (id > max_id), не трогаются; если среди них успел
+появиться новый дубликат, построение индекса упадёт и миграцию можно просто
+запустить повторно: недостроенный индекс (INVALID в PostgreSQL) будет удалён
+и построен заново.
+"""
+from sqlalchemy import text
+
+from migrate import create_index_online, has_index
+
+TRANSACTIONAL = False
+
+MERGE_QUANTITIES = """
+UPDATE cart SET quantity = (
+    SELECT SUM(d.quantity) FROM cart d
+    WHERE d.user_id = cart.user_id AND d.product_id = cart.product_id AND d.id <= :max_id
+)
+WHERE id IN (
+    SELECT MIN(id) FROM cart WHERE id <= :max_id GROUP BY user_id, product_id HAVING COUNT(*) > 1
+)
+"""
+
+DELETE_DUPLICATES = """
+DELETE FROM cart WHERE id IN (
+    SELECT c.id FROM cart c
+    WHERE c.id <= :max_id AND EXISTS (
+        SELECT 1 FROM cart d
+        WHERE d.user_id = c.user_id AND d.product_id = c.product_id AND d.id < c.id
+    )
+)
+"""
+
+
+def upgrade(conn):
+    if not has_index(conn, "cart", "ux_cart_user_product"):
+        # Миграция идёт в AUTOCOMMIT (ради CONCURRENTLY), поэтому чистка — в своей транзакции
+        with conn.engine.begin() as tx:
+            max_id = tx.execute(text("SELECT MAX(id) FROM cart")).scalar() or 0
+            tx.execute(text(MERGE_QUANTITIES), {"max_id": max_id})
+            tx.execute(text(DELETE_DUPLICATES), {"max_id": max_id})
+        create_index_online(conn, "ux_cart_user_product", "cart", ["user_id", "product_id"], unique=True)
+    # Неуникальный индекс из 0002 больше не нужен
+    if has_index(conn, "cart", "ix_cart_user_product"):
+        concurrently = "CONCURRENTLY " if conn.dialect.name == "postgresql" else ""
+        conn.execute(text(f"DROP INDEX {concurrently}ix_cart_user_product"))
@@ -0,0 +1,8 @@
+"""Индекс products.is_new_arrival для подборки новинок."""
+from migrate import create_index_online
+
+TRANSACTIONAL = False
+
+
+def upgrade(conn):
+    create_index_online(conn, "ix_products_is_new_arrival", "products", ["is_new_arrival"])
@@ -0,0 +1,11 @@
+"""Остатки товаров и резервы заказов (см. inventory.py)."""
+from migrate import add_column_if_missing, create_index_online
+
+TRANSACTIONAL = False
+
+
+def upgrade(conn):
+    add_column_if_missing(conn, "products", "stock", "INTEGER")
+    add_column_if_missing(conn, "orders", "stock_reserved", "BOOLEAN NOT NULL DEFAULT FALSE")
+    add_column_if_missing(conn, "orders", "reserved_until", "TIMESTAMP")
+    create_index_online(conn, "ix_orders_status_reserved_until", "orders", ["status", "reserved_until"])
@@ -0,0 +1 @@
+"""Версионные скрипты миграций (см. migrate.py)."""
@@ -0,0 +1,48 @@
+"""Чтение истории заказов с keyset-пагинацией."""
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, joinedload
+
+from database import Order
+
+ORDERS_PAGE_MAX = 100
+
+
+def encode_cursor(order: Order) -> str:
+    raw = f"{order.created_at.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Возвращает (created_at, id) или бросает ValueError"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_at, order_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+    return datetime.fromisoformat(created_at), int(order_id)
+
+
+def fetch_order_page(db: Session, user_id: int, limit: int = 20, cursor: str = None):
+    """Страница заказов пользователя (новые первыми) вместе с позициями.
+
+    Позиции подгружаются JOIN-ом в том же запросе, поэтому обращение к
+    order.order_items не порождает N+1 ленивых запросов. Возвращает
+    (orders, next_cursor).
+    """
+    limit = max(1, min(limit, ORDERS_PAGE_MAX))
+    query = db.query(Order).filter(Order.user_id == user_id)
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Order.created_at < created_at,
+            and_(Order.created_at == created_at, Order.id < order_id),
+        ))
+    # Берём на одну запись больше, чтобы узнать, есть ли следующая страница
+    orders = (
+        query.options(joinedload(Order.order_items))
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
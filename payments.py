@@ -0,0 +1,350 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from analytics import record_paid_orders
+from breakers import PAYPAL, IntegrationUnavailable
+from cart_store import get_cart_store
+from database import Order, PaymentEvent, SessionLocal
+from inventory import release
+from jobs import enqueue
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+PAYPAL_CLIENT_ID = os.getenv("PAYPAL_CLIENT_ID")
+PAYPAL_SECRET = os.getenv("PAYPAL_SECRET")
+PAYPAL_MODE = os.getenv("PAYPAL_MODE", "sandbox")
+# Переопределение API (например, локальный fakes/paypal.py)
+PAYPAL_API_BASE = os.getenv("PAYPAL_API_BASE")
+PAYPAL_WEBHOOK_ID = os.getenv("PAYPAL_WEBHOOK_ID")
+PAYPAL_RECONCILE_INTERVAL = float(os.getenv("PAYPAL_RECONCILE_INTERVAL", "5"))  # Период задачи сверки
+PAYPAL_RECONCILE_BATCH = int(os.getenv("PAYPAL_RECONCILE_BATCH", "100"))
+# Сколько ждём вебхук, прежде чем захватить одобренный заказ самостоятельно
+PAYPAL_CAPTURE_GRACE_SECONDS = int(os.getenv("PAYPAL_CAPTURE_GRACE_SECONDS", "30"))
+
+# Типы событий PayPal, которые влияют на статус заказа
+EVENT_ORDER_APPROVED = "CHECKOUT.ORDER.APPROVED"
+EVENT_CAPTURE_COMPLETED = "PAYMENT.CAPTURE.COMPLETED"
+EVENT_CAPTURE_FAILED = {"PAYMENT.CAPTURE.DENIED", "PAYMENT.CAPTURE.DECLINED"}
+
+_token_cache = {"token": None, "expires_at": 0.0}
+
+
+def get_paypal_base_url():
+    """Возвращает базовый URL для PayPal в зависимости от режима"""
+    if PAYPAL_API_BASE:
+        return PAYPAL_API_BASE.rstrip("/")
+    if PAYPAL_MODE == "sandbox":
+        return "https://api-m.sandbox.paypal.com"
+    else:
+        return "https://api-m.paypal.com"
+
+
+def get_paypal_access_token():
+    """Возвращает OAuth-токен PayPal, переиспользуя его до истечения срока"""
+    if _token_cache["token"] and _token_cache["expires_at"] > time.monotonic():
+        return _token_cache["token"]
+
+    import requests
+
+    base_url = get_paypal_base_url()
+    url = f"{base_url}/v1/oauth2/token"
+    headers = {"Accept": "application/json", "Accept-Language": "en_US"}
+    data = {"grant_type": "client_credentials"}
+    auth = (PAYPAL_CLIENT_ID, PAYPAL_SECRET)
+    logger.info(f"Requesting PayPal token from: {url}")
+    try:
+        with PAYPAL.guard() as call:
+            response = requests.post(url, headers=headers, data=data, auth=auth, timeout=PAYPAL.timeout)
+            if response.status_code >= 500:
+                call.failed(f"HTTP {response.status_code}")
+        if response.status_code == 200:
+            payload = response.json()
+            token = payload["access_token"]
+            # Обновляем токен за минуту до истечения
+            expires_in = int(payload.get("expires_in", 0))
+            _token_cache["token"] = token
+            _token_cache["expires_at"] = time.monotonic() + max(expires_in - 60, 0)
+            logger.info("PayPal token acquired successfully")
+            return token
+        else:
+            logger.error(f"PayPal token error: {response.status_code} - {response.text}")
+            raise HTTPException(status_code=500, detail="Ошибка аутентификации PayPal")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"PayPal request error: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка соединения с PayPal")
+
+
+def capture_paypal_payment(paypal_order_id: str):
+    """Захватывает платёж по заказу PayPal. Возвращает (status_code, json)"""
+    import requests
+
+    access_token = get_paypal_access_token()
+    paypal_url = f"{get_paypal_base_url()}/v2/checkout/orders/{paypal_order_id}/capture"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {access_token}",
+        # Повторный захват того же заказа вернёт прежний результат
+        "PayPal-Request-Id": f"capture-{paypal_order_id}",
+    }
+    logger.info(f"Capturing PayPal order at: {paypal_url}")
+    with PAYPAL.guard() as call:
+        response = requests.post(paypal_url, headers=headers, timeout=PAYPAL.timeout)
+        if response.status_code >= 500:
+            call.failed(f"HTTP {response.status_code}")
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    return response.status_code, body
+
+
+def create_paypal_checkout(order_id: int, total: float, return_url: str, cancel_url: str) -> dict:
+    """Создаёт заказ PayPal (intent CAPTURE). Возвращает {"id", "approval_url"}"""
+    import requests
+
+    access_token = get_paypal_access_token()
+    paypal_url = f"{get_paypal_base_url()}/v2/checkout/orders"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {access_token}",
+        "PayPal-Request-Id": str(order_id)  # Для идемпотентности
+    }
+    body = {
+        "intent": "CAPTURE",
+        "purchase_units": [{
+            "amount": {
+                "currency_code": "USD",  # Или твоя валюта
+                "value": f"{total:.2f}"
+            },
+            "description": f"Order #{order_id} from eStore"
+        }],
+        "application_context": {"return_url": return_url, "cancel_url": cancel_url}
+    }
+    logger.info(f"Creating PayPal order at: {paypal_url}")
+    try:
+        with PAYPAL.guard() as call:
+            response = requests.post(paypal_url, headers=headers, json=body, timeout=PAYPAL.timeout)
+            if response.status_code >= 500:
+                call.failed(f"HTTP {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"PayPal create order request error: {e}")
+        raise HTTPException(status_code=502, detail="Ошибка соединения с PayPal")
+    if response.status_code != 201:
+        logger.error(f"PayPal create order error: {response.status_code} - {response.text}")
+        raise HTTPException(status_code=502, detail="PayPal error")
+    paypal_order = response.json()
+    approval_url = next(link["href"] for link in paypal_order["links"] if link["rel"] == "approve")
+    return {"id": paypal_order["id"], "approval_url": approval_url}
+
+
+def is_paypal_webhook(headers) -> bool:
+    return "paypal-transmission-id" in headers
+
+
+def verify_webhook_signature(headers, event: dict) -> bool:
+    """Проверяет подпись вебхука через API PayPal verify-webhook-signature"""
+    import requests
+
+    if not PAYPAL_WEBHOOK_ID:
+        logger.error("PAYPAL_WEBHOOK_ID не задан, вебхук PayPal отклонён")
+        return False
+    body = {
+        "auth_algo": headers.get("paypal-auth-algo"),
+        "cert_url": headers.get("paypal-cert-url"),
+        "transmission_id": headers.get("paypal-transmission-id"),
+        "transmission_sig": headers.get("paypal-transmission-sig"),
+        "transmission_time": headers.get("paypal-transmission-time"),
+        "webhook_id": PAYPAL_WEBHOOK_ID,
+        "webhook_event": event,
+    }
+    if not all(body.values()):
+        logger.warning("PayPal webhook: missing signature headers")
+        return False
+    access_token = get_paypal_access_token()
+    try:
+        with PAYPAL.guard() as call:
+            response = requests.post(
+                f"{get_paypal_base_url()}/v1/notifications/verify-webhook-signature",
+                headers={"Content-Type": "application/json", "Authorization": f"Bearer {access_token}"},
+                json=body,
+                timeout=PAYPAL.timeout,
+            )
+            if response.status_code >= 500:
+                call.failed(f"HTTP {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"PayPal webhook verification error: {e}")
+        return False
+    if response.status_code != 200:
+        logger.error(f"PayPal webhook verification failed: {response.status_code} - {response.text}")
+        return False
+    return response.json().get("verification_status") == "SUCCESS"
+
+
+def _resource_order_id(event: dict):
+    """Извлекает ID заказа PayPal из ресурса события"""
+    resource = event.get("resource") or {}
+    if event.get("event_type", "").startswith("PAYMENT.CAPTURE."):
+        related = (resource.get("supplementary_data") or {}).get("related_ids") or {}
+        return related.get("order_id")
+    return resource.get("id")
+
+
+def store_webhook_event(db: Session, event: dict) -> bool:
+    """Сохраняет событие PayPal. Возвращает False, если оно уже было получено"""
+    event_id = event.get("id")
+    if not event_id:
+        raise HTTPException(status_code=400, detail="Событие без id")
+    if db.query(PaymentEvent.id).filter(PaymentEvent.event_id == event_id).first():
+        return False
+    db.add(PaymentEvent(
+        event_id=event_id,
+        event_type=event.get("event_type", ""),
+        resource_id=_resource_order_id(event),
+        payload=json.dumps(event),
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Параллельная доставка того же события
+        db.rollback()
+        return False
+    return True
+
+
+def _capture_outcome(paypal_order_id: str):
+    """Захватывает платёж и возвращает итоговый статус заказа или None"""
+    import requests
+
+    try:
+        status_code, body = capture_paypal_payment(paypal_order_id)
+    except (requests.exceptions.RequestException, HTTPException, IntegrationUnavailable) as e:
+        # PayPal недоступен — попробуем на следующем проходе
+        logger.warning(f"PayPal capture deferred for {paypal_order_id}: {e}")
+        return None
+    if status_code in (200, 201) and body.get("status") == "COMPLETED":
+        return "paid"
+    issues = {d.get("issue") for d in body.get("details", [])}
+    if status_code == 422 and "ORDER_ALREADY_CAPTURED" in issues:
+        return "paid"
+    if status_code >= 500:
+        return None
+    logger.error(f"PayPal capture error for {paypal_order_id}: {status_code} - {body}")
+    return "failed"
+
+
+def reconcile_payments(db: Session, batch_size: int = PAYPAL_RECONCILE_BATCH) -> dict:
+    """Применяет накопленные события PayPal к заказам одной транзакцией на пачку"""
+    outcomes = {}  # paypal_order_id -> "paid" | "failed"
+
+    events = (
+        db.query(PaymentEvent)
+        .filter(PaymentEvent.processed_at.is_(None))
+        .order_by(PaymentEvent.id)
+        .limit(batch_size)
+        .all()
+    )
+    done_events = []
+    for event in events:
+        order_ref = event.resource_id
+        if not order_ref:
+            done_events.append(event.id)
+            continue
+        if event.event_type == EVENT_CAPTURE_COMPLETED:
+            outcomes[order_ref] = "paid"
+        elif event.event_type in EVENT_CAPTURE_FAILED:
+            outcomes.setdefault(order_ref, "failed")
+        elif event.event_type == EVENT_ORDER_APPROVED:
+            status = db.query(Order.status).filter(Order.paypal_order_id == order_ref).scalar()
+            if status not in ("pending", "approved"):
+                # Резерв истёк или заказ уже закрыт: не списываем деньги без товара.
+                # Вернувшийся покупатель может возобновить заказ (main.capture_paypal_order)
+                logger.warning(f"PayPal order {order_ref} approved in status {status}, capture skipped")
+            elif order_ref not in outcomes:
+                result = _capture_outcome(order_ref)
+                if result is None:
+                    # Оставляем событие необработанным до следующего прохода
+                    continue
+                outcomes[order_ref] = result
+        done_events.append(event.id)
+
+    # Одобренные покупателем заказы, по которым вебхук так и не пришёл
+    grace_deadline = datetime.utcnow() - timedelta(seconds=PAYPAL_CAPTURE_GRACE_SECONDS)
+    stale = (
+        db.query(Order.paypal_order_id)
+        .filter(Order.status == "approved", Order.approved_at < grace_deadline)
+        .limit(batch_size)
+        .all()
+    )
+    for (paypal_order_id,) in stale:
+        if paypal_order_id and paypal_order_id not in outcomes:
+            result = _capture_outcome(paypal_order_id)
+            if result:
+                outcomes[paypal_order_id] = result
+
+    paid_ids = [ref for ref, result in outcomes.items() if result == "paid"]
+    failed_ids = [ref for ref, result in outcomes.items() if result == "failed"]
+    open_statuses = ("pending", "approved")
+    paid_orders = []
+    failed_count = 0
+    if paid_ids:
+        paid_orders = (
+            db.query(Order.id, Order.user_id)
+            .filter(Order.paypal_order_id.in_(paid_ids), Order.status.in_(open_statuses))
+            .all()
+        )
+    if paid_orders:
+        paid_order_ids = [o.id for o in paid_orders]
+        # Списанный под заказ остаток становится продажей и больше не возвращается
+        db.query(Order).filter(Order.id.in_(paid_order_ids)).update(
+            {Order.status: "paid", Order.stock_reserved: False}, synchronize_session=False
+        )
+        # Агрегаты продаж обновляются в той же транзакции
+        record_paid_orders(db, paid_order_ids)
+        # Рекомендации пересчитывает воркер; задача фиксируется вместе со статусом paid
+        enqueue(db, "update_recommendations", {"order_ids": paid_order_ids}, commit=False)
+        # Очищаем корзины всех оплативших пользователей одним запросом
+        get_cart_store().clear_many(db, {o.user_id for o in paid_orders})
+    if failed_ids:
+        failed_order_ids = [
+            order_id for (order_id,) in db.query(Order.id)
+            .filter(Order.paypal_order_id.in_(failed_ids), Order.status.in_(open_statuses))
+        ]
+        if failed_order_ids:
+            # В сводку — заказы, которые действительно перешли в failed, а не ссылки из событий
+            failed_count = db.query(Order).filter(
+                Order.id.in_(failed_order_ids), Order.status.in_(open_statuses)
+            ).update({Order.status: "failed"}, synchronize_session=False)
+            # Платёж не прошёл — товар снова доступен другим покупателям
+            release(db, failed_order_ids)
+    if done_events:
+        db.query(PaymentEvent).filter(PaymentEvent.id.in_(done_events)).update(
+            {PaymentEvent.processed_at: datetime.utcnow()}, synchronize_session=False
+        )
+    db.commit()
+
+    summary = {"events": len(done_events), "paid": len(paid_orders), "failed": failed_count}
+    if any(summary.values()):
+        logger.info(f"PayPal reconcile: {summary}")
+    return summary
+
+
+def run_reconcile_once(batch_size: int = PAYPAL_RECONCILE_BATCH) -> dict:
+    db = SessionLocal()
+    try:
+        return reconcile_payments(db, batch_size)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
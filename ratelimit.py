@@ -0,0 +1,215 @@
+"""Ограничение частоты запросов и сброс нагрузки.
+
+rate_limit() — зависимость FastAPI с токен-ведром на ключ (IP, пользователь
+или значение поля формы). Вёдра живут в памяти процесса, а при
+RATE_LIMIT_BACKEND=redis — в Redis, и тогда лимит общий для всех воркеров.
+
+concurrency_limit() ограничивает число одновременно выполняемых тяжёлых
+запросов (bcrypt) в процессе: лишние сразу получают 429, а не ждут в
+очереди до таймаута.
+
+    @app.post("/contact", dependencies=[Depends(rate_limit("contact", 5, 60))])
+"""
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from jose import JWTError, jwt
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# За прокси (Render, nginx) реальный адрес клиента — первый в X-Forwarded-For
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")  # Matches main.py
+ALGORITHM = "HS256"
+
+# Одновременных проверок bcrypt на процесс
+BCRYPT_CONCURRENCY = int(os.getenv("BCRYPT_CONCURRENCY", "4"))
+
+
+class MemoryBuckets:
+    """Токен-вёдра в памяти процесса"""
+
+    MAX_KEYS = 100_000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, updated_at)
+
+    def take(self, key: str, rate: float, burst: int):
+        """(allowed, retry_after_seconds)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (1 - tokens) / rate
+            if len(self._buckets) > self.MAX_KEYS:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now: float):
+        # Ведро, не трогавшееся дольше часа, давно полное — хранить его незачем
+        stale = [k for k, (_, updated) in self._buckets.items() if now - updated > 3600]
+        for k in stale:
+            del self._buckets[k]
+
+
+class RedisBuckets:
+    """Токен-вёдра в Redis: проверка и списание атомарны (Lua)"""
+
+    SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 't', 'u')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'u', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+    def __init__(self, client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self.redis = client
+        self._script = client.register_script(self.SCRIPT)
+
+    def take(self, key: str, rate: float, burst: int):
+        try:
+            allowed, retry_after = self._script(keys=[f"rl:{key}"], args=[rate, burst, time.time()])
+        except Exception as e:
+            # Недоступный Redis не должен класть магазин: пропускаем запрос
+            logger.warning(f"Rate limit backend error, allowing request: {e}")
+            return True, 0.0
+        return bool(int(allowed)), float(retry_after)
+
+
+_backend = None
+
+
+def set_backend(backend):
+    """Подменяет хранилище вёдер (например, RedisBuckets(fakeredis.FakeRedis(...)))"""
+    global _backend
+    _backend = backend
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = RedisBuckets() if RATE_LIMIT_BACKEND == "redis" else MemoryBuckets()
+    return _backend
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def user_or_ip(request: Request) -> str:
+    """Имя пользователя из JWT (без запроса к БД) или IP для гостя"""
+    token = request.cookies.get("access_token")
+    if token:
+        try:
+            username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            if username:
+                return f"user:{username}"
+        except JWTError:
+            pass
+    return f"ip:{client_ip(request)}"
+
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Слишком много запросов, попробуйте позже",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def rate_limit(name: str, limit: int, period: float, key: str = "ip", field: str = None):
+    """Зависимость: не больше limit запросов за period секунд на ключ.
+
+    key: "ip", "user" (пользователь из cookie, иначе IP) или "field" —
+    значение поля формы field (например, логин), чтобы перебор пароля одного
+    аккаунта не обходился сменой IP.
+    """
+    rate = limit / period
+
+    async def dependency(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        if key == "user":
+            identity = user_or_ip(request)
+        elif key == "field":
+            form = await request.form()
+            identity = f"{field}:{str(form.get(field, '')).strip().lower()}"
+        else:
+            identity = f"ip:{client_ip(request)}"
+        allowed, retry_after = get_backend().take(f"{name}:{identity}", rate, limit)
+        if not allowed:
+            logger.warning(f"Rate limit {name} exceeded for {identity}")
+            raise too_many_requests(retry_after)
+
+    return dependency
+
+
+class ConcurrencyLimiter:
+    """Счётчик одновременных запросов; при заполнении отказывает сразу"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+
+    async def __call__(self):
+        # Весь учёт идёт в потоке event loop, поэтому блокировка не нужна
+        if RATE_LIMIT_ENABLED and self.active >= self.limit:
+            logger.warning(f"Concurrency limit {self.name} reached ({self.limit}), shedding request")
+            raise too_many_requests(1)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+
+def concurrency_limit(name: str, limit: int) -> ConcurrencyLimiter:
+    return ConcurrencyLimiter(name, limit)
+
+
+# Общий лимит на bcrypt: вход, регистрация, вход в админку
+bcrypt_slots = concurrency_limit("bcrypt", BCRYPT_CONCURRENCY)
+
+
+async def run_bcrypt(func, *args):
+    """Выполняет хеширование/проверку пароля вне event loop"""
+    return await asyncio.to_thread(func, *args)
@@ -0,0 +1,204 @@
+"""«С этим товаром покупают»: рекомендации по совместным покупкам.
+
+Для каждой пары товаров считается число оплаченных заказов, где они были
+вместе (совместная встречаемость), и мера сходства
+    score(a, b) = orders(a, b) / sqrt(orders(a) * orders(b)),
+по которой для каждого товара выбираются RECOMMENDATIONS_TOP_K соседей.
+Пары строятся векторно в NumPy: позиции сортируются по заказу, и для сдвига
+k = 1, 2, … сравниваются элементы i и i + k одного заказа.
+
+Состояние (счётчики пар и товаров, номера учтённых заказов) лежит в
+RECOMMENDATIONS_DIR/state.npz, результат — в neighbors.npy: матрица
+int32 [max product id + 1, K], строка — id соседей товара, -1 — пусто.
+Веб-процессы открывают её через np.load(mmap_mode="r") (recommender.py,
+без импорта этого модуля и NumPy при старте), поэтому выдача — одно
+обращение к строке массива без БД, а память страниц делится между
+воркерами. Файлы пишутся во временные и подменяются os.replace.
+
+Полный пересчёт:
+    python recommendations.py build
+Новые оплаченные заказы добавляет задача tasks.update_recommendations,
+которую payments.reconcile_payments ставит в той же транзакции, где заказ
+становится paid. Номера учтённых заказов хранятся в состоянии, поэтому
+повтор задачи не удваивает счётчики.
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from database import Order, OrderItem, SessionLocal
+from recommender import RECOMMENDATIONS_DIR, RECOMMENDATIONS_TOP_K, Recommender, neighbors_path, state_path  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+# Пары, встречавшиеся реже, не рекомендуются
+RECOMMENDATIONS_MIN_SUPPORT = int(os.getenv("RECOMMENDATIONS_MIN_SUPPORT", "1"))
+# Большие заказы (оптовые) дают квадратичное число пар, учитываем первые N товаров
+RECOMMENDATIONS_MAX_ORDER_LINES = int(os.getenv("RECOMMENDATIONS_MAX_ORDER_LINES", "50"))
+
+LOAD_CHUNK = 50_000
+_LOW = np.int64(0xFFFFFFFF)
+
+
+class CoPurchaseState:
+    """Счётчики совместных покупок: ключ пары (a << 32) | b хранится в обе стороны"""
+
+    def __init__(self, item_counts=None, pair_keys=None, pair_counts=None, applied=None):
+        self.item_counts = item_counts if item_counts is not None else np.zeros(0, dtype=np.int32)
+        self.pair_keys = pair_keys if pair_keys is not None else np.zeros(0, dtype=np.int64)
+        self.pair_counts = pair_counts if pair_counts is not None else np.zeros(0, dtype=np.int32)
+        self.applied = applied if applied is not None else np.zeros(0, dtype=np.int64)
+
+    def add(self, order_ids: np.ndarray, product_ids: np.ndarray) -> int:
+        """Учитывает позиции (order_id, product_id) ещё не учтённых заказов; число новых заказов"""
+        fresh = ~np.isin(order_ids, self.applied)
+        order_ids, product_ids = order_ids[fresh], product_ids[fresh]
+        if not len(order_ids):
+            return 0
+        orders, products = _order_lines(order_ids, product_ids)
+        size = int(products.max()) + 1
+        if size > len(self.item_counts):
+            self.item_counts = np.concatenate([self.item_counts, np.zeros(size - len(self.item_counts), np.int32)])
+        self.item_counts += np.bincount(products, minlength=len(self.item_counts)).astype(np.int32)
+
+        keys, counts = _pair_counts(orders, products)
+        if len(self.pair_keys):
+            keys, inverse = np.unique(np.concatenate([self.pair_keys, keys]), return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate([self.pair_counts, counts])).astype(np.int32)
+        self.pair_keys, self.pair_counts = keys, counts
+        new_orders = np.unique(orders)
+        self.applied = np.union1d(self.applied, new_orders)
+        return len(new_orders)
+
+    def top_k(self, k: int = RECOMMENDATIONS_TOP_K, min_support: int = RECOMMENDATIONS_MIN_SUPPORT) -> np.ndarray:
+        """Матрица соседей [max id + 1, k], по убыванию score"""
+        neighbors = np.full((len(self.item_counts), k), -1, dtype=np.int32)
+        mask = self.pair_counts >= min_support
+        keys, counts = self.pair_keys[mask], self.pair_counts[mask]
+        if not len(keys):
+            return neighbors
+        rows, cols = (keys >> 32).astype(np.int32), (keys & _LOW).astype(np.int32)
+        item = self.item_counts.astype(np.float64)
+        score = counts / np.sqrt(item[rows] * item[cols])
+        # Внутри строки: score, затем число заказов, затем меньший id
+        order = np.lexsort((cols, -counts, -score, rows))
+        rows, cols = rows[order], cols[order]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+        keep = rank < k
+        neighbors[rows[keep], rank[keep]] = cols[keep]
+        return neighbors
+
+    def save(self, path: str):
+        _atomic_write(path, lambda f: np.savez(f, item_counts=self.item_counts, pair_keys=self.pair_keys,
+                                               pair_counts=self.pair_counts, applied=self.applied))
+
+    @classmethod
+    def load(cls, path: str) -> "CoPurchaseState":
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            return cls(data["item_counts"], data["pair_keys"], data["pair_counts"], data["applied"])
+
+
+def _order_lines(order_ids: np.ndarray, product_ids: np.ndarray):
+    """Уникальные (заказ, товар), отсортированные по заказу; не больше MAX_ORDER_LINES товаров на заказ"""
+    lines = np.unique((order_ids.astype(np.int64) << 32) | product_ids.astype(np.int64))
+    orders, products = lines >> 32, (lines & _LOW).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    rank = np.arange(len(orders)) - np.repeat(starts, np.diff(np.r_[starts, len(orders)]))
+    keep = rank < RECOMMENDATIONS_MAX_ORDER_LINES
+    return orders[keep], products[keep]
+
+
+def _pair_counts(orders: np.ndarray, products: np.ndarray):
+    """Ключи пар (в обе стороны) и число заказов с каждой парой"""
+    chunks = []
+    for shift in range(1, RECOMMENDATIONS_MAX_ORDER_LINES):
+        same = orders[shift:] == orders[:-shift]
+        if not same.any():
+            break
+        a, b = products[:-shift][same], products[shift:][same]
+        chunks.append((a << 32) | b)
+        chunks.append((b << 32) | a)
+    if not chunks:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    keys, counts = np.unique(np.concatenate(chunks), return_counts=True)
+    return keys, counts.astype(np.int32)
+
+
+def _atomic_write(path: str, write):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_order_lines(db: Session, order_ids=None):
+    """(order_id, product_id) позиций оплаченных заказов; нечисловые product_id пропускаются"""
+    query = (
+        db.query(OrderItem.order_id, OrderItem.product_id)
+        .join(Order, Order.id == OrderItem.order_id)
+        .filter(Order.status == "paid")
+    )
+    if order_ids is not None:
+        query = query.filter(Order.id.in_(list(order_ids)))
+    orders, products = [], []
+    for order_id, product_id in query.yield_per(LOAD_CHUNK):
+        if product_id and product_id.isdigit():
+            orders.append(order_id)
+            products.append(int(product_id))
+    return np.array(orders, dtype=np.int64), np.array(products, dtype=np.int64)
+
+
+_write_lock = threading.Lock()
+
+
+def update(db: Session, order_ids=None, directory: str = None) -> dict:
+    """Без order_ids — пересчёт с нуля, иначе заказы добавляются к state.npz; пишет neighbors.npy"""
+    with _write_lock:
+        started = time.perf_counter()
+        state = CoPurchaseState.load(state_path(directory)) if order_ids is not None else CoPurchaseState()
+        added = state.add(*load_order_lines(db, order_ids))
+        if order_ids is not None and not added:
+            return {"orders": 0}
+        neighbors = state.top_k()
+        state.save(state_path(directory))
+        _atomic_write(neighbors_path(directory), lambda f: np.save(f, neighbors))
+        summary = {
+            "orders": added, "products": int((state.item_counts > 0).sum()), "pairs": len(state.pair_keys) // 2,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        logger.info(f"Recommendations updated: {summary}")
+        return summary
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Рекомендации по совместным покупкам")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--dir", help=f"По умолчанию RECOMMENDATIONS_DIR ({RECOMMENDATIONS_DIR})")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        print(update(db, directory=args.dir))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Выдача «с этим товаром покупают» в веб-процессах.
+
+neighbors.npy строит recommendations.py (worker.py или
+`python recommendations.py build`); здесь файл только читается через
+np.load(mmap_mode="r"). NumPy импортируется при первом чтении файла, а не
+при импорте модуля: main.py подключает модуль в каждом воркере, и старт
+воркера не должен платить за библиотеку, нужную только пересчёту.
+"""
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# Рядом с модулем, а не в текущем каталоге: веб-процессы и worker.py, запущенные
+# из разных мест, должны читать и писать одни и те же файлы
+RECOMMENDATIONS_DIR = os.getenv(
+    "RECOMMENDATIONS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "recommendations")
+)
+RECOMMENDATIONS_TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", "10"))
+# Как часто веб-процесс проверяет, не обновился ли neighbors.npy, секунды
+RECOMMENDATIONS_RELOAD_SECONDS = float(os.getenv("RECOMMENDATIONS_RELOAD_SECONDS", "5"))
+
+
+def state_path(directory: str = None) -> str:
+    return os.path.join(directory or RECOMMENDATIONS_DIR, "state.npz")
+
+
+def neighbors_path(directory: str = None) -> str:
+    return os.path.join(directory or RECOMMENDATIONS_DIR, "neighbors.npy")
+
+
+class Recommender:
+    """Читает neighbors.npy через mmap и подхватывает новую версию файла"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._neighbors = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def neighbors(self):
+        now = time.monotonic()
+        if now - self._checked_at >= RECOMMENDATIONS_RELOAD_SECONDS:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                self._neighbors, self._mtime = None, None
+                return None
+            if mtime != self._mtime:
+                import numpy as np
+
+                self._neighbors, self._mtime = np.load(self.path, mmap_mode="r"), mtime
+        return self._neighbors
+
+    def also_bought(self, product_id: int, limit: int = RECOMMENDATIONS_TOP_K) -> list:
+        neighbors = self.neighbors()
+        if neighbors is None or not 0 <= product_id < len(neighbors):
+            return []
+        return [int(i) for i in neighbors[product_id, :limit] if i >= 0]
+
+
+recommender = Recommender(neighbors_path())
@@ -0,0 +1,65 @@
+"""Похожие товары для страницы товара.
+
+Соседи считаются заранее для всего каталога одним запросом: та же
+категория и ближайшая цена (по отношению цен, поэтому 10 и 12 ближе, чем
+100 и 105). Индекс хранится в кэше витрины, как facets.py: после правок в
+админке он пересобирается при следующем запросе (invalidate_catalog_caches),
+в других процессах — не позже CATALOG_CACHE_TTL. Страница товара берёт из
+него и сам товар, и соседей, не обращаясь к БД.
+"""
+import math
+import os
+from collections import defaultdict
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+import catalog
+from database import Product
+
+load_dotenv()
+RELATED_PRODUCTS_LIMIT = int(os.getenv("RELATED_PRODUCTS_LIMIT", "4"))
+
+
+def _price_key(product: dict) -> float:
+    return math.log(max(product["price"] or 0.0, 0.01))
+
+
+def _nearest(keys, i: int, limit: int):
+    """Индексы limit ближайших к keys[i] соседей в отсортированном списке"""
+    left, right = i - 1, i + 1
+    result = []
+    while len(result) < limit and (left >= 0 or right < len(keys)):
+        if right >= len(keys) or (left >= 0 and keys[i] - keys[left] <= keys[right] - keys[i]):
+            result.append(left)
+            left -= 1
+        else:
+            result.append(right)
+            right += 1
+    return result
+
+
+class RelatedIndex:
+    def __init__(self, products, limit: int = RELATED_PRODUCTS_LIMIT):
+        self.products = {p["id"]: p for p in products}
+        self.neighbors = {}
+        groups = defaultdict(list)
+        for p in products:
+            groups[p["category"]].append(p)
+        for group in groups.values():
+            group.sort(key=lambda p: (_price_key(p), p["id"]))
+            keys = [_price_key(p) for p in group]
+            for i, p in enumerate(group):
+                self.neighbors[p["id"]] = [group[j]["id"] for j in _nearest(keys, i, limit)]
+
+    def related(self, product_id: int) -> list:
+        return [self.products[i] for i in self.neighbors.get(product_id, [])]
+
+
+def related_index(db: Session) -> RelatedIndex:
+    def load():
+        rows = db.query(Product.id, Product.name, Product.price, Product.image,
+                        Product.category, Product.is_new_arrival).all()
+        return RelatedIndex([catalog.product_to_dict(row) for row in rows])
+
+    return catalog.cached("related_products", load)
@@ -0,0 +1,59 @@
+"""Продакшен-запуск: gunicorn с uvicorn-воркерами по gunicorn.conf.py.
+
+    python serve.py                          # воркеров по числу ядер
+    python serve.py --workers 4 --bind 0.0.0.0:8000
+
+Аргументы переопределяют WEB_CONCURRENCY и BIND. Где gunicorn недоступен
+(Windows), запускается uvicorn со встроенным менеджером процессов.
+
+При нескольких воркерах фоновые задачи лучше вынести в `python worker.py`
+(RUN_EMBEDDED_WORKER=false), а ограничение частоты — в Redis
+(RATE_LIMIT_BACKEND=redis): иначе у каждого воркера свои вёдра.
+"""
+import argparse
+import logging
+import os
+import sys
+
+from uvicorn.workers import UvicornWorker
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CONFIG = os.path.join(ROOT, "gunicorn.conf.py")
+
+
+class ShopUvicornWorker(UvicornWorker):
+    # auto: uvloop и httptools, если установлены, иначе asyncio и h11
+    CONFIG_KWARGS = {"loop": "auto", "http": "auto", "lifespan": "on", "server_header": False}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Запуск магазина в продакшене")
+    parser.add_argument("--workers", type=int, help="По умолчанию WEB_CONCURRENCY или 2 × ядра + 1")
+    parser.add_argument("--bind", help="По умолчанию BIND или 0.0.0.0:$PORT")
+    args = parser.parse_args()
+    if args.workers:
+        os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    if args.bind:
+        os.environ["BIND"] = args.bind
+
+    try:
+        from gunicorn.app.wsgiapp import run
+    except ImportError:
+        import uvicorn
+
+        host, _, port = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}").rpartition(":")
+        workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+        logger.warning("gunicorn недоступен, запускаю uvicorn")
+        uvicorn.run("main:app", host=host, port=int(port), workers=workers)
+        return
+
+    sys.argv = ["gunicorn", "--config", CONFIG, "main:app"]
+    os.chdir(ROOT)
+    run()
+
+
+if __name__ == "__main__":
+    main()
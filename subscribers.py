@@ -0,0 +1,119 @@
+"""Подписчики рассылки: локальная таблица и пакетная синхронизация с GetResponse.
+
+/subscribe только вставляет строку в subscribers (повторный email ничего не
+меняет), поэтому ответ не зависит от лимитов GetResponse. Периодическая
+задача tasks.sync_subscribers берёт до GETRESPONSE_SYNC_BATCH подписчиков,
+которым пора отправляться, и создаёт контакты не быстрее GETRESPONSE_RATE
+запросов в секунду.
+
+* 202 и 409 (контакт уже есть) — synced;
+* 429 или открытый предохранитель — пакет прерывается, остаток ждёт
+  Retry-After без увеличения attempts;
+* 5xx и сетевые ошибки — повтор с экспоненциальной задержкой, после
+  SUBSCRIBER_MAX_ATTEMPTS — failed;
+* прочие 4xx (например, некорректный email) — сразу failed.
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from breakers import IntegrationUnavailable
+from database import Subscriber, insert_for
+from jobs import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+GETRESPONSE_RATE = float(os.getenv("GETRESPONSE_RATE", "10"))  # запросов в секунду
+GETRESPONSE_SYNC_BATCH = int(os.getenv("GETRESPONSE_SYNC_BATCH", "100"))
+SUBSCRIBER_SYNC_INTERVAL = float(os.getenv("SUBSCRIBER_SYNC_INTERVAL", "10"))
+SUBSCRIBER_MAX_ATTEMPTS = int(os.getenv("SUBSCRIBER_MAX_ATTEMPTS", "8"))
+
+
+class Throttled(Exception):
+    """GetResponse ответил 429"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"throttled for {retry_after}s")
+        self.retry_after = retry_after
+
+
+def add_subscriber(db: Session, email: str, campaign_id: str) -> bool:
+    """Сохраняет подписчика; False, если email уже есть. Фиксирует транзакцию"""
+    insert = insert_for(db.get_bind())
+    result = db.execute(
+        insert(Subscriber.__table__)
+        .values(email=email.strip().lower(), campaign_id=campaign_id, status="pending",
+                attempts=0, next_attempt_at=datetime.utcnow(), created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["email"])
+    )
+    db.commit()
+    return bool(result.rowcount)
+
+
+def _postpone(rows, seconds: float):
+    until = datetime.utcnow() + timedelta(seconds=seconds)
+    for row in rows:
+        row.next_attempt_at = until
+
+
+def sync_batch(db: Session, send) -> dict:
+    """Отправляет один пакет. send(email, campaign_id) -> HTTP-статус, 429 — исключение Throttled"""
+    now = datetime.utcnow()
+    rows = (
+        db.query(Subscriber)
+        .filter(Subscriber.status == "pending", Subscriber.next_attempt_at <= now)
+        .order_by(Subscriber.next_attempt_at, Subscriber.id)
+        .limit(GETRESPONSE_SYNC_BATCH)
+        .all()
+    )
+    counts = {"synced": 0, "retry": 0, "failed": 0, "postponed": 0}
+    interval = 1 / GETRESPONSE_RATE if GETRESPONSE_RATE > 0 else 0
+    next_call = time.monotonic()
+    try:
+        for i, row in enumerate(rows):
+            # Равномерный темп вместо пачки запросов в начале секунды
+            pause = next_call - time.monotonic()
+            if pause > 0:
+                time.sleep(pause)
+            next_call = max(next_call, time.monotonic()) + interval
+            try:
+                status = send(row.email, row.campaign_id)
+            except (Throttled, IntegrationUnavailable) as e:
+                _postpone(rows[i:], e.retry_after)
+                counts["postponed"] = len(rows) - i
+                logger.warning(f"Subscriber sync paused for {e.retry_after}s: {e}")
+                break
+            except Exception as e:
+                status, error = None, f"{type(e).__name__}: {e}"
+            else:
+                error = f"HTTP {status}"
+
+            row.attempts += 1
+            if status in (200, 202, 409):
+                row.status, row.synced_at, row.last_error = "synced", datetime.utcnow(), None
+                counts["synced"] += 1
+            elif status is not None and 400 <= status < 500:
+                row.status, row.last_error = "failed", error
+                counts["failed"] += 1
+            elif row.attempts >= SUBSCRIBER_MAX_ATTEMPTS:
+                row.status, row.last_error = "failed", error
+                counts["failed"] += 1
+            else:
+                row.last_error = error
+                _postpone([row], backoff_delay(row.attempts))
+                counts["retry"] += 1
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return counts
+
+
+def status_counts(db: Session) -> dict:
+    return dict(db.query(Subscriber.status, func.count(Subscriber.id)).group_by(Subscriber.status).all())
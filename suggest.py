@@ -0,0 +1,261 @@
+"""Подсказки поиска по мере ввода: /api/products/suggest.
+
+Индекс — отсортированный список ключей (название целиком, название с каждого
+следующего слова, категория) в нижнем регистре. Запрос «pro b» — диапазон
+ключей с этим префиксом, найденный двумя bisect; совпадает и «Pro Buds», и
+«Ultra Pro Buds». Из диапазона берутся SUGGEST_LIMIT лучших товаров: больше
+продаж за BESTSELLER_DAYS, затем новинки, затем по названию. Лучшие товары
+для префикса запоминаются, а для всех одно- и двухбуквенных префиксов
+(самые длинные диапазоны) считаются при сборке, поэтому ответ — поиск по
+словарю и кодирование нескольких товаров, без обращения к БД.
+
+Индекс живёт вне кэша витрины: правки в админке применяются к нему точечно
+(upsert / remove), сбрасывая только затронутые префиксы. Полностью он
+пересобирается раз в SUGGEST_REBUILD_SECONDS — так подхватываются продажи и
+правки, сделанные в других процессах; пока идёт пересборка, запросы
+обслуживает прежний индекс.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import catalog
+from database import Product, SalesDailyProduct
+from featured import BESTSELLER_DAYS
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+SUGGEST_LIMIT = int(os.getenv("SUGGEST_LIMIT", "8"))
+SUGGEST_CATEGORY_LIMIT = 3
+SUGGEST_REBUILD_SECONDS = float(os.getenv("SUGGEST_REBUILD_SECONDS", os.getenv("CATALOG_CACHE_TTL", "60")))
+SUGGEST_MAX_QUERY = 64
+# max-age ответа: браузер и CDN не спрашивают один и тот же префикс повторно
+SUGGEST_CACHE_SECONDS = int(os.getenv("SUGGEST_CACHE_SECONDS", "60"))
+# Префиксы такой длины считаются при сборке: их диапазоны самые длинные
+WARM_PREFIX_LENGTH = 2
+# Сколько запомненных префиксов и готовых ответов держать, прежде чем начать заново
+MEMO_SIZE = 20_000
+
+PRODUCT, CATEGORY = 0, 1
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").casefold().split())[:SUGGEST_MAX_QUERY]
+
+
+def _name_keys(name: str):
+    """Название и его «хвосты» с каждого слова: ultra pro buds, pro buds, buds"""
+    words = normalize(name).split(" ")
+    return {" ".join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class SuggestIndex:
+    def __init__(self, products, units: dict):
+        self.units = units
+        self.products = {}
+        self.category_counts = {}
+        self.category_names = {}
+        # (ключ, вид, ранг, ссылка): ссылка — id товара или ключ категории
+        self.entries = []
+        # Промахи и правки — под блокировкой, попадания в запомненное читаются без неё
+        self._lock = threading.RLock()
+        self._top = {}
+        self._responses = {}
+        for product in products:
+            self.products[product["id"]] = product
+            self.entries.extend(self._product_entries(product))
+            category = normalize(product["category"])
+            if category:
+                self.category_counts[category] = self.category_counts.get(category, 0) + 1
+                self.category_names.setdefault(category, product["category"])
+        self.entries.extend(self._category_entry(key) for key in self.category_counts)
+        self.entries.sort()
+        for prefix in {key[:n] for key, *_ in self.entries for n in range(1, WARM_PREFIX_LENGTH + 1)}:
+            self.top(prefix)
+
+    def _product_entries(self, product: dict):
+        rank = (-self.units.get(product["id"], 0), not product["is_new_arrival"],
+                normalize(product["name"]), product["id"])
+        return [(key, PRODUCT, rank, product["id"]) for key in _name_keys(product["name"])]
+
+    def _category_entry(self, key: str):
+        return (key, CATEGORY, (-self.category_counts[key], key), key)
+
+    def _remove_entry(self, entry):
+        i = bisect_left(self.entries, entry)
+        if i < len(self.entries) and self.entries[i] == entry:
+            del self.entries[i]
+        return entry
+
+    def _recount(self, category: str, delta: int, name: str = None) -> list:
+        """Меняет число товаров категории; её запись переезжает вместе с рангом"""
+        touched = []
+        if category in self.category_counts:
+            touched.append(self._remove_entry(self._category_entry(category)))
+        count = self.category_counts.get(category, 0) + delta
+        if count > 0:
+            self.category_counts[category] = count
+            if name:
+                self.category_names.setdefault(category, name)
+            entry = self._category_entry(category)
+            insort(self.entries, entry)
+            touched.append(entry)
+        else:
+            self.category_counts.pop(category, None)
+            self.category_names.pop(category, None)
+        return touched
+
+    def _add_product(self, product: dict) -> list:
+        self.products[product["id"]] = product
+        touched = self._product_entries(product)
+        for entry in touched:
+            insort(self.entries, entry)
+        category = normalize(product["category"])
+        if category:
+            touched += self._recount(category, 1, product["category"])
+        return touched
+
+    def _remove_product(self, product_id: int) -> list:
+        product = self.products.pop(product_id, None)
+        if product is None:
+            return []
+        touched = [self._remove_entry(entry) for entry in self._product_entries(product)]
+        category = normalize(product["category"])
+        if category:
+            touched += self._recount(category, -1)
+        return touched
+
+    def _forget(self, entries):
+        """Сбрасывает запомненное для префиксов затронутых ключей и все готовые ответы"""
+        for key, *_ in entries:
+            for n in range(1, len(key) + 1):
+                self._top.pop(key[:n], None)
+        self._responses.clear()
+
+    # --- Правки из админки ---
+
+    def upsert(self, product: dict):
+        with self._lock:
+            touched = self._remove_product(product["id"])
+            self._forget(touched + self._add_product(product))
+
+    def remove(self, product_id: int):
+        with self._lock:
+            self._forget(self._remove_product(product_id))
+
+    # --- Поиск ---
+
+    def top(self, prefix: str):
+        """(id товаров, ключи категорий) с лучшими рангами среди ключей с префиксом"""
+        found = self._top.get(prefix)
+        if found is not None:
+            return found
+        with self._lock:
+            lo = bisect_left(self.entries, (prefix,))
+            # Все ключи с префиксом меньше префикса с увеличенной последней буквой
+            hi = bisect_left(self.entries, (prefix[:-1] + chr(ord(prefix[-1]) + 1),))
+            products, categories = {}, {}
+            for key, kind, rank, ref in self.entries[lo:hi]:
+                (products if kind == PRODUCT else categories)[ref] = rank
+            found = (
+                [ref for _, ref in heapq.nsmallest(SUGGEST_LIMIT, ((r, ref) for ref, r in products.items()))],
+                [ref for _, ref in heapq.nsmallest(SUGGEST_CATEGORY_LIMIT, ((r, ref) for ref, r in categories.items()))],
+            )
+            if len(self._top) >= MEMO_SIZE:
+                self._top.clear()
+            self._top[prefix] = found
+        return found
+
+    def suggest(self, query: str, limit: int = SUGGEST_LIMIT) -> dict:
+        prefix = normalize(query)
+        if not prefix:
+            return {"products": [], "categories": []}
+        product_ids, category_keys = self.top(prefix)
+        # get: запомненный список мог быть прочитан до удаления товара в админке
+        products = [self.products.get(i) for i in product_ids[:limit]]
+        return {
+            "products": [p for p in products if p],
+            "categories": [
+                {"name": self.category_names[key], "count": self.category_counts[key]}
+                for key in category_keys if key in self.category_counts
+            ],
+        }
+
+    def response(self, query: str, limit: int = SUGGEST_LIMIT) -> tuple:
+        """(тело, ETag) ответа; готовые ответы живут до следующей правки"""
+        cache_key = (normalize(query), limit)
+        encoded = self._responses.get(cache_key)
+        if encoded is None:
+            with self._lock:
+                payload = {"success": True, "query": cache_key[0], "data": self.suggest(query, limit)}
+                encoded = catalog.encode_payload(payload)
+                if len(self._responses) >= MEMO_SIZE:
+                    self._responses.clear()
+                self._responses[cache_key] = encoded
+        return encoded
+
+
+def _units_sold(db: Session) -> dict:
+    since = datetime.utcnow().date() - timedelta(days=BESTSELLER_DAYS)
+    rows = (
+        db.query(SalesDailyProduct.product_id, func.sum(SalesDailyProduct.units))
+        .filter(SalesDailyProduct.day >= since)
+        .group_by(SalesDailyProduct.product_id)
+    )
+    return {int(pid): int(units or 0) for pid, units in rows if pid and pid.isdigit()}
+
+
+def build_index(db: Session) -> SuggestIndex:
+    started = time.perf_counter()
+    rows = db.query(Product.id, Product.name, Product.price, Product.image,
+                    Product.category, Product.is_new_arrival).all()
+    index = SuggestIndex([catalog.product_to_dict(row) for row in rows], _units_sold(db))
+    logger.info(f"Suggest index built: products={len(rows)}, keys={len(index.entries)}, "
+                f"seconds={time.perf_counter() - started:.3f}")
+    return index
+
+
+_index = None
+_built_at = 0.0
+_build_lock = threading.Lock()
+_changes = 0  # Правки из админки: пришедшая во время сборки могла не попасть в выборку
+
+
+def suggest_index(db: Session) -> SuggestIndex:
+    """Текущий индекс; устаревший пересобирает один поток, остальные читают прежний"""
+    global _index, _built_at
+    stale = _index is None or time.monotonic() - _built_at > SUGGEST_REBUILD_SECONDS
+    if stale and _build_lock.acquire(blocking=_index is None):
+        try:
+            if _index is None or time.monotonic() - _built_at > SUGGEST_REBUILD_SECONDS:
+                changes = _changes
+                _index = build_index(db)
+                # Если во время сборки была правка, следующий запрос соберёт индекс заново
+                _built_at = time.monotonic() if changes == _changes else 0.0
+        finally:
+            _build_lock.release()
+    return _index
+
+
+def product_changed(product: Product):
+    """Вызывается админкой после коммита; индекс ещё не построен — применять нечего"""
+    global _changes
+    _changes += 1
+    if _index is not None:
+        _index.upsert(catalog.product_to_dict(product))
+
+
+def product_deleted(product_id: int):
+    global _changes
+    _changes += 1
+    if _index is not None:
+        _index.remove(product_id)
@@ -0,0 +1,211 @@
+"""Фоновые задачи магазина: письма, GetResponse, сверка PayPal, очистка.
+
+Клиенты интеграций (smtplib, requests) импортируются внутри задач, чтобы
+импорт модуля веб-процессом оставался дешёвым.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from breakers import GETRESPONSE, SMTP
+from cart_store import CART_BACKEND, CART_FLUSH_INTERVAL, get_cart_store
+from database import Job, Order, PasswordReset, RefreshToken, SessionLocal
+from inventory import RESERVATION_EXPIRE_INTERVAL, expire_reservations as expire_order_reservations, release
+from jobs import job, periodic
+from payments import PAYPAL_RECONCILE_INTERVAL, run_reconcile_once
+from subscribers import SUBSCRIBER_SYNC_INTERVAL, Throttled, add_subscriber, sync_batch
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+ADMIN_EMAIL = os.getenv("SMTP_FROM", os.getenv("SMTP_USERNAME", ""))
+ADMIN_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.yandex.ru")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
+GETRESPONSE_API_KEY = os.getenv("GETRESPONSE_API_KEY")
+GETRESPONSE_API_BASE = os.getenv("GETRESPONSE_API_BASE", "https://api.getresponse.com/v3").rstrip("/")
+# Неоплаченные заказы старше этого срока удаляются
+STALE_ORDER_HOURS = int(os.getenv("STALE_ORDER_HOURS", "24"))
+JOBS_RETENTION_DAYS = int(os.getenv("JOBS_RETENTION_DAYS", "7"))
+
+
+def getresponse_headers():
+    return {
+        "X-Auth-Token": f"api-key {GETRESPONSE_API_KEY}",
+        "Client-Id": "eStoreApp",
+        "Content-Type": "application/json"
+    }
+
+
+@job("send_email", queue="email")
+def send_email(to_email: str, subject: str, body: str, from_email: str = None):
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    from_email = from_email or ADMIN_EMAIL
+    if not from_email or not ADMIN_PASSWORD:
+        raise RuntimeError("SMTP credentials not configured")
+
+    logger.info(f"Attempting SMTP connection: email={from_email}")
+    msg = MIMEMultipart()
+    msg['From'] = from_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+
+    # При открытом предохранителе задача сразу уходит на повтор с backoff
+    with SMTP.guard():
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP.timeout[1])
+        try:
+            if SMTP_USE_TLS:
+                server.starttls()
+            server.login(from_email, ADMIN_PASSWORD)
+            server.sendmail(from_email, to_email, msg.as_string())
+            logger.info(f"Email sent successfully to {to_email}")
+        finally:
+            server.quit()
+
+
+def create_contact(email: str, campaign_id: str) -> int:
+    """POST /contacts; 429 — Throttled (не считается отказом предохранителя)"""
+    import requests
+
+    data = {
+        "name": email.split('@')[0],
+        "email": email,
+        "campaign": {"campaignId": campaign_id},
+        "dayOfCycle": 0
+    }
+    with GETRESPONSE.guard() as call:
+        response = requests.post(f"{GETRESPONSE_API_BASE}/contacts", headers=getresponse_headers(), json=data, timeout=GETRESPONSE.timeout)
+        if response.status_code >= 500:
+            call.failed(f"HTTP {response.status_code}")
+    if response.status_code == 429:
+        raise Throttled(float(response.headers.get("Retry-After") or 1))
+    if response.status_code not in (200, 202, 409):
+        logger.error(f"GetResponse rejected {email}: {response.status_code} - {response.text}")
+    return response.status_code
+
+
+@periodic("sync_subscribers", every=SUBSCRIBER_SYNC_INTERVAL)
+@job("sync_subscribers", queue="getresponse", max_attempts=1)
+def sync_subscribers():
+    """Переносит новых подписчиков из таблицы subscribers в GetResponse"""
+    db = SessionLocal()
+    try:
+        counts = sync_batch(db, create_contact)
+        if any(counts.values()):
+            logger.info(f"Subscribers sync: {counts}")
+    finally:
+        db.close()
+
+
+@job("getresponse_subscribe", queue="getresponse")
+def getresponse_subscribe(email: str, campaign_id: str):
+    """Задачи, поставленные до перехода на таблицу subscribers"""
+    db = SessionLocal()
+    try:
+        add_subscriber(db, email, campaign_id)
+    finally:
+        db.close()
+
+
+@job("send_newsletter", queue="getresponse", max_attempts=3)
+def send_newsletter(newsletter_data: dict):
+    import requests
+
+    logger.info(f"Sending newsletter: {newsletter_data['subject']}")
+    with GETRESPONSE.guard() as call:
+        response = requests.post(f"{GETRESPONSE_API_BASE}/newsletters", headers=getresponse_headers(), json=newsletter_data, timeout=GETRESPONSE.timeout)
+        if response.status_code >= 500:
+            call.failed(f"HTTP {response.status_code}")
+    logger.info(f"Newsletter response: status={response.status_code}, body={response.text}")
+    if response.status_code != 201:
+        raise RuntimeError(f"Newsletter error: {response.status_code} - {response.text}")
+
+
+@periodic("reconcile_payments", every=PAYPAL_RECONCILE_INTERVAL)
+@job("reconcile_payments", queue="payments", max_attempts=1)
+def reconcile_payments():
+    run_reconcile_once()
+
+
+@periodic("expire_reservations", every=RESERVATION_EXPIRE_INTERVAL)
+@job("expire_reservations", queue="payments", max_attempts=1)
+def expire_reservations():
+    """Возвращает на склад резервы заказов, не одобренных в PayPal за RESERVATION_MINUTES"""
+    db = SessionLocal()
+    try:
+        expired = expire_order_reservations(db)
+        if expired:
+            logger.info(f"Expired stock reservations: orders={expired}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@job("update_recommendations", queue="recommendations", max_attempts=3)
+def update_recommendations(order_ids: list):
+    """Добавляет оплаченные заказы в рекомендации «с этим товаром покупают»"""
+    import recommendations
+
+    db = SessionLocal()
+    try:
+        recommendations.update(db, order_ids)
+    finally:
+        db.close()
+
+
+if CART_BACKEND == "redis":
+    @periodic("flush_carts", every=CART_FLUSH_INTERVAL)
+    @job("flush_carts", max_attempts=1)
+    def flush_carts():
+        """Переносит изменённые корзины из Redis в таблицу cart"""
+        db = SessionLocal()
+        try:
+            flushed = get_cart_store().flush(db)
+            if flushed:
+                logger.info(f"Flushed {flushed} carts to SQL")
+        finally:
+            db.close()
+
+
+@periodic("cleanup", every=3600)
+@job("cleanup", max_attempts=1)
+def cleanup():
+    """Удаляет истёкшие токены сброса и refresh-токены, брошенные заказы и старые задачи"""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        resets = db.query(PasswordReset).filter(
+            (PasswordReset.expires_at < now) | (PasswordReset.used == True)
+        ).delete(synchronize_session=False)
+        # Отозванные токены держим до истечения срока: по ним видно повторное использование
+        refresh_tokens = db.query(RefreshToken).filter(
+            RefreshToken.expires_at < now
+        ).delete(synchronize_session=False)
+        stale_orders = db.query(Order).filter(
+            Order.status.in_(("pending", "expired")),
+            Order.created_at < now - timedelta(hours=STALE_ORDER_HOURS)
+        ).all()
+        release(db, [order.id for order in stale_orders])
+        for order in stale_orders:
+            db.delete(order)  # Каскадом удаляются order_items
+        old_jobs = db.query(Job).filter(
+            Job.status.in_(("done", "failed")),
+            Job.finished_at < now - timedelta(days=JOBS_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
+        db.commit()
+        logger.info(f"Cleanup: password_resets={resets}, refresh_tokens={refresh_tokens}, orders={len(stale_orders)}, jobs={old_jobs}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
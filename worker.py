@@ -0,0 +1,44 @@
+"""Запуск воркеров фоновых задач.
+
+    python worker.py                          # все очереди, один процесс
+    python worker.py --queues email,getresponse --processes 2
+"""
+import argparse
+import logging
+import multiprocessing
+import signal
+
+import tasks  # noqa: F401  регистрирует задачи
+from jobs import QUEUE_CONCURRENCY, Worker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_worker(queues):
+    worker = Worker(queues)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    worker.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воркер фоновых задач")
+    parser.add_argument("--queues", default=",".join(QUEUE_CONCURRENCY), help="Очереди через запятую")
+    parser.add_argument("--processes", type=int, default=1, help="Число процессов-воркеров")
+    args = parser.parse_args()
+    queues = [q.strip() for q in args.queues.split(",") if q.strip()]
+
+    if args.processes == 1:
+        run_worker(queues)
+        return
+    processes = [multiprocessing.Process(target=run_worker, args=(queues,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {len(processes)} worker processes for queues={queues}")
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()